@@ -1,7 +1,36 @@
 import glob
 import os
+from functools import partial
+from pathlib import Path
 import obsidian_helper_functions as obs
 import general_helper_functions as help_funcs
+import note_query
+import vault_executor
+import vault_index
+
+
+def export_note_without_flashcard_metadata(
+    file_path: Path, input_directory: str, output_directory: str
+) -> None:
+    """Copies a note (and its attachments) to output_directory with the flashcard metadata comments removed."""
+    basename = os.path.basename(
+        file_path
+    )  # used as file output name because directory structure is removed
+    with open(file_path, "r", encoding="utf8") as f:
+        all_file_lines = f.readlines()
+
+    linked_files = obs.return_linked_base_names(all_file_lines)
+
+    obs.copy_attachments_to_new_directory(
+        linked_files,
+        input_directory,
+        os.path.join(output_directory, "attachments\\"),
+    )
+
+    changed_file = obs.remove_flashcard_metadata(all_file_lines)
+    with open(os.path.join(output_directory, basename), "w", encoding="utf8") as f:
+        f.writelines(changed_file)
+
 
 if __name__ == "__main__":
     DEFAULT_INPUT_DIRECTORY = r"d:\Obsidian"  # default
@@ -16,33 +45,24 @@ if __name__ == "__main__":
 
     print("Running...")
 
-    TAG_NAMES = {"software": "softwaredd\n", "flashcards": "flashcards\n"}
-
-    all_full_file_paths = help_funcs.return_all_full_file_paths(INPUT_DIRECTORY)
-
-    for file_path in all_full_file_paths:
-        basename = os.path.basename(
-            file_path
-        )  # used as file output name because directory structure is removed
-        with open(file_path, "r", encoding="utf8") as f:
-            all_file_lines = f.readlines()
-
-            if obs.has_yaml_tag(
-                TAG_NAMES["software"], all_file_lines
-            ) and obs.has_yaml_tag(TAG_NAMES["flashcards"], all_file_lines):
-                # print("Has both tags")
-
-                linked_files = obs.return_linked_base_names(all_file_lines)
+    # notes in the top level of the input directory with both tags (see note_query.py for the query syntax)
+    SELECTION_QUERY = "tag:softwaredd AND tag:flashcards AND NOT path:*/*"
 
-                obs.copy_attachments_to_new_directory(
-                    linked_files,
-                    INPUT_DIRECTORY,
-                    os.path.join(OUTPUT_DIRECTORY, "attachments\\"),
-                )
+    index = vault_index.build_vault_index(Path(INPUT_DIRECTORY), frontmatter_only=True)
+    selected_file_paths = note_query.select_notes(index, SELECTION_QUERY)
 
-                changed_file = obs.remove_flashcard_metadata(all_file_lines)
-                with open(
-                    os.path.join(OUTPUT_DIRECTORY, basename), "w", encoding="utf8"
-                ) as file_path:
-                    file_path.writelines(changed_file)
+    # created up front so that the worker processes don't race to create it
+    os.makedirs(os.path.join(OUTPUT_DIRECTORY, "attachments\\"), exist_ok=True)
+    for result in vault_executor.map_notes(
+        partial(
+            export_note_without_flashcard_metadata,
+            input_directory=INPUT_DIRECTORY,
+            output_directory=OUTPUT_DIRECTORY,
+        ),
+        selected_file_paths,
+        ordered=False,
+        show_progress=True,
+    ):
+        if result.error is not None:
+            print(f"Unable to export {result.path}:\n{result.error}")
     input("Press anything to close...")
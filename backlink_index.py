@@ -0,0 +1,208 @@
+"""
+Which notes link to which, kept up to date between runs.
+
+For every note the index stores the targets of its [[wikilinks]] exactly as they are written and the note each
+one resolved to, and for every note the notes with a link resolving to it (its referrers). It is saved next to
+the vault and on the next run only notes whose modification time or size changed are read again. Links are only
+resolved again for those notes and for links to a name that a note was added or deleted under, so looking up
+a note's referrers means neither reading nor resolving the links of the whole vault.
+"""
+
+import json
+import os
+from pathlib import Path
+import general_helper_functions as help_funcs
+import obsidian_helper_functions as obs_funcs
+import vault_executor
+
+DEFAULT_INDEX_NAME = ".backlink_index.json"
+INDEX_FORMAT_VERSION = 2
+
+
+def return_link_target(link: obs_funcs.Wikilink) -> str:
+    """The target of a link as written, without the "\\" that escapes "|" inside tables."""
+    return link.target[:-1] if link.target.endswith("\\") else link.target
+
+
+def return_note_link_targets(path: Path) -> list[str]:
+    """Returns the distinct targets of the note links (and note embeds) in a note, in order."""
+    with open(path, "rb") as f:
+        content = f.read()
+    return list(
+        dict.fromkeys(
+            return_link_target(link)
+            for link in obs_funcs.return_wikilinks(content)
+            if link.is_note_link
+        )
+    )
+
+
+def return_target_file_name(target: str) -> str:
+    """The lowered file name a link target can resolve to, eg. "School/Maths" -> "maths.md"."""
+    return f"{target.split('/')[-1]}.md".lower()
+
+
+class BacklinkIndex:
+    """targets_by_path: note path -> the link targets written in it.
+    resolved_by_path: note path -> the note each of its targets resolves to (None if it resolves to nothing).
+    referrers_by_path: note path -> the notes with a link resolving to it.
+    vault_file_names: Every markdown note of the vault.
+    """
+
+    def __init__(
+        self,
+        root_directory: Path,
+        vault_file_names: help_funcs.VaultFileNames,
+        targets_by_path: dict[Path, list[str]],
+        resolved_by_path: dict[Path, list[Path | None]],
+        referrers_by_path: dict[Path, set[Path]],
+    ):
+        self.root_directory = Path(root_directory)
+        self.vault_file_names = vault_file_names
+        self.targets_by_path = targets_by_path
+        self.resolved_by_path = resolved_by_path
+        self.referrers_by_path = referrers_by_path
+
+    def referrers(self, path: Path) -> list[Path]:
+        """Returns every note with a link that resolves to path."""
+        return sorted(self.referrers_by_path.get(Path(path), ()))
+
+    def targets_resolving_to(self, linking_note: Path, path: Path) -> list[str]:
+        """Returns the link targets written in linking_note that resolve to path."""
+        return [
+            target
+            for target, linked_file in zip(
+                self.targets_by_path.get(linking_note, []),
+                self.resolved_by_path.get(linking_note, []),
+            )
+            if linked_file == path
+        ]
+
+    def __repr__(self) -> str:
+        return f"BacklinkIndex({self.root_directory}, {len(self.targets_by_path)} notes)"
+
+
+def build_backlink_index(
+    root_directory: Path,
+    index_path: Path | None = None,
+    workers: int | None = None,
+) -> BacklinkIndex:
+    """Returns the up to date BacklinkIndex of the vault, updating only what changed since it was last saved
+    (see the module docstring).
+    index_path: Where the index is kept (default: .backlink_index.json in the vault folder).
+    workers: Number of processes reading changed notes (see vault_executor.map_notes).
+    """
+    root_directory = Path(root_directory)
+    if index_path is None:
+        index_path = root_directory / DEFAULT_INDEX_NAME
+    stats_by_path = {
+        Path(entry.path): entry.stat()
+        for entry in help_funcs.scan_directory(root_directory, with_stats=True)
+        if entry.name.endswith(".md")
+    }
+    vault_file_names = help_funcs.VaultFileNames.from_paths(root_directory, stats_by_path)
+
+    saved_notes: dict[str, dict] = {}
+    saved_referrers: dict[str, list[str]] = {}
+    if index_path.exists():
+        with open(index_path, "r", encoding="utf-8") as f:
+            saved_index = json.load(f)
+        if saved_index.get("format_version") == INDEX_FORMAT_VERSION:
+            saved_notes = saved_index["notes"]
+            saved_referrers = saved_index["referrers"]
+    targets_by_path = {Path(path): note["targets"] for path, note in saved_notes.items()}
+    resolved_by_path = {
+        Path(path): [None if file is None else Path(file) for file in note["resolved"]]
+        for path, note in saved_notes.items()
+    }
+    referrers_by_path = {
+        Path(path): {Path(referrer) for referrer in referrers}
+        for path, referrers in saved_referrers.items()
+    }
+
+    changed_paths = []
+    for path, stat in stats_by_path.items():
+        saved_note = saved_notes.get(str(path))
+        if (
+            saved_note is None
+            or saved_note["mtime_ns"] != stat.st_mtime_ns
+            or saved_note["size"] != stat.st_size
+        ):
+            changed_paths.append(path)
+    deleted_paths = [path for path in targets_by_path if path not in stats_by_path]
+    added_paths = [path for path in changed_paths if str(path) not in saved_notes]
+
+    # links to a name a note was added or deleted under may now resolve to another note
+    changed_names = {path.name.lower() for path in added_paths + deleted_paths}
+    paths_to_resolve = set(changed_paths)
+    if changed_names:
+        for path, targets in targets_by_path.items():
+            if any(return_target_file_name(target) in changed_names for target in targets):
+                paths_to_resolve.add(path)
+
+    def remove_referrer(linking_note: Path) -> None:
+        for linked_file in set(resolved_by_path.pop(linking_note, [])):
+            referrers = referrers_by_path.get(linked_file)
+            if referrers is not None:
+                referrers.discard(linking_note)
+                if not referrers:
+                    del referrers_by_path[linked_file]
+
+    for path in deleted_paths:
+        remove_referrer(path)
+        del targets_by_path[path]
+        del saved_notes[str(path)]
+
+    for result in vault_executor.map_notes(
+        return_note_link_targets,
+        changed_paths,
+        workers=workers,
+        ordered=False,
+        sizes={path: stat.st_size for path, stat in stats_by_path.items()},
+    ):
+        if result.error is not None:
+            print(f"Unable to read {result.path}, treating it as empty:\n{result.error}")
+        targets_by_path[result.path] = result.value or []
+
+    for path in paths_to_resolve:
+        if path not in stats_by_path:
+            continue
+        remove_referrer(path)
+        resolved = [
+            vault_file_names.resolve(target, path) for target in targets_by_path[path]
+        ]
+        resolved_by_path[path] = resolved
+        for linked_file in resolved:
+            if linked_file is not None:
+                referrers_by_path.setdefault(linked_file, set()).add(path)
+        stat = stats_by_path[path]
+        saved_notes[str(path)] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "targets": targets_by_path[path],
+            "resolved": [None if file is None else str(file) for file in resolved],
+        }
+
+    if paths_to_resolve or deleted_paths:
+        temporary_path = index_path.with_name(f"{index_path.name}.tmp")
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "format_version": INDEX_FORMAT_VERSION,
+                    "notes": saved_notes,
+                    "referrers": {
+                        str(path): sorted(str(referrer) for referrer in referrers)
+                        for path, referrers in referrers_by_path.items()
+                    },
+                },
+                f,
+            )
+        os.replace(temporary_path, index_path)
+
+    return BacklinkIndex(
+        root_directory,
+        vault_file_names,
+        targets_by_path,
+        resolved_by_path,
+        referrers_by_path,
+    )
@@ -0,0 +1,248 @@
+"""
+Exports a note together with every note reachable from it by links, and every attachment those notes link to or
+embed (eg. ![[diagram.png]]), as one self-contained bundle:
+    a zip archive            (output path ending in .zip)
+    a mirrored folder tree   (any other output path)
+Files keep their path relative to the vault folder, so the links inside the bundle still resolve.
+
+The notes are read one link depth at a time, each depth in parallel by vault_executor.map_notes, and every note is
+written to the bundle as soon as it has been read. Attachments are streamed in fixed-size blocks, so memory use
+does not grow with the size of the vault or of its attachments.
+"""
+
+from abc import ABC, abstractmethod
+from functools import partial
+from pathlib import Path
+import re
+import shutil
+import zipfile
+import general_helper_functions as help_funcs
+import obsidian_helper_functions as obs_funcs
+import backlink_index
+import default_values
+import note_query
+import vault_executor
+
+# the same comments remove_flashcard_metadata removes, eg. <!--SR:!2024-01-01,3,250-->
+METADATA_COMMENT_REGEX = re.compile(rb"<!--.*?-->")
+# attachments in these formats are already compressed, deflating them again only costs time
+COMPRESSED_SUFFIXES = {
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".mp3", ".mp4", ".m4a", ".webm", ".ogg", ".zip", ".pdf",
+}
+COPY_BLOCK_BYTES = 1024 * 1024
+
+
+def read_bundle_note(
+    path: Path, strip_comments: bool = False
+) -> tuple[list[tuple[str, bool]], bytes]:
+    """Reads one note and returns ((link target, is a note link) for every distinct link and embed, its content).
+    strip_comments: Remove <!-- --> comments (eg. spaced repetition metadata) from the returned content.
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    links = list(
+        dict.fromkeys(
+            (backlink_index.return_link_target(link), link.is_note_link)
+            for link in obs_funcs.return_wikilinks(content)
+        )
+    )
+    if strip_comments:
+        content = METADATA_COMMENT_REGEX.sub(b"", content)
+    return links, content
+
+
+class _BundleWriter(ABC):
+    """Writes vault files to the bundle under their path relative to root_directory."""
+
+    def __init__(self, root_directory: Path, output_path: str | Path):
+        self.root_directory = Path(root_directory)
+        self.output_path = Path(output_path)
+        self.file_count = 0
+
+    def _return_bundle_path(self, path: Path) -> str:
+        return path.relative_to(self.root_directory).as_posix()
+
+    @abstractmethod
+    def write_bytes(self, path: Path, content: bytes) -> None:
+        """Writes content as the bundle file of path (a file of the vault)."""
+
+    @abstractmethod
+    def copy_file(self, path: Path) -> None:
+        """Copies the vault file path into the bundle."""
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+
+class ZipBundleWriter(_BundleWriter):
+    def __init__(self, root_directory: Path, output_path: str | Path):
+        super().__init__(root_directory, output_path)
+        self._zip_file = zipfile.ZipFile(self.output_path, "w")
+
+    def _return_zip_info(self, path: Path) -> zipfile.ZipInfo:
+        # keeps the modification time of the file in the vault
+        zip_info = zipfile.ZipInfo.from_file(path, self._return_bundle_path(path))
+        zip_info.compress_type = (
+            zipfile.ZIP_STORED
+            if path.suffix.lower() in COMPRESSED_SUFFIXES
+            else zipfile.ZIP_DEFLATED
+        )
+        return zip_info
+
+    def write_bytes(self, path: Path, content: bytes) -> None:
+        self._zip_file.writestr(self._return_zip_info(path), content)
+        self.file_count += 1
+
+    def copy_file(self, path: Path) -> None:
+        with open(path, "rb") as source, self._zip_file.open(
+            self._return_zip_info(path), "w", force_zip64=True
+        ) as target:
+            shutil.copyfileobj(source, target, COPY_BLOCK_BYTES)
+        self.file_count += 1
+
+    def close(self) -> None:
+        self._zip_file.close()
+
+
+class DirectoryBundleWriter(_BundleWriter):
+    def __init__(self, root_directory: Path, output_path: str | Path):
+        super().__init__(root_directory, output_path)
+        self.output_path.mkdir(parents=True, exist_ok=True)
+
+    def _return_output_file(self, path: Path) -> Path:
+        output_file = self.output_path / self._return_bundle_path(path)
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        return output_file
+
+    def write_bytes(self, path: Path, content: bytes) -> None:
+        output_file = self._return_output_file(path)
+        with open(output_file, "wb") as f:
+            f.write(content)
+        shutil.copystat(path, output_file)
+        self.file_count += 1
+
+    def copy_file(self, path: Path) -> None:
+        shutil.copy2(path, self._return_output_file(path))
+        self.file_count += 1
+
+
+def open_bundle_writer(root_directory: Path, output_path: str | Path) -> _BundleWriter:
+    """Returns a ZipBundleWriter for an output path ending in .zip, otherwise a DirectoryBundleWriter."""
+    if Path(output_path).suffix.lower() == ".zip":
+        return ZipBundleWriter(root_directory, output_path)
+    return DirectoryBundleWriter(root_directory, output_path)
+
+
+def export_bundle(
+    root_directory: Path,
+    start_file: Path | None,
+    output_path: str | Path,
+    max_link_depth: int = -1,
+    strip_comments: bool = False,
+    workers: int | None = None,
+    vault_file_names: help_funcs.VaultFileNames | None = None,
+    query: str | None = None,
+) -> tuple[int, int]:
+    """Writes start_file (a path in the vault, or relative to it), the notes linked from it (up to max_link_depth links away, -1 for no limit) and every
+    attachment linked or embedded in those notes to a zip archive or folder (see the module docstring).
+    strip_comments: Remove <!-- --> comments (eg. spaced repetition metadata) from the exported notes.
+    workers: Number of processes reading notes (see vault_executor.map_notes).
+    vault_file_names: Every file of the vault (notes and attachments). Built from the vault folder if not given.
+    query: Start from every note selected by this query (see note_query.py) instead of from start_file.
+
+    Returns (number of notes written, number of attachments written).
+    """
+    root_directory = Path(root_directory)
+    if query is not None:
+        start_files = note_query.select_vault_notes(root_directory, query, workers)
+        if not start_files:
+            raise ValueError(f"No notes are selected by {query!r}.")
+    else:
+        # the same path as the vault listing gives it, so that it is written under its path relative to the vault
+        resolved_root_directory = root_directory.resolve()
+        resolved_start_file = (root_directory / start_file).resolve()
+        if not resolved_start_file.is_relative_to(resolved_root_directory):
+            raise ValueError(f"{start_file} is not in the vault {root_directory}.")
+        start_file = root_directory / resolved_start_file.relative_to(resolved_root_directory)
+        if not start_file.is_file():
+            raise ValueError(f"{start_file} does not exist.")
+        start_files = [start_file]
+    if vault_file_names is None:
+        vault_file_names = help_funcs.VaultFileNames(
+            root_directory,
+            help_funcs.return_all_paths_in_directory_as_multimap(root_directory),
+        )
+
+    found_notes = set(start_files)
+    # dict to keep the order attachments were found in
+    found_attachments: dict[Path, None] = {}
+    unfindable_links: list[tuple[Path, str]] = []
+    note_count = 0
+    with open_bundle_writer(root_directory, output_path) as writer:
+        level = sorted(found_notes)
+        depth = 0
+        while level:
+            next_level = []
+            for result in vault_executor.map_notes(
+                partial(read_bundle_note, strip_comments=strip_comments),
+                level,
+                workers=workers,
+                ordered=False,
+            ):
+                if result.error is not None:
+                    print(f"Unable to export {result.path}:\n{result.error}")
+                    continue
+                links, content = result.value
+                writer.write_bytes(result.path, content)
+                note_count += 1
+                for target, is_note_link in links:
+                    if not target:
+                        continue  # [[#Heading]] link to the note itself
+                    if is_note_link:
+                        linked_file = vault_file_names.resolve(target, result.path)
+                    else:
+                        linked_file = vault_file_names.resolve_file_name(target, result.path)
+                    if linked_file is None:
+                        unfindable_links.append((result.path, target))
+                    elif linked_file.suffix != ".md":
+                        # attachments are exported even from notes whose links are not followed
+                        found_attachments[linked_file] = None
+                    elif depth != max_link_depth and linked_file not in found_notes:
+                        found_notes.add(linked_file)
+                        next_level.append(linked_file)
+            level = sorted(next_level)
+            depth += 1
+
+        for attachment in found_attachments:
+            try:
+                writer.copy_file(attachment)
+            except OSError as error:
+                print(f"Unable to export {attachment}: {error}")
+
+    if unfindable_links:
+        print(f"{len(unfindable_links)} link(s) could not be found:")
+        for path, target in unfindable_links:
+            print(f"    [[{target}]] in {path.name}")
+    attachment_count = writer.file_count - note_count
+    print(
+        f"{note_count} note(s) and {attachment_count} attachment(s) exported to {output_path}"
+    )
+    return note_count, attachment_count
+
+
+if __name__ == "__main__":
+    input_directory = help_funcs.get_input_directory(
+        DEFAULT_DIRECTORY=default_values.Default_Input_Directory
+    )
+    start_file_path = Path(help_funcs.get_start_file(default_values.Default_File))
+    output_path = help_funcs.get_output_directory(
+        f"{input_directory}_{start_file_path.stem}.zip"
+    )
+    export_bundle(Path(input_directory), start_file_path, output_path, strip_comments=True)
+    input("Press anything to close...")
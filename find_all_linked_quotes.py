@@ -1,66 +1,222 @@
 """
-Finds and returns all quotes that are linked to a particular file with an adjustable level of recursion depth.
-Also optionally checks if any quotes are found that do not have a an appropriate yaml tag eg. english-flashcards.
-"""
-"""
+Finds all the quotes (> blockquotes and > [!type] callouts) in the notes linked from a start note,
+following links up to an adjustable depth.
+Also flags quotes found in notes that do not have an appropriate yaml tag eg. english-flashcards.
 
-CURRENTLY NOT WORKING IN THE SLIGHTEST
-    
+Quotes are yielded one at a time while the notes are read (see iter_linked_quotes) and written straight to the
+output note, so even a traversal of the whole vault never holds more than one note's quotes in memory.
 """
 
-import glob
 import os
-from pprint import pprint
+from pathlib import Path
+import re
+from typing import Iterator
 import obsidian_helper_functions as obs
 import general_helper_functions as help_funcs
+import default_values
+import note_query
+import vault_index
 
-if __name__ == "__main__":
-    # default_input_directory = r"d:\Obsidian"
-    # all_full_file_paths = help_funcs.return_all_full_file_paths(default_input_directory)
-    # default_start_file = all_full_file_paths[0]
+CALLOUT_REGEX = re.compile(r"^\[!([\w-]+)\][+-]?\s*(.*)$")
+REQUIRED_TAG = "english-flashcards"
+
+
+class LinkedQuote:
+    """A blockquote or callout found in a linked note.
+    depth: Number of links followed from the start note to reach the note.
+    line_number: First line of the quote in the note (0 based).
+    callout_type: eg. "quote" or "note" for a callout, None for a plain blockquote.
+    callout_title: Text after "[!type]" on the callout's first line ("" if there is none).
+    text: The quote without its ">" markers.
+    missing_required_tag: True if the note does not have the required tag.
+    """
 
-    # start_file_path = help_funcs.get_start_file(default_start_file)
-    # start_file_directory = os.path.dirname(start_file_path)
+    def __init__(
+        self,
+        path: Path,
+        depth: int,
+        line_number: int,
+        callout_type: str | None,
+        callout_title: str,
+        text: str,
+        missing_required_tag: bool = False,
+    ):
+        self.path = path
+        self.depth = depth
+        self.line_number = line_number
+        self.callout_type = callout_type
+        self.callout_title = callout_title
+        self.text = text
+        self.missing_required_tag = missing_required_tag
+
+    def __repr__(self) -> str:
+        kind = f"callout {self.callout_type}" if self.callout_type else "quote"
+        return f"LinkedQuote({self.path.name}:{self.line_number}, {kind})"
+
+
+def return_quote_blocks(
+    all_file_lines: list[str],
+) -> list[tuple[int, str | None, str, str]]:
+    """Returns (first line number, callout type or None, callout title, text) for every blockquote and callout in a note.
+    Lines inside ``` code blocks are ignored.
+    """
+    quote_blocks = []
+    quote_lines: list[str] = []
+    first_line_number = 0
+    in_code_block = False
+    for line_number, line in enumerate(all_file_lines + [""]):
+        stripped_line = line.strip()
+        if stripped_line.startswith("```"):
+            in_code_block = not in_code_block
+        is_quote_line = not in_code_block and stripped_line.startswith(">")
+        if is_quote_line:
+            if not quote_lines:
+                first_line_number = line_number
+            text = stripped_line[1:]
+            quote_lines.append(text[1:] if text.startswith(" ") else text)
+            continue
+        if quote_lines:
+            callout_match = CALLOUT_REGEX.match(quote_lines[0])
+            if callout_match:
+                callout_type = callout_match.group(1).lower()
+                callout_title = callout_match.group(2).strip()
+                quote_lines = quote_lines[1:]
+            else:
+                callout_type = None
+                callout_title = ""
+            text = "\n".join(quote_lines).strip()
+            if text or callout_title:
+                quote_blocks.append(
+                    (first_line_number, callout_type, callout_title, text)
+                )
+            quote_lines = []
+    return quote_blocks
 
-    start_file_path = r"D:\Obsidian\File Level 0.md"
-    start_file_directory = r"D:\Obsidian"
 
-    pprint(
-        obs.return_linked_files_with_recursion_depth__V2(
-            start_file_path, start_file_directory, recursion_depth_max=10
+def iter_linked_quotes(
+    root_directory: Path,
+    start_file: Path | None,
+    max_link_depth: int = -1,
+    required_tag: str | None = REQUIRED_TAG,
+    vault_file_names: help_funcs.VaultFileNames | None = None,
+    query: str | None = None,
+) -> Iterator[LinkedQuote]:
+    """Yields every quote in start_file (a path in the vault, or relative to it) and the notes linked from it,
+    one link depth at a time, nearest notes first. Each note is read once, even if it is linked from many notes,
+    and its quotes are yielded before the next note is read.
+    max_link_depth: Number of links to follow from the start note (-1 for no limit).
+    required_tag: Quotes in notes without this yaml tag are flagged with missing_required_tag (None to not check).
+    query: Start from every note selected by this query (see note_query.py) instead of from start_file.
+    """
+    root_directory = Path(root_directory)
+    if query is not None:
+        start_files = note_query.select_vault_notes(root_directory, query)
+    else:
+        # the same path as the vault listing gives it, so that links to the note can be written relative to the vault
+        resolved_root_directory = root_directory.resolve()
+        resolved_start_file = (root_directory / start_file).resolve()
+        if not resolved_start_file.is_relative_to(resolved_root_directory):
+            raise ValueError(f"{start_file} is not in the vault {root_directory}.")
+        start_files = [
+            root_directory / resolved_start_file.relative_to(resolved_root_directory)
+        ]
+
+    if vault_file_names is None:
+        vault_file_names = help_funcs.VaultFileNames(
+            root_directory,
+            help_funcs.return_all_paths_in_directory_as_multimap(root_directory),
         )
-    )
 
-    TAG_NAMES = {"software": "softwaredd\n", "flashcards": "flashcards\n"}
+    visited = set(start_files)
+    level = list(start_files)
+    depth = 0
+    while level:
+        next_level = []
+        for path in level:
+            # the quotes and the links of a note come from the same read
+            with open(path, "r", encoding="utf8") as f:
+                all_file_lines = f.readlines()
 
-    filenames = glob.glob(
-        os.path.join(start_file_directory, "**/*.md"), recursive=True
-    )  # get all .md files in the input directory
+            quote_blocks = return_quote_blocks(all_file_lines)
+            if quote_blocks:
+                missing_required_tag = False
+                if required_tag is not None:
+                    tags, _, _, _ = vault_index.return_frontmatter_columns(all_file_lines)
+                    missing_required_tag = required_tag.lower() not in {
+                        tag.lower() for tag in tags
+                    }
+                for line_number, callout_type, callout_title, text in quote_blocks:
+                    yield LinkedQuote(
+                        path,
+                        depth,
+                        line_number,
+                        callout_type,
+                        callout_title,
+                        text,
+                        missing_required_tag,
+                    )
 
-    for file in filenames:
-        path = os.path.join(start_file_directory, file)
-        basename = os.path.basename(
-            file
-        )  # used as file output name because directory structure is removed
-        with open(file, "r", encoding="utf8") as f:
-            all_file_lines = f.readlines()
+            if depth == max_link_depth:
+                continue
+            for linked_file_base_name in obs.return_linked_base_names(
+                all_file_lines, must_have_no_extension=True
+            ):
+                linked_file = vault_file_names.resolve(linked_file_base_name, path)
+                if linked_file is not None and linked_file not in visited:
+                    visited.add(linked_file)
+                    next_level.append(linked_file)
+        level = next_level
+        depth += 1
 
-            if obs.has_yaml_tag(
-                TAG_NAMES["software"], all_file_lines
-            ) and obs.has_yaml_tag(TAG_NAMES["flashcards"], all_file_lines):
-                # print("Has both tags")
 
-                linked_attachments = obs.return_linked_attachments(all_file_lines)
+def write_linked_quotes(
+    quotes: Iterator[LinkedQuote], root_directory: Path, output_file: Path
+) -> tuple[int, list[Path]]:
+    """Writes quotes to a markdown note as they arrive, grouped under a heading linking to each note.
+    Returns (number of quotes written, notes missing the required tag).
+    """
+    root_directory = Path(root_directory)
+    number_of_quotes = 0
+    notes_missing_tag: list[Path] = []
+    current_path = None
+    with open(output_file, "w", encoding="utf8") as f:
+        for quote in quotes:
+            if quote.path != current_path:
+                current_path = quote.path
+                link = quote.path.relative_to(root_directory).with_suffix("").as_posix()
+                flag = ""
+                if quote.missing_required_tag:
+                    notes_missing_tag.append(quote.path)
+                    flag = " (missing tag)"
+                f.write(f"## [[{link}|{quote.path.stem}]]{flag}\n\n")
+            callout = ""
+            if quote.callout_type:
+                callout = f"> [!{quote.callout_type}] {quote.callout_title}".rstrip() + "\n"
+            quoted_text = "\n".join(f"> {line}" for line in quote.text.splitlines())
+            f.write(f"{callout}{quoted_text}\n\n")
+            number_of_quotes += 1
+    return number_of_quotes, notes_missing_tag
 
-                obs.copy_attachments_to_new_directory(
-                    linked_attachments,
-                    start_file_directory,
-                    os.path.join(output_directory, "attachments\\"),
-                )
 
-                changed_file = obs.remove_flashcard_metadata(all_file_lines)
-                with open(
-                    os.path.join(output_directory, basename), "w", encoding="utf8"
-                ) as file:
-                    file.writelines(changed_file)
+if __name__ == "__main__":
+    input_directory = help_funcs.get_input_directory(
+        DEFAULT_DIRECTORY=default_values.Default_Input_Directory
+    )
+    start_file_path = Path(help_funcs.get_start_file(default_values.Default_File))
+    output_directory = help_funcs.get_output_directory(
+        f"{input_directory}_linked_quotes"
+    )
+    os.makedirs(output_directory, exist_ok=True)
+    output_file = Path(output_directory) / f"Quotes linked from {start_file_path.stem}.md"
+
+    number_of_quotes, notes_missing_tag = write_linked_quotes(
+        iter_linked_quotes(Path(input_directory), start_file_path, max_link_depth=10),
+        Path(input_directory),
+        output_file,
+    )
+    print(f"{number_of_quotes} quotes written to {output_file}")
+    if notes_missing_tag:
+        print(f"Quotes found in notes without the '{REQUIRED_TAG}' tag:")
+        for path in notes_missing_tag:
+            print(help_funcs.terminal_link(path, path.name[:-3]))
     input("Press anything to close...")
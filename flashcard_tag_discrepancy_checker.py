@@ -1,9 +1,13 @@
+from functools import partial
 from pathlib import Path
 from pprint import pprint
 import general_helper_functions as help_funcs
 import obsidian_helper_functions as obs_funcs
 import default_values
 from typing import Iterable
+import tag_matrix
+import vault_executor
+import vault_index
 
 
 def handle_flashcard_tag_but_no_flashcard_section(
@@ -36,7 +40,11 @@ def handle_flashcard_tag_but_no_flashcard_section(
 
 
 def handle_no_flashcard_tag_but_has_flashcard_section(
-    all_file_lines: list[str], path: Path, name: str, yaml_tags_list: list[str]
+    all_file_lines: list[str],
+    path: Path,
+    name: str,
+    yaml_tags_list: list[str],
+    suggested_tags: list[tuple[str, float]] | None = None,
 ):
     multiline_question_lines = (
         obs_funcs.check_for_multiline_flashcard_style_section_in_note(
@@ -68,6 +76,11 @@ def handle_no_flashcard_tag_but_has_flashcard_section(
                 )
                 for line in singleline_question_lines:
                     print(line)
+            if suggested_tags:
+                print(
+                    "suggested tags: "
+                    + ", ".join(f"{tag} ({score:.2f})" for tag, score in suggested_tags)
+                )
             choice = ""
             while choice not in ["y", "n"]:
                 choice = input("add flashcard tag? (y/n): ")
@@ -83,10 +96,34 @@ def handle_no_flashcard_tag_but_has_flashcard_section(
             print("continuing program..\n\n")
 
 
-def check_for_flashcard_tag_discrepancy(input_directory: Path):
-    all_files = help_funcs.return_all_paths_in_directory_as_dictionary(
+def return_flashcard_tag_discrepancies(
+    path: Path, yaml_tags: list[str]
+) -> tuple[list[str], bool]:
+    """Returns (the flashcard tags the note has, whether the note has a flashcard section).
+    Runs in a worker process, so it only inspects the note and never asks the user anything.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        all_file_lines = f.readlines()
+    tags_in_note = [tag for tag in yaml_tags if obs_funcs.has_yaml_tag(tag, all_file_lines)]
+    has_flashcard_section = (
+        len(
+            obs_funcs.check_for_multiline_flashcard_style_section_in_note(
+                all_file_lines, file_name=path.name
+            )
+        )
+        > 0
+        or len(obs_funcs.check_for_singleline_flashcard_style_section_in_note(all_file_lines))
+        > 0
+    )
+    return tags_in_note, has_flashcard_section
+
+
+def check_for_flashcard_tag_discrepancy(input_directory: Path, workers: int | None = None):
+    # every note, including notes sharing a name with a note in another folder
+    all_paths_by_name = help_funcs.return_all_paths_in_directory_as_multimap(
         input_directory, file_type=".md"
     )
+    all_files = help_funcs.VaultFileNames(input_directory, all_paths_by_name).as_dictionary()
 
     yaml_allowed_flashcard_map_notes = [
         "School Subject Flashcard Tags",
@@ -95,21 +132,45 @@ def check_for_flashcard_tag_discrepancy(input_directory: Path):
     yaml_tags_dict = obs_funcs.extract_tags_from_note_basenames(
         input_directory, all_files, yaml_allowed_flashcard_map_notes
     )
+    yaml_tags: list[str] = yaml_tags_dict["yaml_tags"]
 
-    for name, path in all_files.items():
+    # tags used by the notes around each note, to suggest a flashcard tag for notes without one
+    index = vault_index.build_vault_index(
+        input_directory, all_paths_by_name, frontmatter_only=True, workers=workers
+    )
+    matrices = tag_matrix.build_tag_matrices(index)
+    note_ids_by_path = {path: note_id for note_id, path in enumerate(index.paths)}
+
+    # every note is checked in parallel, only the notes with a discrepancy are handled (interactively) here
+    for result in vault_executor.map_notes(
+        partial(return_flashcard_tag_discrepancies, yaml_tags=yaml_tags),
+        index.paths,
+        workers=workers,
+    ):
+        if result.error is not None:
+            print(f"Unable to check {result.path}:\n{result.error}")
+            continue
+        tags_in_note, has_flashcard_section = result.value
+        if has_flashcard_section == bool(tags_in_note):
+            continue
+        path = result.path
+        name = path.name
         with open(path, "r", encoding="utf-8") as f:
             all_file_lines = f.readlines()
-        yaml_tags: list[str] = yaml_tags_dict["yaml_tags"]
-        for tag in yaml_tags:
-            if obs_funcs.has_yaml_tag(tag, all_file_lines):
-                handle_flashcard_tag_but_no_flashcard_section(
-                    all_file_lines, path, name, tag
-                )
+        for tag in tags_in_note:
+            handle_flashcard_tag_but_no_flashcard_section(
+                all_file_lines, path, name, tag
+            )
 
         handle_no_flashcard_tag_but_has_flashcard_section(
-            all_file_lines, path, name, yaml_tags
+            all_file_lines,
+            path,
+            name,
+            yaml_tags,
+            suggested_tags=matrices.suggest_tags(note_ids_by_path[path], yaml_tags),
         )
-        
+
+
 if __name__ == "__main__":
     input_directory = Path(help_funcs.get_input_directory(
         DEFAULT_DIRECTORY=default_values.Default_Input_Directory
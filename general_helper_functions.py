@@ -1,3 +1,4 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import fnmatch
 from pprint import pprint
 import re
@@ -89,32 +90,363 @@ def return_all_full_file_paths(INPUT_DIRECTORY):
     return all_file_paths_from_input
 
 
+# name of the file in the vault folder holding extra ignore rules (one gitignore-style pattern per line)
+IGNORE_FILE_NAME = ".obsidianignore"
+# threads listing folders at once in scan_directory (folder listings mostly wait on the disk or network share)
+DEFAULT_SCAN_WORKERS = 8
+# always ignored unless a rule in the ignore file re-includes them with "!"
+DEFAULT_IGNORE_PATTERNS = [
+    ".obsidian/",
+    ".trash/",
+    ".git/",
+    ".github/",
+    "node_modules/",
+    ".DS_Store",
+    ".link_tree_snapshot*.json",
+    ".sr_store.npz",
+    ".backlink_index.json",
+    ".text_index.npz",
+]
+
+
+class IgnoreRules:
+    """gitignore-style rules deciding which files and folders of the vault are skipped.
+    Supported: "#" comments, "!" to re-include, a trailing "/" for folders only, a "/" at the start or in the
+    middle to match from the vault root (otherwise the name is matched in any folder), and *, ?, [abc] and **.
+    Like git, a file inside an ignored folder can't be re-included.
+    """
+
+    def __init__(self, patterns: list[str]):
+        self.patterns = patterns
+        # (regex, is_negated, folders_only), the last matching rule decides
+        self._rules: list[tuple[re.Pattern, bool, bool]] = []
+        for pattern in patterns:
+            pattern = pattern.rstrip("\n").rstrip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            is_negated = pattern.startswith("!")
+            if is_negated:
+                pattern = pattern[1:]
+            folders_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+            is_anchored = "/" in pattern
+            pattern = pattern.lstrip("/")
+            regex = self._translate(pattern)
+            if not is_anchored:
+                regex = f"(?:.*/)?{regex}"
+            self._rules.append((re.compile(f"{regex}$"), is_negated, folders_only))
+
+    @staticmethod
+    def _translate(pattern: str) -> str:
+        regex = ""
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith("**/", i):
+                regex += "(?:.*/)?"
+                i += 3
+            elif pattern.startswith("**", i):
+                regex += ".*"
+                i += 2
+            elif pattern[i] == "*":
+                regex += "[^/]*"
+                i += 1
+            elif pattern[i] == "?":
+                regex += "[^/]"
+                i += 1
+            elif pattern[i] == "[" and "]" in pattern[i + 1 :]:
+                end = pattern.index("]", i + 1)
+                character_class = pattern[i + 1 : end].replace("\\", "\\\\")
+                if character_class.startswith("!"):
+                    character_class = "^" + character_class[1:]
+                regex += f"[{character_class}]"
+                i = end + 1
+            else:
+                regex += re.escape(pattern[i])
+                i += 1
+        return regex
+
+    def is_ignored(self, relative_path: str, is_folder: bool = False) -> bool:
+        """relative_path: Path from the vault root using "/" (eg. "Attachments/image.png")."""
+        ignored = False
+        for regex, is_negated, folders_only in self._rules:
+            if folders_only and not is_folder:
+                continue
+            if regex.match(relative_path):
+                ignored = not is_negated
+        return ignored
+
+
+def load_ignore_rules(root_directory: str | Path) -> IgnoreRules:
+    """Returns the default ignore rules followed by those in the vault's .obsidianignore file (if there is one)."""
+    patterns = list(DEFAULT_IGNORE_PATTERNS)
+    ignore_file = Path(root_directory) / IGNORE_FILE_NAME
+    if ignore_file.exists():
+        with open(ignore_file, "r", encoding="utf-8") as f:
+            patterns += f.readlines()
+    return IgnoreRules(patterns)
+
+
+def walk_directory(
+    directory: str | Path,
+    ignore_rules: IgnoreRules | None = None,
+    root_directory: str | Path | None = None,
+):
+    """os.walk that never enters ignored folders and leaves out ignored files.
+    ignore_rules: Default: load_ignore_rules(root_directory).
+    root_directory: The vault folder the rules are relative to (default: directory).
+    """
+    if root_directory is None:
+        root_directory = directory
+    if ignore_rules is None:
+        ignore_rules = load_ignore_rules(root_directory)
+    for current_folder, subfolders, filenames in os.walk(directory):
+        relative_folder = Path(current_folder).relative_to(root_directory).as_posix()
+        prefix = "" if relative_folder == "." else f"{relative_folder}/"
+        # pruning subfolders in place stops os.walk from entering them
+        subfolders[:] = [
+            subfolder
+            for subfolder in subfolders
+            if not ignore_rules.is_ignored(f"{prefix}{subfolder}", is_folder=True)
+        ]
+        filenames = [
+            filename
+            for filename in filenames
+            if not ignore_rules.is_ignored(f"{prefix}{filename}")
+        ]
+        yield current_folder, subfolders, filenames
+
+
+def _scan_folder(
+    folder: str, relative_folder: str, ignore_rules: IgnoreRules, with_stats: bool
+) -> tuple[list[tuple[str, str]], list[os.DirEntry]]:
+    """Lists one folder. Returns ((path, relative path) of every subfolder to enter, every file kept).
+    Like os.walk, a folder that can't be listed is skipped. With with_stats, files that can't be stat-ed
+    (eg. broken symlinks) are skipped too.
+    """
+    subfolders = []
+    files = []
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                relative_path = f"{relative_folder}{entry.name}"
+                # DirEntry knows whether it is a folder without an extra stat call (on most file systems)
+                try:
+                    is_folder = entry.is_dir()
+                except OSError:
+                    is_folder = False
+                if is_folder:
+                    if not ignore_rules.is_ignored(relative_path, is_folder=True):
+                        # like os.walk, symlinked folders are not followed
+                        if not entry.is_symlink():
+                            subfolders.append((entry.path, f"{relative_path}/"))
+                elif not ignore_rules.is_ignored(relative_path):
+                    if with_stats:
+                        try:
+                            entry.stat()  # cached on the entry, so it is done here in the worker thread
+                        except OSError:
+                            continue
+                    files.append(entry)
+    except OSError:
+        return [], []
+    return subfolders, files
+
+
+def scan_directory(
+    directory: str | Path,
+    ignore_rules: IgnoreRules | None = None,
+    workers: int | None = None,
+    with_stats: bool = False,
+) -> list[os.DirEntry]:
+    """Returns a DirEntry for every file in directory and its subfolders, listing many folders at once.
+    Same files as walk_directory, in no particular order.
+    ignore_rules: Default: load_ignore_rules(directory).
+    workers: Number of folder listing threads (default: DEFAULT_SCAN_WORKERS). 1 lists one folder at a time.
+    with_stats: Also stat every file in the worker threads, so entry.stat() costs nothing afterwards.
+    """
+    if ignore_rules is None:
+        ignore_rules = load_ignore_rules(directory)
+    workers = workers or DEFAULT_SCAN_WORKERS
+    files: list[os.DirEntry] = []
+    if workers == 1:
+        folders = [(str(directory), "")]
+        while folders:
+            subfolders, folder_files = _scan_folder(
+                *folders.pop(), ignore_rules, with_stats
+            )
+            folders.extend(subfolders)
+            files.extend(folder_files)
+        return files
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = {
+            executor.submit(_scan_folder, str(directory), "", ignore_rules, with_stats)
+        }
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                subfolders, folder_files = future.result()
+                files.extend(folder_files)
+                for subfolder, relative_subfolder in subfolders:
+                    in_flight.add(
+                        executor.submit(
+                            _scan_folder,
+                            subfolder,
+                            relative_subfolder,
+                            ignore_rules,
+                            with_stats,
+                        )
+                    )
+    return files
+
+
+def return_all_paths_in_directory_as_multimap(
+    INPUT_DIRECTORY: Path,
+    file_type: str | None = None,
+    ignore_rules: IgnoreRules | None = None,
+    workers: int | None = None,
+) -> dict[str, list[Path]]:
+    """Returns a dictionary of all the files in the input directory.
+    key = file name
+    value = full paths of every file with that name (more than one when notes in different folders share a name)
+
+    If file_type is specified, only files of that type will be returned.
+    file_type should be a string with the period included (e.g. ".md")
+    Files and folders matching ignore_rules (default: load_ignore_rules(INPUT_DIRECTORY)) are skipped.
+    workers: Number of threads listing folders (see scan_directory).
+    """
+    paths_by_name: dict[str, list[Path]] = {}
+    for entry in scan_directory(INPUT_DIRECTORY, ignore_rules, workers):
+        path = Path(entry.path)
+        if file_type != None and path.suffix != file_type:
+            continue
+        try:
+            paths_by_name[entry.name].append(path)
+        except KeyError:
+            paths_by_name[entry.name] = [path]
+    for paths in paths_by_name.values():
+        paths.sort()
+    return paths_by_name
+
+
+class VaultFileNames:
+    """File name -> paths of every file in the vault, resolving links the way Obsidian does.
+    A link to a name shared by several files resolves to the one in the linking note's folder,
+    otherwise to the one with the shortest path from the vault root.
+    """
+
+    def __init__(self, root_directory: str | Path, paths_by_name: dict[str, list[Path]]):
+        self.root_directory = Path(root_directory)
+        self.paths_by_name = {
+            name: sorted(paths, key=self._path_preference)
+            for name, paths in paths_by_name.items()
+        }
+        self.lowered_paths_by_name: dict[str, list[Path]] = {}
+        for name, paths in self.paths_by_name.items():
+            self.lowered_paths_by_name.setdefault(name.lower(), []).extend(paths)
+        for paths in self.lowered_paths_by_name.values():
+            paths.sort(key=self._path_preference)
+        self.paths = sorted(
+            path for paths in self.paths_by_name.values() for path in paths
+        )
+        self.all_paths = set(self.paths)
+
+    @classmethod
+    def from_paths(cls, root_directory: str | Path, paths) -> "VaultFileNames":
+        paths_by_name: dict[str, list[Path]] = {}
+        for path in paths:
+            paths_by_name.setdefault(Path(path).name, []).append(Path(path))
+        return cls(root_directory, paths_by_name)
+
+    def _path_preference(self, path: Path) -> tuple[int, str]:
+        relative_path = path.relative_to(self.root_directory)
+        return len(relative_path.parts), relative_path.as_posix().lower()
+
+    def _return_candidates(self, name: str) -> list[Path]:
+        if name in self.paths_by_name:
+            return self.paths_by_name[name]
+        return self.lowered_paths_by_name.get(name.lower(), [])
+
+    def resolve(
+        self, linked_file_base_name: str, linking_note: Path | None = None
+    ) -> Path | None:
+        """Returns the file a [[linked_file_base_name]] link in linking_note points at (None if there is none).
+        Like convert_file_base_names_to_full_path_V2, the link is assumed to be to a markdown file.
+        A link containing "/" is a path from the vault root, or the end of one.
+        """
+        return self.resolve_file_name(f"{linked_file_base_name}.md", linking_note)
+
+    def resolve_file_name(
+        self, linked_file_name: str, linking_note: Path | None = None
+    ) -> Path | None:
+        """Same as resolve for a link that includes the file's extension, eg. [[diagram.png]]."""
+        if "/" in linked_file_name:
+            path_of_linked_file = self.root_directory / Path(linked_file_name)
+            if path_of_linked_file in self.all_paths:
+                return path_of_linked_file
+            lowered_link_path = f"/{linked_file_name.lower()}"
+            candidates = [
+                path
+                for path in self._return_candidates(Path(linked_file_name).name)
+                if f"/{path.relative_to(self.root_directory).as_posix().lower()}".endswith(
+                    lowered_link_path
+                )
+            ]
+        else:
+            candidates = self._return_candidates(linked_file_name)
+        if not candidates:
+            return None
+        if len(candidates) > 1 and linking_note is not None:
+            linking_folder = Path(linking_note).parent
+            for path in candidates:
+                if path.parent == linking_folder:
+                    return path
+        return candidates[0]
+
+    def ambiguous_names(self) -> dict[str, list[Path]]:
+        """Returns every file name shared by more than one file (ignoring case, like Obsidian)."""
+        return {
+            name: paths
+            for name, paths in sorted(self.lowered_paths_by_name.items())
+            if len(paths) > 1
+        }
+
+    def as_dictionary(self) -> dict[str, Path]:
+        """Returns file name -> the path a link from outside any of their folders resolves to."""
+        return {name: paths[0] for name, paths in self.paths_by_name.items()}
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __repr__(self) -> str:
+        return f"VaultFileNames({self.root_directory}, {len(self)} files)"
+
+
 def return_all_paths_in_directory_as_dictionary(
-    INPUT_DIRECTORY: Path, file_type: str | None = None
+    INPUT_DIRECTORY: Path,
+    file_type: str | None = None,
+    ignore_rules: IgnoreRules | None = None,
+    workers: int | None = None,
 ) -> dict[str, Path]:
     """Returns a dictionary of all the files in the input directory.
     key = file name
-    value = full path to file
+    value = full path to file (when several files share a name, the one with the shortest path from INPUT_DIRECTORY)
 
     If file_type is specified, only files of that type will be returned.
     file_type should be a string with the period included (e.g. ".md")
+    Use return_all_paths_in_directory_as_multimap / VaultFileNames to see every file sharing a name.
     """
-    all_files_in_base_directory = {
-        Path(file).name: Path(root) / file
-        for root, dirs, files in os.walk(INPUT_DIRECTORY)
-        for file in files
-    }
-    # Optionally filter by file type
-    if file_type != None:
-        all_files_in_base_directory = {
-            name: path
-            for (name, path) in all_files_in_base_directory.items()
-            if path.suffix == f"{file_type}"
-        }
-    return all_files_in_base_directory
+    return VaultFileNames(
+        INPUT_DIRECTORY,
+        return_all_paths_in_directory_as_multimap(
+            INPUT_DIRECTORY, file_type, ignore_rules, workers
+        ),
+    ).as_dictionary()
 
 
-def find_file_path(directory: str, base_name: str) -> str | None:
+def find_file_path(
+    directory: str, base_name: str, ignore_rules: IgnoreRules | None = None
+) -> str | None:
+    root_directory = directory
     if "/" in base_name:
         # for use with Obsidian, the base_name can sometime be a file path relative to the vault root
         # this occurs when there are multiple files with the same basename, requiring a more specific pointer to the file.
@@ -124,7 +456,11 @@ def find_file_path(directory: str, base_name: str) -> str | None:
         more_specific_path = os.path.join(directory, relative_path)
         directory = more_specific_path
         base_name = real_base_name
-    for current_folder, subfolders, filenames in os.walk(directory):
+    if not os.path.isdir(directory):
+        return None
+    for current_folder, subfolders, filenames in walk_directory(
+        directory, ignore_rules, root_directory
+    ):
         for filename in fnmatch.filter(filenames, f"{base_name}.*"):
             return os.path.join(current_folder, str(filename))
     return None
@@ -155,6 +491,8 @@ def convert_file_base_names_to_full_path_V2(
     linked_file_base_names: list[str],
     all_files_in_base_directory: dict[str, Path],
     root_directory: str | Path,
+    vault_file_names: VaultFileNames | None = None,
+    linking_note: Path | None = None,
 ) -> tuple[list[Path], list[str]]:
     """This function needs refactoring but im too lazy to do so now.
     Here's what is does:
@@ -164,11 +502,27 @@ def convert_file_base_names_to_full_path_V2(
     3. If the input file base name is not a file path relative to the vault root, it checks to see if the file exists in the vault root by searching with just the base name
     4. if it can't find it, it lowers its own value and all of the dictionary keys and searches again (time consuming)
     5. if it still can't find it, it prints a message to the terminal (would be better to raise an error with a logging module)
+
+    When vault_file_names is given it is used instead of all_files_in_base_directory, so links to a name shared
+    by several notes resolve the way Obsidian resolves them from linking_note (see VaultFileNames.resolve).
     """
     linked_files: list[Path] = []
     un_finable_files: list[str] = []
     for linked_file_base_name in linked_file_base_names:
-        if "/" in linked_file_base_name:
+        if not linked_file_base_name:
+            continue  # [[#Heading]] link to the linking note itself
+        if vault_file_names is not None:
+            linked_file = vault_file_names.resolve(linked_file_base_name, linking_note)
+            if linked_file is not None:
+                linked_files.append(linked_file)
+            else:
+                print(f"Linked file not found: {linked_file_base_name}\n")
+                if linked_file_base_name[-1] == " ":
+                    print(
+                        "Looks like there is a trailing space at the end of the file name!"
+                    )
+                un_finable_files.append(linked_file_base_name)
+        elif "/" in linked_file_base_name:
             all_file_paths_in_root_directory = [
                 file for file in all_files_in_base_directory.values()
             ]
@@ -211,3 +565,21 @@ def convert_file_base_names_to_full_path_V2(
                     un_finable_files.append(linked_file_base_name)
 
     return linked_files, un_finable_files
+
+
+def write_if_changed(path: str | Path, new_content: str) -> bool:
+    """Writes new_content to path unless the file already contains exactly that text.
+    Skipping identical writes keeps the modification time unchanged, so Obsidian sync does not pick the file up.
+
+    Returns True if the file was written.
+    """
+    path = Path(path)
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == new_content:
+                return False
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(new_content)
+    return True
@@ -0,0 +1,175 @@
+"""
+Structure of the whole vault's link graph: orphan notes, notes unreachable from an index note,
+connected components and strongly connected components (groups of notes that link to each other in a cycle).
+Every function runs in time linear in the number of notes and links.
+"""
+
+from pathlib import Path
+import numpy as np
+import link_graph
+
+
+def in_degrees(graph: link_graph.LinkGraph) -> np.ndarray:
+    return np.bincount(graph.indices, minlength=graph.number_of_notes)
+
+
+def out_degrees(graph: link_graph.LinkGraph) -> np.ndarray:
+    return np.diff(graph.indptr)
+
+
+def orphan_note_ids(graph: link_graph.LinkGraph) -> np.ndarray:
+    """Returns the ids of the notes that neither link to nor are linked from any other note."""
+    sources = np.repeat(np.arange(graph.number_of_notes), out_degrees(graph))
+    not_self_link = sources != graph.indices
+    has_links = np.zeros(graph.number_of_notes, dtype=bool)
+    has_links[sources[not_self_link]] = True
+    has_links[graph.indices[not_self_link]] = True
+    return np.flatnonzero(~has_links)
+
+
+def unreachable_note_ids(graph: link_graph.LinkGraph, start_note_id: int) -> np.ndarray:
+    """Returns the ids of the notes that can't be reached by following links from start_note_id."""
+    return np.flatnonzero(link_graph.minimum_link_depths(graph, start_note_id) < 0)
+
+
+def connected_components(graph: link_graph.LinkGraph) -> np.ndarray:
+    """Returns the component number of every note, ignoring the direction of links (union-find).
+    Components are numbered from the largest (0) to the smallest."""
+    n = graph.number_of_notes
+    parent = list(range(n))
+    size = [1] * n
+
+    def find(note_id: int) -> int:
+        while parent[note_id] != note_id:
+            parent[note_id] = parent[parent[note_id]]  # path halving
+            note_id = parent[note_id]
+        return note_id
+
+    sources = np.repeat(np.arange(n), out_degrees(graph)).tolist()
+    for source, target in zip(sources, graph.indices.tolist()):
+        source_root = find(source)
+        target_root = find(target)
+        if source_root == target_root:
+            continue
+        if size[source_root] < size[target_root]:
+            source_root, target_root = target_root, source_root
+        parent[target_root] = source_root
+        size[source_root] += size[target_root]
+
+    roots = np.asarray([find(note_id) for note_id in range(n)], dtype=np.int64)
+    return _return_labels_by_size(roots)
+
+
+def strongly_connected_components(graph: link_graph.LinkGraph) -> np.ndarray:
+    """Returns the strongly connected component number of every note (Tarjan's algorithm, without recursion
+    so that long chains of links can't overflow the stack). Components are numbered from the largest (0)."""
+    n = graph.number_of_notes
+    indptr = graph.indptr.tolist()
+    indices = graph.indices.tolist()
+    visit_order = [-1] * n
+    low_link = [0] * n
+    on_stack = [False] * n
+    stack: list[int] = []
+    labels = [-1] * n
+    visited = 0
+    component = 0
+    for root in range(n):
+        if visit_order[root] != -1:
+            continue
+        visit_order[root] = low_link[root] = visited
+        visited += 1
+        stack.append(root)
+        on_stack[root] = True
+        # (note, position of the next out-link to follow)
+        work = [(root, indptr[root])]
+        while work:
+            note_id, edge = work[-1]
+            if edge < indptr[note_id + 1]:
+                work[-1] = (note_id, edge + 1)
+                linked_id = indices[edge]
+                if visit_order[linked_id] == -1:
+                    visit_order[linked_id] = low_link[linked_id] = visited
+                    visited += 1
+                    stack.append(linked_id)
+                    on_stack[linked_id] = True
+                    work.append((linked_id, indptr[linked_id]))
+                elif on_stack[linked_id]:
+                    low_link[note_id] = min(low_link[note_id], visit_order[linked_id])
+                continue
+            work.pop()
+            if work:
+                parent_id = work[-1][0]
+                low_link[parent_id] = min(low_link[parent_id], low_link[note_id])
+            if low_link[note_id] == visit_order[note_id]:
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    labels[member] = component
+                    if member == note_id:
+                        break
+                component += 1
+    return _return_labels_by_size(np.asarray(labels, dtype=np.int64))
+
+
+def _return_labels_by_size(labels: np.ndarray) -> np.ndarray:
+    """Renumbers component labels so that 0 is the largest component."""
+    if len(labels) == 0:
+        return labels
+    unique_labels, inverse, counts = np.unique(
+        labels, return_inverse=True, return_counts=True
+    )
+    rank = np.empty(len(unique_labels), dtype=np.int64)
+    rank[np.argsort(-counts, kind="stable")] = np.arange(len(unique_labels))
+    return rank[inverse]
+
+
+def return_component_members(labels: np.ndarray) -> list[np.ndarray]:
+    """Returns the note ids in each component, in component order."""
+    order = np.argsort(labels, kind="stable")
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+    return np.split(order, boundaries) if len(labels) else []
+
+
+def print_graph_report(
+    graph: link_graph.LinkGraph, index_note: str | Path | None = None, listed: int = 20
+) -> None:
+    """Prints orphans, unreachable notes, connected components and link cycles of the vault.
+    index_note: Note that every other note should be reachable from (eg. "School Index.md").
+    listed: Maximum number of notes (or components) printed in each section.
+    """
+
+    def print_notes(note_ids) -> None:
+        for note_id in note_ids[:listed]:
+            print(f"    {graph.paths[note_id]}")
+        if len(note_ids) > listed:
+            print(f"    ... and {len(note_ids) - listed} more")
+
+    print(graph)
+    orphans = orphan_note_ids(graph)
+    print(f"\n{len(orphans)} orphan note(s) (no links in or out):")
+    print_notes(orphans)
+
+    if index_note is not None:
+        start_note_id = graph.find_note_id(index_note)
+        unreachable = unreachable_note_ids(graph, start_note_id)
+        print(
+            f"\n{len(unreachable)} note(s) not reachable from {graph.paths[start_note_id].name}:"
+        )
+        print_notes(unreachable)
+
+    components = return_component_members(connected_components(graph))
+    print(f"\n{len(components)} connected component(s), sizes of the largest:")
+    print("    " + ", ".join(str(len(members)) for members in components[:listed]))
+
+    cycles = [
+        members
+        for members in return_component_members(strongly_connected_components(graph))
+        if len(members) > 1
+    ]
+    print(f"\n{len(cycles)} group(s) of notes linking to each other in a cycle:")
+    for members in cycles[:listed]:
+        names = ", ".join(graph.paths[note_id].stem for note_id in members[:8])
+        more = f", ... ({len(members)} notes)" if len(members) > 8 else ""
+        print(f"    {names}{more}")
+    if len(cycles) > listed:
+        print(f"    ... and {len(cycles) - listed} more")
@@ -0,0 +1,288 @@
+"""
+Expand-on-demand link trees.
+
+return_linked_files_V4 reads every reachable note before anything can be shown. A lazy tree only reads a note
+when the children of its node are first accessed, so printing the top levels of a tree (or browsing it with
+browse_lazy_tree) costs the same whatever the size of the vault behind it.
+
+    root = return_lazy_link_tree(vault_folder, start_file)
+    print_lazy_tree(root, max_depth=2)
+
+Because nothing is visited ahead of time, loops are cut per branch: a note that already appears above itself in
+its branch is shown once more and not expanded again.
+"""
+
+from pathlib import Path
+import general_helper_functions as help_funcs
+import obsidian_helper_functions as obs_funcs
+from note_cache import NoteCache
+
+# number of tree lines shown per page by browse_lazy_tree
+DEFAULT_PAGE_LENGTH = 40
+
+
+class LazyLinkResolver:
+    """Shared by every node of a lazy tree: reads the links of a note and resolves them to paths.
+    link_cache: note path -> linked base names (same format as return_linked_files_V4's link_cache).
+    Notes found in it are not read, notes that are read are added to it.
+    note_cache: Size-bounded cache the links of the notes read are kept in, so a note reached again is only read
+    again once it was evicted. A 64 MiB cache is used by default (see note_cache.py).
+    """
+
+    def __init__(
+        self,
+        root_directory: Path,
+        all_files_in_base_directory: dict[str, Path] | None = None,
+        link_cache: dict[Path, list[str]] | None = None,
+        note_cache: NoteCache | None = None,
+    ):
+        self.root_directory = Path(root_directory)
+        self._all_files_in_base_directory = all_files_in_base_directory
+        self._vault_file_names: help_funcs.VaultFileNames | None = None
+        self.link_cache = link_cache
+        self.note_cache = NoteCache() if note_cache is None else note_cache
+        self.notes_read = 0
+
+    @property
+    def vault_file_names(self) -> help_funcs.VaultFileNames:
+        # the directory listing is only needed once the first node is expanded
+        if self._vault_file_names is None:
+            if self._all_files_in_base_directory is None:
+                self._vault_file_names = help_funcs.VaultFileNames(
+                    self.root_directory,
+                    help_funcs.return_all_paths_in_directory_as_multimap(
+                        self.root_directory
+                    ),
+                )
+            else:
+                self._vault_file_names = help_funcs.VaultFileNames.from_paths(
+                    self.root_directory, self._all_files_in_base_directory.values()
+                )
+        return self._vault_file_names
+
+    def return_linked_base_names(self, file_path: Path) -> list[str]:
+        if self.link_cache is not None and file_path in self.link_cache:
+            return self.link_cache[file_path]
+        # same entries as return_note_linked_files, so a NoteCache can be shared with return_linked_files_V4
+        linked_file_base_names = self.note_cache.get(("links", file_path))
+        if linked_file_base_names is None:
+            with open(file_path, "r", encoding="utf8") as f:
+                all_file_lines = f.readlines()
+            linked_file_base_names = list(
+                dict.fromkeys(
+                    obs_funcs.return_linked_base_names(
+                        all_file_lines, must_have_no_extension=True
+                    )
+                )
+            )
+            self.note_cache.put(("links", file_path), linked_file_base_names)
+            self.notes_read += 1
+        if self.link_cache is not None:
+            self.link_cache[file_path] = linked_file_base_names
+        return linked_file_base_names
+
+    def return_linked_files(self, file_path: Path) -> tuple[list[Path], list[str]]:
+        """Returns (linked note paths, unfindable base names) for a note."""
+        linked_files = []
+        un_finable_files = []
+        for linked_file_base_name in self.return_linked_base_names(file_path):
+            linked_file = self.vault_file_names.resolve(linked_file_base_name, file_path)
+            if linked_file is None:
+                un_finable_files.append(linked_file_base_name)
+            else:
+                linked_files.append(linked_file)
+        return linked_files, un_finable_files
+
+
+class LazyFileTreeNode(obs_funcs.FileTreeNode):
+    """A FileTreeNode whose children are resolved the first time .children is accessed."""
+
+    def __init__(
+        self,
+        file_path: Path,
+        resolver: LazyLinkResolver,
+        remaining_link_depth: int = -1,
+    ):
+        super().__init__(file_path)
+        self.resolver = resolver
+        # -1 for no limit, like max_link_depth
+        self.remaining_link_depth = remaining_link_depth
+        # the note already appears above this node in its branch, so it is not expanded again
+        self.is_loop = False
+        self._children: list[obs_funcs.FileTreeNode] | None = None
+
+    @property
+    def children(self) -> list[obs_funcs.FileTreeNode]:
+        if self._children is None:
+            self._expand()
+        return self._children  # type: ignore
+
+    @children.setter
+    def children(self, children: list[obs_funcs.FileTreeNode]):
+        self._children = children
+
+    @property
+    def is_expanded(self) -> bool:
+        return self._children is not None
+
+    @property
+    def can_expand(self) -> bool:
+        """False if expanding this node can't give it any children (without reading the note)."""
+        if self.is_expanded:
+            return bool(self._children)
+        return self.remaining_link_depth != 0 and not self.is_loop
+
+    def _expand(self) -> None:
+        if not self.can_expand:
+            self._children = []
+            return
+        self._children = []
+        linked_files, un_finable_files = self.resolver.return_linked_files(
+            self.file_path
+        )
+        self.unfindable_files.extend(un_finable_files)
+        branch_paths = {self.file_path} | {
+            parent.file_path for parent in self.list_all_parents()
+        }
+        for linked_file in linked_files:
+            child = LazyFileTreeNode(
+                linked_file, self.resolver, self.remaining_link_depth - 1
+            )
+            child.is_loop = linked_file in branch_paths
+            self._children.append(child)  # type: ignore
+            child.parent = self
+
+    def __repr__(self) -> str:
+        state = "expanded" if self.is_expanded else "not expanded"
+        return f"LazyFileTreeNode({self.file_path}) - {state}"
+
+
+def return_lazy_link_tree(
+    root_directory: Path,
+    current_file: Path,
+    max_link_depth: int = -1,
+    all_files_in_base_directory: dict[str, Path] | None = None,
+    link_cache: dict[Path, list[str]] | None = None,
+    note_cache: NoteCache | None = None,
+) -> LazyFileTreeNode:
+    """Returns the root of a lazy link tree. Nothing is read until its children are accessed.
+    max_link_depth: Same meaning as in return_linked_files_V4 (-1 for no limit).
+    link_cache, note_cache: See LazyLinkResolver.
+    """
+    resolver = LazyLinkResolver(
+        root_directory, all_files_in_base_directory, link_cache, note_cache
+    )
+    return LazyFileTreeNode(Path(current_file), resolver, max_link_depth)
+
+
+def iter_lazy_tree(root_node: LazyFileTreeNode, max_depth: int | None = None):
+    """Yields (node, depth) in preorder, expanding nodes only as the iteration reaches them.
+    max_depth: Don't expand nodes at this depth (None for the whole tree).
+    """
+    stack = [(root_node, 0)]
+    while stack:
+        node, depth = stack.pop()
+        yield node, depth
+        if max_depth is None or depth < max_depth:
+            stack.extend((child, depth + 1) for child in reversed(node.children))
+
+
+def return_lazy_tree_line(
+    node: LazyFileTreeNode, depth: int, is_open: bool | None = None
+) -> str:
+    """One line of the tree drawing: indents, fork, note name and its expansion state.
+    is_open: Whether the node's children are shown (default: whether they have been resolved).
+    """
+    if is_open is None:
+        is_open = node.is_expanded
+    if depth == 0:
+        return str(node.file_path)
+    file_name = help_funcs.terminal_link(
+        f"{node.file_path}", f"{str(node.file_path.name[:-3])}"
+    )
+    fork = "└── " if node.is_last_born_child else "├── "
+    if node.is_loop:
+        marker = " (loop)"
+    elif not node.can_expand:
+        marker = ""
+    elif is_open:
+        marker = " [-]"
+    else:
+        marker = " [+]"
+    return f"{node.determine_indents()}{fork}{file_name}{marker}"
+
+
+def print_lazy_tree(root_node: LazyFileTreeNode, max_depth: int | None = None) -> None:
+    """Prints the tree line by line as it is expanded, so the first lines appear immediately."""
+    for node, depth in iter_lazy_tree(root_node, max_depth):
+        print(return_lazy_tree_line(node, depth), flush=True)
+
+
+def _return_visible_nodes(
+    root_node: LazyFileTreeNode, opened_nodes: set[int]
+) -> list[tuple[LazyFileTreeNode, int]]:
+    """Returns (node, depth) for the root and every node whose parents are all opened."""
+    visible_nodes = []
+    stack = [(root_node, 0)]
+    while stack:
+        node, depth = stack.pop()
+        visible_nodes.append((node, depth))
+        if id(node) in opened_nodes:
+            stack.extend((child, depth + 1) for child in reversed(node.children))
+    return visible_nodes
+
+
+def browse_lazy_tree(
+    root_node: LazyFileTreeNode, page_length: int = DEFAULT_PAGE_LENGTH
+) -> None:
+    """Interactive terminal view of a lazy tree. Only the notes of opened branches are ever read.
+    Commands: <number> open/close that line, a <number> open that line's whole subtree (up to 3 levels),
+    n/p next/previous page, q quit.
+    """
+    opened_nodes = {id(root_node)}
+    first_line = 0
+    while True:
+        visible_nodes = _return_visible_nodes(root_node, opened_nodes)
+        first_line = max(0, min(first_line, len(visible_nodes) - 1))
+        last_line = min(first_line + page_length, len(visible_nodes))
+        print()
+        for line_number in range(first_line, last_line):
+            node, depth = visible_nodes[line_number]
+            line = return_lazy_tree_line(node, depth, id(node) in opened_nodes)
+            print(f"{line_number:>5}  {line}")
+        print(
+            f"lines {first_line}-{last_line - 1} of {len(visible_nodes)}, "
+            f"{root_node.resolver.notes_read} notes read"
+        )
+        command = input("<number> open/close, a <number> open 3 levels, n/p page, q quit: ")
+        command = command.strip().lower()
+        if command == "q":
+            return
+        elif command in ("n", ""):
+            if last_line < len(visible_nodes):
+                first_line = last_line
+        elif command == "p":
+            first_line = max(0, first_line - page_length)
+        elif command.lstrip("a ").isdigit():
+            line_number = int(command.lstrip("a "))
+            if line_number >= len(visible_nodes):
+                print(f"There is no line {line_number}.")
+                continue
+            node, _ = visible_nodes[line_number]
+            if command.startswith("a"):
+                for descendant, _ in iter_lazy_tree(node, max_depth=2):
+                    opened_nodes.add(id(descendant))
+            elif id(node) in opened_nodes:
+                opened_nodes.discard(id(node))
+            elif node.can_expand:
+                opened_nodes.add(id(node))
+        else:
+            print(f"Unknown command '{command}'.")
+
+
+if __name__ == "__main__":
+    import default_values
+
+    start_file_path = Path(default_values.Default_File)
+    vault_folder = Path(default_values.Default_Input_Directory)
+    browse_lazy_tree(return_lazy_link_tree(vault_folder, start_file_path))
@@ -0,0 +1,373 @@
+"""
+Whole-vault link graph stored as a sparse adjacency matrix.
+Used for vault-wide calculations (eg. note importance) that would be far too slow to do by walking FileTreeNode trees.
+"""
+
+from collections import deque
+import hashlib
+import os
+from pathlib import Path
+import numpy as np
+from scipy import sparse
+import general_helper_functions as help_funcs
+import obsidian_helper_functions as obs_funcs
+
+
+class LinkGraph:
+    """Directed graph of every markdown note in the vault.
+    Note ids are indexes into self.paths. Out-links are stored in CSR form:
+    the out-links of note i are self.indices[self.indptr[i] : self.indptr[i + 1]].
+    """
+
+    def __init__(
+        self,
+        paths: list[Path],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        version: str,
+    ):
+        self.paths = paths
+        self.index: dict[Path, int] = {path: i for i, path in enumerate(paths)}
+        self.indptr = indptr
+        self.indices = indices
+        self.version = version
+        self._adjacency_matrix: sparse.csr_matrix | None = None
+        self._in_link_indptr: np.ndarray | None = None
+        self._in_link_indices: np.ndarray | None = None
+
+    @property
+    def number_of_notes(self) -> int:
+        return len(self.paths)
+
+    @property
+    def number_of_links(self) -> int:
+        return len(self.indices)
+
+    def out_links(self, note_id: int) -> np.ndarray:
+        return self.indices[self.indptr[note_id] : self.indptr[note_id + 1]]
+
+    def in_links(self, note_id: int) -> np.ndarray:
+        """Returns the ids of the notes linking to note_id (the reverse CSR is built on first use)."""
+        if self._in_link_indptr is None:
+            sources = np.repeat(
+                np.arange(self.number_of_notes, dtype=np.int32), np.diff(self.indptr)
+            )
+            order = np.argsort(self.indices, kind="stable")
+            self._in_link_indices = sources[order]
+            self._in_link_indptr = np.zeros(self.number_of_notes + 1, dtype=np.int64)
+            np.cumsum(
+                np.bincount(self.indices, minlength=self.number_of_notes),
+                out=self._in_link_indptr[1:],
+            )
+        assert self._in_link_indices is not None
+        return self._in_link_indices[
+            self._in_link_indptr[note_id] : self._in_link_indptr[note_id + 1]
+        ]
+
+    def find_note_id(self, note: str | Path) -> int:
+        """Returns the id of a note given its full path, its file name or its base name (without ".md")."""
+        path = Path(note)
+        if path in self.index:
+            return self.index[path]
+        name = path.name if path.suffix == ".md" else f"{path.name}.md"
+        for candidate_path, note_id in self.index.items():
+            if candidate_path.name.lower() == name.lower():
+                return note_id
+        raise ValueError(f"Note '{note}' is not part of the link graph.")
+
+    def adjacency_matrix(self) -> sparse.csr_matrix:
+        """Returns the (notes x notes) adjacency matrix, row = linking note, column = linked note."""
+        if self._adjacency_matrix is None:
+            data = np.ones(len(self.indices), dtype=np.float64)
+            self._adjacency_matrix = sparse.csr_matrix(
+                (data, self.indices, self.indptr),
+                shape=(self.number_of_notes, self.number_of_notes),
+            )
+        return self._adjacency_matrix
+
+    def __repr__(self) -> str:
+        return f"LinkGraph({self.number_of_notes} notes, {self.number_of_links} links)"
+
+
+def minimum_link_depths(graph: LinkGraph, start_note_id: int) -> np.ndarray:
+    """Returns the shortest link distance from the start note to every note (indexed by note id).
+    Unreachable notes have a depth of -1. Breadth first search, O(notes + links).
+    """
+    depths = np.full(graph.number_of_notes, -1, dtype=np.int32)
+    depths[start_note_id] = 0
+    queue = deque([start_note_id])
+    indptr = graph.indptr
+    indices = graph.indices
+    while queue:
+        note_id = queue.popleft()
+        next_depth = depths[note_id] + 1
+        for linked_id in indices[indptr[note_id] : indptr[note_id + 1]]:
+            if depths[linked_id] == -1:
+                depths[linked_id] = next_depth
+                queue.append(linked_id)
+    return depths
+
+
+def path_between(
+    graph: LinkGraph, start_note: str | Path, end_note: str | Path
+) -> list[Path] | None:
+    """Returns the shortest chain of links from start_note to end_note (both included), or None if there is none.
+    Bidirectional breadth first search: follows out-links forwards from the start and in-links backwards from the end,
+    always expanding the smaller frontier.
+    """
+    start_id = graph.find_note_id(start_note)
+    end_id = graph.find_note_id(end_note)
+    if start_id == end_id:
+        return [graph.paths[start_id]]
+
+    forward_parents: dict[int, int] = {start_id: -1}
+    backward_parents: dict[int, int] = {end_id: -1}
+    forward_frontier = [start_id]
+    backward_frontier = [end_id]
+    meeting_id = None
+    while forward_frontier and backward_frontier and meeting_id is None:
+        expand_forward = len(forward_frontier) <= len(backward_frontier)
+        if expand_forward:
+            frontier, parents, other_parents = forward_frontier, forward_parents, backward_parents
+        else:
+            frontier, parents, other_parents = backward_frontier, backward_parents, forward_parents
+        next_frontier = []
+        for note_id in frontier:
+            neighbours = graph.out_links(note_id) if expand_forward else graph.in_links(note_id)
+            for neighbour_id in neighbours:
+                neighbour_id = int(neighbour_id)
+                if neighbour_id in parents:
+                    continue
+                parents[neighbour_id] = note_id
+                if neighbour_id in other_parents:
+                    meeting_id = neighbour_id
+                    break
+                next_frontier.append(neighbour_id)
+            if meeting_id is not None:
+                break
+        if expand_forward:
+            forward_frontier = next_frontier
+        else:
+            backward_frontier = next_frontier
+
+    if meeting_id is None:
+        return None
+    chain = []
+    note_id = meeting_id
+    while note_id != -1:
+        chain.append(note_id)
+        note_id = forward_parents[note_id]
+    chain.reverse()
+    note_id = backward_parents[meeting_id]
+    while note_id != -1:
+        chain.append(note_id)
+        note_id = backward_parents[note_id]
+    return [graph.paths[i] for i in chain]
+
+
+def return_minimum_depth_tree(
+    graph: LinkGraph, current_file: Path, max_link_depth: int = -1
+) -> obs_funcs.FileTreeNode:
+    """Builds a FileTreeNode tree in which every reachable note appears once, under the note that reaches it
+    in the fewest links, so each node's depth is its shortest link distance from current_file.
+    max_link_depth: Stop expanding below this depth (-1 for no limit).
+    """
+    start_id = graph.find_note_id(current_file)
+    nodes = {start_id: obs_funcs.FileTreeNode(graph.paths[start_id])}
+    depths = {start_id: 0}
+    queue = deque([start_id])
+    while queue:
+        note_id = queue.popleft()
+        if depths[note_id] == max_link_depth:
+            continue
+        for linked_id in graph.out_links(note_id):
+            linked_id = int(linked_id)
+            if linked_id in nodes:
+                continue
+            nodes[linked_id] = obs_funcs.FileTreeNode(graph.paths[linked_id])
+            nodes[note_id].add_child(nodes[linked_id])
+            depths[linked_id] = depths[note_id] + 1
+            queue.append(linked_id)
+    return nodes[start_id]
+
+
+def build_link_graph_from_base_names(
+    root_directory: Path,
+    markdown_file_names: help_funcs.VaultFileNames,
+    linked_base_names_by_path: dict[Path, list[str]],
+    version: str,
+) -> LinkGraph:
+    """Builds the LinkGraph from links that have already been read out of every note.
+    markdown_file_names: Every markdown note in the vault (see return_markdown_file_names).
+    linked_base_names_by_path: path -> the return_linked_base_names result of that note.
+    version: Anything that changes whenever a note changes (see return_vault_version).
+    """
+    paths = markdown_file_names.paths
+    index = {path: i for i, path in enumerate(paths)}
+
+    indptr = np.zeros(len(paths) + 1, dtype=np.int64)
+    indices: list[int] = []
+    for note_id, path in enumerate(paths):
+        linked_ids = set()
+        for linked_file_base_name in linked_base_names_by_path.get(path, []):
+            linked_file = markdown_file_names.resolve(linked_file_base_name, path)
+            if linked_file is not None:
+                linked_ids.add(index[linked_file])
+        indices.extend(sorted(linked_ids))
+        indptr[note_id + 1] = len(indices)
+
+    return LinkGraph(paths, indptr, np.asarray(indices, dtype=np.int32), version)
+
+
+def return_markdown_file_names(
+    root_directory: Path, all_paths_by_name: dict[str, list[Path]] | None = None
+) -> help_funcs.VaultFileNames:
+    """Returns every markdown note of the vault (including notes sharing a name),
+    or only those in all_paths_by_name (a return_all_paths_in_directory_as_multimap result) if given."""
+    if all_paths_by_name is None:
+        all_paths_by_name = help_funcs.return_all_paths_in_directory_as_multimap(
+            Path(root_directory), file_type=".md"
+        )
+    return help_funcs.VaultFileNames(
+        root_directory,
+        {name: paths for name, paths in all_paths_by_name.items() if name.endswith(".md")},
+    )
+
+
+def return_vault_version(paths: list[Path]) -> str:
+    """Returns a hash of every note's path, modification time and size."""
+    version_hash = hashlib.sha1()
+    for path in sorted(paths):
+        stat = os.stat(path)
+        version_hash.update(f"{path}|{stat.st_mtime_ns}|{stat.st_size}\n".encode())
+    return version_hash.hexdigest()
+
+
+def build_link_graph(
+    root_directory: Path,
+    all_paths_by_name: dict[str, list[Path]] | None = None,
+) -> LinkGraph:
+    """Reads every markdown note in the vault once and builds the LinkGraph.
+    root_directory: The vault folder.
+    all_paths_by_name: Optional pre-computed result of return_all_paths_in_directory_as_multimap.
+    """
+    markdown_file_names = return_markdown_file_names(root_directory, all_paths_by_name)
+    linked_base_names_by_path: dict[Path, list[str]] = {}
+    for path in markdown_file_names.paths:
+        with open(path, "r", encoding="utf8") as f:
+            all_file_lines = f.readlines()
+        linked_base_names_by_path[path] = obs_funcs.return_linked_base_names(
+            all_file_lines, must_have_no_extension=True
+        )
+    return build_link_graph_from_base_names(
+        root_directory,
+        markdown_file_names,
+        linked_base_names_by_path,
+        return_vault_version(markdown_file_names.paths),
+    )
+
+
+def pagerank(
+    graph: LinkGraph, damping: float = 0.85, tolerance: float = 1e-10, max_iterations: int = 100
+) -> np.ndarray:
+    """Returns the PageRank of every note (indexed by note id) using sparse power iteration.
+    Notes with no out-links spread their rank evenly over the whole vault.
+    """
+    n = graph.number_of_notes
+    if n == 0:
+        return np.zeros(0, dtype=np.float64)
+    adjacency = graph.adjacency_matrix()
+    out_degree = np.diff(graph.indptr).astype(np.float64)
+    dangling = out_degree == 0
+    inverse_out_degree = np.divide(
+        1.0, out_degree, out=np.zeros_like(out_degree), where=~dangling
+    )
+    transposed = adjacency.T.tocsr()
+
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iterations):
+        dangling_rank = rank[dangling].sum()
+        new_rank = damping * (transposed @ (rank * inverse_out_degree))
+        new_rank += (damping * dangling_rank + 1.0 - damping) / n
+        error = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if error < tolerance:
+            break
+    return rank
+
+
+def in_degree_centrality(graph: LinkGraph) -> np.ndarray:
+    """Returns the fraction of other notes linking to each note (indexed by note id)."""
+    n = graph.number_of_notes
+    in_degree = np.bincount(graph.indices, minlength=n).astype(np.float64)
+    return in_degree / max(n - 1, 1)
+
+
+CENTRALITY_METHODS = {
+    "pagerank": pagerank,
+    "in_degree": in_degree_centrality,
+}
+
+# (graph version, method) -> scores. A graph version changes whenever any note is edited, added or removed.
+_centrality_cache: dict[tuple[str, str], np.ndarray] = {}
+
+
+def note_importance(graph: LinkGraph, method: str = "pagerank") -> np.ndarray:
+    """Returns the cached importance score of every note (indexed by note id).
+    method: "pagerank" or "in_degree".
+    """
+    if method not in CENTRALITY_METHODS:
+        raise ValueError(
+            f"Unknown centrality method '{method}'. Use one of {list(CENTRALITY_METHODS)}."
+        )
+    key = (graph.version, method)
+    if key not in _centrality_cache:
+        _centrality_cache[key] = CENTRALITY_METHODS[method](graph)
+    return _centrality_cache[key]
+
+
+def importance_sort_key(graph: LinkGraph, method: str = "pagerank"):
+    """Returns a sort key for note paths that puts the most important notes first.
+    Paths that are not part of the graph sort last.
+    """
+    scores = note_importance(graph, method)
+
+    def sort_key(path: Path) -> float:
+        note_id = graph.index.get(Path(path))
+        return -scores[note_id] if note_id is not None else 0.0
+
+    return sort_key
+
+
+def apply_hierarchical_importance(
+    root_node: obs_funcs.FileTreeNode, graph: LinkGraph, method: str = "pagerank"
+) -> None:
+    """Sets hierarchical_importance on every node of a tree so that
+    sort_tree_by_alphabetical_order_and_number_of_children_to_set_depth orders siblings by importance.
+    """
+    scores = note_importance(graph, method)
+    for node in [root_node, *root_node.list_all_descendants()]:
+        note_id = graph.index.get(node.file_path)
+        node.hierarchical_importance = (
+            float(scores[note_id]) if note_id is not None else 0.0
+        )
+
+
+def return_ranked_importance_report(
+    graph: LinkGraph, method: str = "pagerank", top: int = 50
+) -> list[tuple[Path, float]]:
+    """Returns the top notes and their scores, most important first."""
+    scores = note_importance(graph, method)
+    top = min(top, len(scores))
+    best = np.argpartition(-scores, top - 1)[:top] if top > 0 else np.zeros(0, int)
+    best = best[np.argsort(-scores[best], kind="stable")]
+    return [(graph.paths[i], float(scores[i])) for i in best]
+
+
+def print_ranked_importance_report(
+    graph: LinkGraph, method: str = "pagerank", top: int = 50
+) -> None:
+    for rank, (path, score) in enumerate(
+        return_ranked_importance_report(graph, method, top), start=1
+    ):
+        print(f"{rank:>5}. {score:.6f}  {help_funcs.terminal_link(path, path.name[:-3])}")
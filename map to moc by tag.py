@@ -1,40 +1,108 @@
 from pathlib import Path
-from pprint import pprint
 import general_helper_functions as help_funcs
-import obsidian_helper_functions as obs_funcs
 import default_values
+import note_query
+import vault_index
 
 
-def map_to_ai_note_by_Copilot_tag(input_directory: str, tag_for_search: str):
-    all_files = help_funcs.return_all_paths_in_directory_as_dictionary(
-        Path(input_directory), file_type=".md"
-    )
-    filtered_files: dict[str, Path] = {}
-    for name, path in all_files.items():
-        with open(path, "r", encoding="utf-8") as f:
-            all_file_lines = f.readlines()
-        if obs_funcs.has_yaml_tag(tag_for_search, all_file_lines):
-            filtered_files[name] = path.relative_to(input_directory)
+class MocSpec:
+    """One MOC to build, of the notes with a tag or of the notes selected by a query (give exactly one).
+    output_note: Path of the MOC note relative to the vault root, using "/" separators.
+    title: The line written above the list of links.
+    tags: The yaml tags of the MOC note itself.
+    tag: Collect the notes with this tag (eg. "Copilot").
+    query: Collect the notes selected by this note_query query (eg. "tag:Copilot AND path:School/*").
+    """
+
+    def __init__(
+        self,
+        output_note: str,
+        title: str,
+        tags: list[str] | None = None,
+        tag: str | None = None,
+        query: str | None = None,
+    ):
+        if (tag is None) == (query is None):
+            raise ValueError("A MOC needs either a tag or a query.")
+        self.output_note = output_note
+        self.title = title
+        self.tags = tags if tags is not None else []
+        self.query = query if query is not None else f'tag:"{tag}"'
+
+    def __repr__(self) -> str:
+        return f"MocSpec({self.query!r} -> {self.output_note!r})"
 
+
+def render_moc(spec: MocSpec, input_directory: Path, selected_paths: list[Path]) -> str:
+    """Returns the full text of a MOC note. Links are sorted so that unchanged selections render identically."""
     file_map = [
         "---",
-        "tags: [Copilot]",
+        f"tags: [{', '.join(spec.tags)}]",
         "---",
         "",
-        "All Past Chat GPT Queries",
+        spec.title,
         "___",
         "",
     ]
-    for name, path in filtered_files.items():
-        path = str(path).replace("\\", "/")
-        file_map.append(f"[[{path}|{name}]]")
-
-    with open(
-        f"{input_directory}\\copilot-conversations\\Chat GPT Queries.md",
-        "w",
-        encoding="utf-8",
-    ) as f:
-        f.write("\n".join(file_map))
+    output_path = input_directory / spec.output_note
+    for path in sorted(selected_paths, key=lambda path: (path.name.lower(), str(path))):
+        if path == output_path:
+            # the MOC often has the tag it collects
+            continue
+        relative_path = path.relative_to(input_directory).as_posix()
+        file_map.append(f"[[{relative_path}|{path.name}]]")
+    return "\n".join(file_map)
+
+
+def build_mocs(
+    input_directory: str | Path,
+    specs: list[MocSpec],
+    index: vault_index.VaultIndex | None = None,
+) -> list[Path]:
+    """Fills every MOC in specs from a single index of the vault.
+    A MOC note is only written when its rendered content differs from what is already on disk.
+
+    Returns the paths of the MOC notes that were written.
+    """
+    input_directory = Path(input_directory)
+    if index is None:
+        # tag and property selections only need each note's frontmatter
+        needs_note_bodies = any(
+            note_query.compile_query(spec.query).needs_note_bodies for spec in specs
+        )
+        index = vault_index.build_vault_index(
+            input_directory, frontmatter_only=not needs_note_bodies
+        )
+    written_paths = []
+    for spec in specs:
+        selected_paths = note_query.select_notes(index, spec.query)
+        output_path = input_directory / spec.output_note
+        if help_funcs.write_if_changed(
+            output_path, render_moc(spec, input_directory, selected_paths)
+        ):
+            print(f"updated MOC: {spec.output_note} ({len(selected_paths)} notes)")
+            written_paths.append(output_path)
+        else:
+            print(f"unchanged MOC: {spec.output_note}")
+    return written_paths
+
+
+def map_to_ai_note_by_Copilot_tag(
+    input_directory: str, tag_for_search: str, query: str | None = None
+):
+    """Writes a MOC of every note with tag_for_search, or of every note selected by query if one is given."""
+    build_mocs(
+        input_directory,
+        [
+            MocSpec(
+                "copilot-conversations/Chat GPT Queries.md",
+                "All Past Chat GPT Queries",
+                tags=["Copilot"],
+                tag=tag_for_search if query is None else None,
+                query=query,
+            )
+        ],
+    )
 
 
 if __name__ == "__main__":
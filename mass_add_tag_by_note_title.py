@@ -1,57 +1,101 @@
+from functools import partial
+from pathlib import Path
 from pprint import pprint
 import general_helper_functions as help_funcs
 import obsidian_helper_functions as obs_funcs
 import default_values
+import note_query
+import vault_executor
+import vault_index
 
 
-def mass_add_tag(input_directory, must_contain, tag_to_add: str):
+def mass_add_tag(
+    input_directory,
+    must_contain: str | None,
+    tag_to_add: str,
+    query: str | None = None,
+    workers: int | None = None,
+):
+    """Adds tag_to_add to every note whose file name contains must_contain,
+    or to every note selected by query (see note_query.py) if a query is given.
+    Notes are edited in parallel by `workers` processes (see vault_executor.map_notes)."""
     # Copilot Conversation
 
-    all_files = help_funcs.return_all_paths_in_directory_as_dictionary(
+    # every note, including notes sharing a name with a note in another folder
+    all_paths_by_name = help_funcs.return_all_paths_in_directory_as_multimap(
         input_directory, file_type=".md"
     )
-    for file, path in all_files.items():
-        if must_contain in file:
-            with open(path, "r", encoding="utf-8") as f:
-                all_file_lines = f.readlines()
-            (
-                yaml_property,
-                line_number,
-                yaml_section_exists,
-            ) = obs_funcs.return_yaml_property(
-                yaml_property="tags", all_file_lines=all_file_lines
-            )
+    if query is not None:
+        index = vault_index.build_vault_index(
+            Path(input_directory),
+            all_paths_by_name,
+            frontmatter_only=not note_query.compile_query(query).needs_note_bodies,
+            workers=workers,
+        )
+        selected_paths = note_query.select_notes(index, query)
+    else:
+        selected_paths = [
+            path
+            for file, paths in all_paths_by_name.items()
+            if must_contain in file
+            for path in paths
+        ]
+    for result in vault_executor.map_notes(
+        partial(_add_tag_to_note, tag_to_add=tag_to_add),
+        selected_paths,
+        workers=workers,
+    ):
+        if result.error is not None:
+            print(f"unable to alter file: {result.path.name}\n{result.error}")
+        elif result.value:
+            print(f"altered file: {result.path.name}")
 
-            # replace the property with the updated one
-            all_file_lines, altered = _return_updated_file_metadata(
-                file,
-                path,
-                all_file_lines,
-                yaml_property,
-                line_number,
-                yaml_section_exists,
-                tag_to_add,
-            )
-            if altered:
-                with open(path, "w", encoding="utf-8") as f:
-                    f.write("".join(all_file_lines))
-                    print(f"altered file: {file}")
+
+def _add_tag_to_note(path: Path, tag_to_add: str) -> bool:
+    """Adds tag_to_add to a single note. Returns True if the note was altered."""
+    # only the frontmatter is read and rewritten, the body of the note is never loaded
+    note = obs_funcs.NoteLineSource(path)
+    all_file_lines = list(note.frontmatter_lines)
+    (
+        yaml_property,
+        line_number,
+        yaml_section_exists,
+    ) = obs_funcs.return_yaml_property(
+        yaml_property="tags", all_file_lines=all_file_lines
+    )
+
+    # replace the property with the updated one
+    all_file_lines, altered = _return_updated_file_metadata(
+        path.name,
+        path,
+        all_file_lines,
+        yaml_property,
+        line_number,
+        yaml_section_exists,
+        tag_to_add,
+    )
+    if altered:
+        note.rewrite_frontmatter(all_file_lines)
+    return altered
 
 
 def _extend_tag_list(yaml_property_in_file, tag_to_add: str):
     file_altered = False
     if yaml_property_in_file == None:
-        yaml_property_in_file = tag_to_add
+        yaml_property_in_file = [tag_to_add]
+        file_altered = True
     else:
-        yaml_property_in_file = obs_funcs.yaml_list_type_property_to_list(
-            yaml_property_in_file
-        )
+        yaml_property_in_file = [
+            tag
+            for tag in obs_funcs.yaml_list_type_property_to_list(yaml_property_in_file)
+            if tag
+        ]
         if tag_to_add not in yaml_property_in_file:
-            yaml_property_in_file.append(f", {tag_to_add}")
+            yaml_property_in_file.append(tag_to_add)
             file_altered = True
 
     # convert back to string
-    yaml_property_text = f"[{''.join(yaml_property_in_file)}]"
+    yaml_property_text = f"[{', '.join(yaml_property_in_file)}]"
 
     return yaml_property_text, file_altered
 
@@ -68,7 +112,7 @@ def _return_updated_file_metadata(
     yaml_property_in_file, altered = _extend_tag_list(yaml_property_in_file, tag_to_add)
     if not yaml_section_exists:
         # create front matter section
-        if len(all_file_lines) == 0:
+        if obs_funcs.NoteLineSource(path).is_empty():
             print(f"WARNING: completely empty file found: {file} at {path}")
         all_file_lines.insert(0, "---\n")
         all_file_lines.insert(1, f"tags: {yaml_property_in_file}\n")
@@ -87,4 +131,9 @@ if __name__ == "__main__":
     input_directory = help_funcs.get_input_directory(
         DEFAULT_DIRECTORY=default_values.Default_Input_Directory
     )
-    mass_add_tag(input_directory, must_contain="Chat-", tag_to_add="Copilot")
+    query = input(
+        "Query selecting the notes (see note_query.py, leave empty for notes named Chat-): "
+    ).strip()
+    mass_add_tag(
+        input_directory, must_contain="Chat-", tag_to_add="Copilot", query=query or None
+    )
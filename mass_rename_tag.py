@@ -0,0 +1,153 @@
+from functools import partial
+from pathlib import Path
+import numpy as np
+import general_helper_functions as help_funcs
+import obsidian_helper_functions as obs_funcs
+import default_values
+import note_query
+import vault_executor
+import vault_index
+
+
+def _normalise_tag(tag: str) -> str:
+    return tag.strip().lstrip("#").lower()
+
+
+def return_renamed_tags(tags: list[str], renames: dict[str, str | None]) -> list[str]:
+    """Applies renames to a note's tags, keeping their order and dropping duplicates created by merges.
+    renames: lowered old tag -> new tag (None deletes the tag). Nested tags are renamed with their parent,
+    eg. renaming "school" to "uni" turns "school/maths" into "uni/maths".
+    """
+    renamed_tags: list[str] = []
+    for tag in tags:
+        normalised_tag = _normalise_tag(tag)
+        new_tag: str | None = tag
+        for old_tag, replacement in renames.items():
+            if normalised_tag == old_tag:
+                new_tag = replacement
+                break
+            if normalised_tag.startswith(f"{old_tag}/"):
+                new_tag = (
+                    None
+                    if replacement is None
+                    else replacement + tag.strip().lstrip("#")[len(old_tag) :]
+                )
+                break
+        if new_tag is not None and new_tag.lower() not in {
+            renamed_tag.lower() for renamed_tag in renamed_tags
+        }:
+            renamed_tags.append(new_tag)
+    return renamed_tags
+
+
+def _return_tags_line_range(frontmatter_lines: list[str]) -> tuple[int, int] | None:
+    """Returns (first line, line after the last) of the tags property, including "  - tag" block list lines."""
+    for line_number, line in enumerate(frontmatter_lines[1:-1], start=1):
+        if line.split(":")[0].strip() == "tags":
+            end = line_number + 1
+            while end < len(frontmatter_lines) - 1 and frontmatter_lines[
+                end
+            ].strip().startswith("- "):
+                end += 1
+            return line_number, end
+    return None
+
+
+def rename_tags_in_note(
+    path: Path, renames: dict[str, str | None], dry_run: bool = False
+) -> tuple[list[str], list[str]] | None:
+    """Applies every rename to one note's tags with a single rewrite of its frontmatter (the body is never read).
+    Returns (old tags, new tags), or None if the note did not change.
+    """
+    note = obs_funcs.NoteLineSource(path)
+    frontmatter_lines = list(note.frontmatter_lines)
+    tags_line_range = _return_tags_line_range(frontmatter_lines)
+    if tags_line_range is None:
+        return None
+    properties = obs_funcs.return_frontmatter_properties(frontmatter_lines)
+    tags = [
+        tag for tag in obs_funcs.yaml_list_type_property_to_list(properties["tags"]) if tag
+    ]
+    new_tags = return_renamed_tags(tags, renames)
+    if new_tags == tags:
+        return None
+    start, end = tags_line_range
+    frontmatter_lines[start:end] = [f"tags: [{', '.join(new_tags)}]\n"]
+    if not dry_run:
+        note.rewrite_frontmatter(frontmatter_lines)
+    return tags, new_tags
+
+
+def mass_rename_tags(
+    input_directory,
+    renames: dict[str, str | None],
+    dry_run: bool = False,
+    workers: int | None = None,
+    index: vault_index.VaultIndex | None = None,
+    query: str | None = None,
+) -> int:
+    """Renames, merges and deletes tags across the vault.
+    renames: old tag -> new tag, or None to delete it. Several old tags renamed to the same new tag are merged.
+    dry_run: Only print what would change.
+    index: Optional VaultIndex of the vault (a frontmatter-only one is built if not given). Only the notes it lists
+    under one of the old tags are opened, and they are rewritten in parallel by `workers` processes.
+    query: Only change the notes selected by this query (see note_query.py).
+
+    Returns the number of notes changed (or that would be changed with dry_run).
+    """
+    renames = {
+        _normalise_tag(old_tag): None if new_tag is None else new_tag.strip().lstrip("#")
+        for old_tag, new_tag in renames.items()
+    }
+    compiled_query = None if query is None else note_query.compile_query(query)
+    if index is None:
+        index = vault_index.build_vault_index(
+            Path(input_directory),
+            frontmatter_only=compiled_query is None or not compiled_query.needs_note_bodies,
+            workers=workers,
+        )
+    affected_note_ids = [
+        note_ids
+        for tag, note_ids in index.tag_to_note_ids.items()
+        if any(tag == old_tag or tag.startswith(f"{old_tag}/") for old_tag in renames)
+    ]
+    if not affected_note_ids:
+        print("No notes have any of the tags.")
+        return 0
+    affected_note_ids = np.unique(np.concatenate(affected_note_ids))
+    if compiled_query is not None:
+        affected_note_ids = affected_note_ids[compiled_query.evaluate(index)[affected_note_ids]]
+        if len(affected_note_ids) == 0:
+            print("No notes selected by the query have any of the tags.")
+            return 0
+    affected_paths = [index.paths[note_id] for note_id in affected_note_ids]
+
+    changed_notes = 0
+    for result in vault_executor.map_notes(
+        partial(rename_tags_in_note, renames=renames, dry_run=dry_run),
+        affected_paths,
+        workers=workers,
+    ):
+        if result.error is not None:
+            print(f"unable to alter file: {result.path.name}\n{result.error}")
+        elif result.value is not None:
+            changed_notes += 1
+            old_tags, new_tags = result.value
+            action = "would alter" if dry_run else "altered"
+            print(f"{action} file: {result.path.name}  [{', '.join(old_tags)}] -> [{', '.join(new_tags)}]")
+    if dry_run:
+        print(f"{changed_notes} of {index.number_of_notes} notes would be changed.")
+    else:
+        print(f"{changed_notes} of {index.number_of_notes} notes changed.")
+    return changed_notes
+
+
+if __name__ == "__main__":
+    input_directory = help_funcs.get_input_directory(
+        DEFAULT_DIRECTORY=default_values.Default_Input_Directory
+    )
+    old_tag = input("Tag to rename: ")
+    new_tag = input("New tag (leave empty to delete the tag): ").strip() or None
+    if mass_rename_tags(input_directory, {old_tag: new_tag}, dry_run=True):
+        if input("Apply these changes? (y/n): ").lower() == "y":
+            mass_rename_tags(input_directory, {old_tag: new_tag})
@@ -0,0 +1,139 @@
+import os
+from functools import partial
+from pathlib import Path
+import general_helper_functions as help_funcs
+import obsidian_helper_functions as obs_funcs
+import backlink_index
+import default_values
+import vault_executor
+
+
+def return_new_link_target(
+    new_path: Path, linking_note: Path, vault_file_names: help_funcs.VaultFileNames
+) -> str:
+    """Returns the shortest link target that resolves from linking_note to new_path:
+    the note's name if that is enough, otherwise its path from the vault root (without ".md")."""
+    if vault_file_names.resolve(new_path.stem, linking_note) == new_path:
+        return new_path.stem
+    return new_path.relative_to(vault_file_names.root_directory).with_suffix("").as_posix()
+
+
+def return_rewritten_link(link: obs_funcs.Wikilink, new_target: str) -> str:
+    """The text of link with its target replaced, keeping its heading/block, alias and embed "!"."""
+    escape = "\\" if link.target.endswith("\\") else ""
+    subpath = f"#{link.subpath}" if link.subpath else ""
+    alias = f"|{link.alias}" if link.alias is not None else ""
+    embed = "!" if link.is_embed else ""
+    return f"{embed}[[{new_target}{subpath}{escape}{alias}]]"
+
+
+def rewrite_link_targets(
+    path: Path, replacements_by_path: dict[Path, dict[str, str]]
+) -> int:
+    """Replaces link targets in one note, touching only the bytes of the links themselves.
+    replacements_by_path: note path -> {old link target: new link target}.
+
+    Returns the number of links rewritten.
+    """
+    replacements = replacements_by_path[path]
+    with open(path, "rb") as f:
+        content = f.read()
+    rewritten_parts = []
+    position = 0
+    links_rewritten = 0
+    for link in obs_funcs.return_wikilinks(content):
+        new_target = replacements.get(backlink_index.return_link_target(link))
+        if new_target is None or not link.is_note_link:
+            continue
+        rewritten_parts.append(content[position : link.start])
+        rewritten_parts.append(return_rewritten_link(link, new_target).encode("utf-8"))
+        position = link.end
+        links_rewritten += 1
+    if links_rewritten:
+        rewritten_parts.append(content[position:])
+        temporary_path = path.with_name(f".{path.name}.tmp")
+        with open(temporary_path, "wb") as f:
+            f.write(b"".join(rewritten_parts))
+        os.replace(temporary_path, path)
+    return links_rewritten
+
+
+def move_note(
+    input_directory,
+    old_path: Path,
+    new_path: Path,
+    dry_run: bool = False,
+    workers: int | None = None,
+) -> int:
+    """Moves (or renames) a note and rewrites the links to it in every note that links to it.
+    Only the notes that link to it are read, found through the vault's BacklinkIndex, and they are
+    rewritten in parallel by `workers` processes. A link is only rewritten if its current target would
+    no longer resolve to the note; the new target is the note's name, or its path when the name is ambiguous.
+    dry_run: Only print the links that would be rewritten.
+
+    Returns the number of notes whose links were (or would be) rewritten.
+    """
+    input_directory = Path(input_directory)
+    old_path = Path(old_path)
+    new_path = Path(new_path)
+    if new_path.suffix != ".md":
+        new_path = new_path.with_name(f"{new_path.name}.md")
+    if not old_path.is_file():
+        raise ValueError(f"{old_path} does not exist.")
+    if new_path.exists():
+        raise ValueError(f"{new_path} already exists.")
+
+    index = backlink_index.build_backlink_index(input_directory, workers=workers)
+    vault_file_names_after_move = help_funcs.VaultFileNames.from_paths(
+        input_directory,
+        [path for path in index.vault_file_names.paths if path != old_path] + [new_path],
+    )
+
+    replacements_by_path: dict[Path, dict[str, str]] = {}
+    for referrer in index.referrers(old_path):
+        # the note may link to itself
+        referrer_after_move = new_path if referrer == old_path else referrer
+        replacements = {}
+        for target in index.targets_resolving_to(referrer, old_path):
+            if (
+                vault_file_names_after_move.resolve(target, referrer_after_move)
+                == new_path
+            ):
+                continue  # still points at the note after the move
+            replacements[target] = return_new_link_target(
+                new_path, referrer_after_move, vault_file_names_after_move
+            )
+        if replacements:
+            replacements_by_path[referrer_after_move] = replacements
+
+    for path, replacements in replacements_by_path.items():
+        for old_target, new_target in replacements.items():
+            action = "would rewrite" if dry_run else "rewriting"
+            print(f"{action} [[{old_target}]] -> [[{new_target}]] in {path.name}")
+    if dry_run:
+        print(f"{len(replacements_by_path)} note(s) would be changed.")
+        return len(replacements_by_path)
+
+    new_path.parent.mkdir(parents=True, exist_ok=True)
+    os.rename(old_path, new_path)
+    print(f"moved {old_path} -> {new_path}")
+    for result in vault_executor.map_notes(
+        partial(rewrite_link_targets, replacements_by_path=replacements_by_path),
+        list(replacements_by_path),
+        workers=workers,
+    ):
+        if result.error is not None:
+            print(f"unable to alter file: {result.path.name}\n{result.error}")
+    print(f"{len(replacements_by_path)} note(s) changed.")
+    return len(replacements_by_path)
+
+
+if __name__ == "__main__":
+    input_directory = help_funcs.get_input_directory(
+        DEFAULT_DIRECTORY=default_values.Default_Input_Directory
+    )
+    old_path = Path(input("Note to move: "))
+    new_path = Path(input("New path: "))
+    move_note(input_directory, old_path, new_path, dry_run=True)
+    if input("Move the note? (y/n): ").lower() == "y":
+        move_note(input_directory, old_path, new_path)
@@ -0,0 +1,102 @@
+"""
+Size-bounded least-recently-used cache for the results of parsing notes.
+
+A traversal reaches hub notes again and again. Keeping what was parsed from them in a NoteCache means
+each is read from disk once, while the total memory held stays under max_bytes however large the vault is.
+Entries are keyed by (kind, path): ("links", path) for the linked base names of a note and ("headings", path)
+for its heading index (see return_linked_files_V4).
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+import sys
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def return_approximate_size(value, _seen: set[int] | None = None) -> int:
+    """Returns roughly how many bytes of memory value (and everything it holds) uses."""
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, int, float, bool, type(None), Path)):
+        return size
+    if isinstance(value, dict):
+        return size + sum(
+            return_approximate_size(key, _seen) + return_approximate_size(item, _seen)
+            for key, item in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(return_approximate_size(item, _seen) for item in value)
+    if hasattr(value, "__dict__"):
+        return size + return_approximate_size(vars(value), _seen)
+    return size
+
+
+class NoteCache:
+    """An LRU cache holding at most max_bytes (as measured by return_approximate_size) of values.
+    hits / misses: Number of get calls that found / didn't find their key.
+    evictions: Number of entries dropped to make room for newer ones.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[tuple, tuple[object, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._entries
+
+    def get(self, key: tuple, default=None):
+        """Returns the cached value (marking it as the most recently used) or default."""
+        try:
+            value, _ = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: tuple, value, size: int | None = None) -> None:
+        """Caches value, evicting the least recently used entries until everything fits in max_bytes.
+        size: Bytes used by value (default: return_approximate_size(value)). Values bigger than max_bytes are not cached.
+        """
+        if size is None:
+            size = return_approximate_size(value)
+        if key in self._entries:
+            _, old_size = self._entries.pop(key)
+            self.current_bytes -= old_size
+        if size > self.max_bytes:
+            return
+        while self.current_bytes + size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+        self._entries[key] = (value, size)
+        self.current_bytes += size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.current_bytes = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __repr__(self) -> str:
+        return (
+            f"NoteCache({len(self)} entries, {self.current_bytes / 1024 / 1024:.1f}"
+            f"/{self.max_bytes / 1024 / 1024:.1f} MiB, {self.hits} hits, {self.misses} misses, "
+            f"{self.evictions} evictions, {self.hit_rate:.0%} hit rate)"
+        )
@@ -0,0 +1,326 @@
+"""
+Small query language for selecting notes from a VaultIndex.
+
+A query is a list of terms combined with AND, OR, NOT and parentheses (terms next to each other are ANDed):
+    tag:Copilot                     note has the yaml tag (case insensitive)
+    path:"School/**"                vault-relative path matches the glob (case insensitive)
+    name:Chat-                      file name contains the text
+    name:/^Chat-\\d+/               file name matches the regex
+    has:aliases                     frontmatter has the property
+    prop.status=done                frontmatter property comparison (= != < <= > >=, numbers compare as numbers)
+    prop.aliases:Foo                property equals the value or its list contains the value
+    links-to:"School Index"         note links to the named note
+    linked-from:"School Index"      note is linked to by the named note
+    flashcards>=3                   number of flashcard questions in the note
+    text:entropy                    body of the note contains the word (case insensitive)
+    text:"second law"               body contains the words one after another
+    text:thermo*                    body contains a word starting with "thermo"
+
+eg. 'tag:softwaredd AND tag:flashcards AND NOT path:"Archive/**"'
+
+Queries are compiled once (compile_query caches them) and evaluated as boolean numpy masks over the index columns.
+text: terms are answered from the vault's TextIndex (see text_index.py), so they work with a frontmatter-only index.
+The first text: term evaluated on a VaultIndex builds its TextIndex with text_index.build_text_index, which saves it
+to .text_index.npz in the vault folder. Set index.text_index beforehand to use an index kept somewhere else.
+"""
+
+import fnmatch
+from functools import lru_cache
+from pathlib import Path
+import re
+from typing import Callable
+import numpy as np
+import obsidian_helper_functions as obs_funcs
+import text_index
+import vault_index
+from vault_index import VaultIndex
+
+_TOKEN_REGEX = re.compile(
+    r"""\s*(?:
+    (?P<open>\() |
+    (?P<close>\)) |
+    (?P<term>
+        (?P<field>[A-Za-z][\w.-]*)
+        \s*(?P<operator>>=|<=|!=|=|<|>|:)\s*
+        (?P<value>"(?:[^"\\]|\\.)*"|/(?:[^/\\]|\\.)*/|[^\s()]+)
+    ) |
+    (?P<word>[^\s()]+)
+    )""",
+    re.VERBOSE,
+)
+
+_KEYWORDS = {"AND", "OR", "NOT"}
+
+Predicate = Callable[[VaultIndex], np.ndarray]
+
+
+def _tokenize(query: str) -> list[tuple[str, re.Match]]:
+    tokens = []
+    position = 0
+    query = query.rstrip()
+    while position < len(query):
+        match = _TOKEN_REGEX.match(query, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Unable to read query at position {position}: {query[position:]!r}")
+        position = match.end()
+        if match.group("open"):
+            tokens.append(("(", match))
+        elif match.group("close"):
+            tokens.append((")", match))
+        elif match.group("term"):
+            tokens.append(("term", match))
+        elif match.group("word").upper() in _KEYWORDS:
+            tokens.append((match.group("word").upper(), match))
+        else:
+            raise ValueError(
+                f"'{match.group('word')}' is not a query term. Terms look like field:value (eg. tag:Copilot)."
+            )
+    return tokens
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r"\\(.)", r"\1", value[1:-1])
+    return value
+
+
+def _ids_to_mask(index: VaultIndex, note_ids) -> np.ndarray:
+    mask = np.zeros(index.number_of_notes, dtype=bool)
+    mask[note_ids] = True
+    return mask
+
+
+def _compare(operator: str, left, right) -> bool:
+    if operator in (":", "="):
+        return left == right
+    if operator == "!=":
+        return left != right
+    if operator == "<":
+        return left < right
+    if operator == "<=":
+        return left <= right
+    if operator == ">":
+        return left > right
+    return left >= right
+
+
+def _to_number(value: str | None) -> float | None:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _compile_term(field: str, operator: str, raw_value: str) -> Predicate:
+    value = _unquote(raw_value)
+    field = field.lower()
+
+    if field == "tag":
+        return lambda index: _ids_to_mask(index, index.notes_with_tag(value))
+
+    if field == "path":
+        path_regex = re.compile(fnmatch.translate(value.lower()))
+        return lambda index: np.fromiter(
+            (path_regex.match(path.lower()) is not None for path in index.relative_paths),
+            dtype=bool,
+            count=index.number_of_notes,
+        )
+
+    if field == "name":
+        if len(raw_value) >= 2 and raw_value[0] == raw_value[-1] == "/":
+            name_regex = re.compile(raw_value[1:-1].replace("\\/", "/"))
+            return lambda index: np.fromiter(
+                (name_regex.search(name) is not None for name in index.names),
+                dtype=bool,
+                count=index.number_of_notes,
+            )
+        return lambda index: np.fromiter(
+            (value in name for name in index.names), dtype=bool, count=index.number_of_notes
+        )
+
+    if field == "has":
+        return lambda index: np.fromiter(
+            (property_value is not None for property_value in index.property_column(value)),
+            dtype=bool,
+            count=index.number_of_notes,
+        )
+
+    if field.startswith("prop."):
+        yaml_property = field[len("prop.") :]
+        number = _to_number(value)
+
+        def property_predicate(index: VaultIndex) -> np.ndarray:
+            mask = np.zeros(index.number_of_notes, dtype=bool)
+            for note_id, property_value in enumerate(index.property_column(yaml_property)):
+                if property_value is None:
+                    continue
+                if operator == ":" and property_value.startswith("["):
+                    mask[note_id] = value in obs_funcs.yaml_list_type_property_to_list(
+                        property_value
+                    )
+                    continue
+                property_number = _to_number(property_value)
+                if number is not None and property_number is not None:
+                    mask[note_id] = _compare(operator, property_number, number)
+                else:
+                    mask[note_id] = _compare(operator, property_value, value)
+            return mask
+
+        return property_predicate
+
+    if field == "links-to":
+        return lambda index: _ids_to_mask(
+            index, index.graph.in_links(index.graph.find_note_id(value))
+        )
+
+    if field == "linked-from":
+        return lambda index: _ids_to_mask(
+            index, index.graph.out_links(index.graph.find_note_id(value))
+        )
+
+    if field == "flashcards":
+        number = _to_number(value)
+        if number is None:
+            raise ValueError(f"flashcards must be compared with a number, not '{value}'.")
+        return lambda index: _compare(operator, index.flashcard_counts, number)
+
+    if field == "text":
+        if operator != ":":
+            raise ValueError(f"text must be matched with ':', not '{operator}'.")
+
+        def text_predicate(index: VaultIndex) -> np.ndarray:
+            if index.text_index is None:
+                index.text_index = text_index.build_text_index(
+                    index.root_directory, paths=index.paths
+                )
+            return _ids_to_mask(index, index.text_index.search(value))
+
+        return text_predicate
+
+    raise ValueError(f"Unknown query field '{field}'.")
+
+
+# fields that need the body of each note, ie. a VaultIndex that was not built with frontmatter_only
+BODY_FIELDS = {"links-to", "linked-from", "flashcards"}
+
+
+class _Parser:
+    """Recursive descent parser: or_expression := and_expression (OR and_expression)*
+    and_expression := not_expression ([AND] not_expression)*
+    not_expression := NOT not_expression | ( or_expression ) | term
+    """
+
+    def __init__(self, query: str):
+        self.query = query
+        self.tokens = _tokenize(query)
+        self.position = 0
+        self.fields: set[str] = set()
+
+    def _peek(self) -> str | None:
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def _take(self) -> tuple[str, re.Match]:
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse(self) -> Predicate:
+        if not self.tokens:
+            raise ValueError("Empty query.")
+        predicate = self._or_expression()
+        if self._peek() is not None:
+            raise ValueError(f"Unexpected '{self._take()[1].group().strip()}' in query: {self.query!r}")
+        return predicate
+
+    def _or_expression(self) -> Predicate:
+        predicates = [self._and_expression()]
+        while self._peek() == "OR":
+            self._take()
+            predicates.append(self._and_expression())
+        if len(predicates) == 1:
+            return predicates[0]
+        return lambda index: np.logical_or.reduce([p(index) for p in predicates])
+
+    def _and_expression(self) -> Predicate:
+        predicates = [self._not_expression()]
+        while self._peek() in ("AND", "NOT", "(", "term"):
+            if self._peek() == "AND":
+                self._take()
+            predicates.append(self._not_expression())
+        if len(predicates) == 1:
+            return predicates[0]
+        return lambda index: np.logical_and.reduce([p(index) for p in predicates])
+
+    def _not_expression(self) -> Predicate:
+        kind = self._peek()
+        if kind == "NOT":
+            self._take()
+            predicate = self._not_expression()
+            return lambda index: ~predicate(index)
+        if kind == "(":
+            self._take()
+            predicate = self._or_expression()
+            if self._peek() != ")":
+                raise ValueError(f"Missing ')' in query: {self.query!r}")
+            self._take()
+            return predicate
+        if kind == "term":
+            match = self._take()[1]
+            self.fields.add(match.group("field").lower())
+            return _compile_term(
+                match.group("field"), match.group("operator"), match.group("value")
+            )
+        raise ValueError(f"Query ended unexpectedly: {self.query!r}")
+
+
+class CompiledQuery:
+    def __init__(self, query: str):
+        self.query = query
+        parser = _Parser(query)
+        self._predicate = parser.parse()
+        self.needs_note_bodies = not parser.fields.isdisjoint(BODY_FIELDS)
+
+    def evaluate(self, index: VaultIndex) -> np.ndarray:
+        """Returns a boolean mask over the note ids of index."""
+        if self.needs_note_bodies and index.frontmatter_only:
+            raise ValueError(
+                f"Query {self.query!r} uses links or flashcards but the index only has frontmatter."
+            )
+        return np.asarray(self._predicate(index), dtype=bool)
+
+    def select_ids(self, index: VaultIndex) -> np.ndarray:
+        return np.flatnonzero(self.evaluate(index))
+
+    def select(self, index: VaultIndex) -> list[Path]:
+        return [index.paths[note_id] for note_id in self.select_ids(index)]
+
+    def __repr__(self) -> str:
+        return f"CompiledQuery({self.query!r})"
+
+
+@lru_cache(maxsize=256)
+def compile_query(query: str) -> CompiledQuery:
+    """Parses a query once. Raises ValueError if the query is malformed."""
+    return CompiledQuery(query)
+
+
+def select_notes(index: VaultIndex, query: str) -> list[Path]:
+    return compile_query(query).select(index)
+
+
+def select_vault_notes(
+    root_directory: Path, query: str, workers: int | None = None
+) -> list[Path]:
+    """Builds the VaultIndex query needs (frontmatter only unless it uses links or flashcards)
+    and returns the notes it selects. Used by the bulk-edit and export tools that take a query.
+    workers: Number of processes reading notes (see vault_executor.map_notes).
+    """
+    compiled_query = compile_query(query)
+    index = vault_index.build_vault_index(
+        Path(root_directory),
+        frontmatter_only=not compiled_query.needs_note_bodies,
+        workers=workers,
+    )
+    return compiled_query.select(index)
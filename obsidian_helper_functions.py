@@ -1,5 +1,5 @@
+import bisect
 from enum import Enum
-import glob
 import json
 import os
 from pathlib import Path
@@ -7,10 +7,11 @@ from pprint import pprint
 from random import randint, random
 import re
 import shutil
-from typing import List, Tuple
+from typing import Callable, List, Tuple
 import general_helper_functions as help_funcs
 import time
 import default_values
+from note_cache import NoteCache
 
 
 def check_for_singleline_flashcard_style_section_in_note(
@@ -105,8 +106,7 @@ def extract_tags_from_note_basenames(
 
     yaml_tags_dict = {}
     for note in notes_for_tag_extraction_full_path:
-        with open(note, "r", encoding="utf-8") as f:
-            all_file_lines = f.readlines()
+        all_file_lines = read_frontmatter_lines(note)
         (
             yaml_tags,
             line_number_of_tags,
@@ -273,6 +273,134 @@ def return_yaml_property(
     return found_property, line_number, yaml_section_exists
 
 
+class NoteLineSource:
+    """Reads the lines of a note lazily.
+    frontmatter_lines only reads from the top of the file up to the closing "---",
+    the rest of the file is only read when all_file_lines is first used.
+    Lines are returned with "\\n" line endings, the same as f.readlines() in text mode.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = Path(file_path)
+        self._frontmatter_lines: list[str] | None = None
+        self._all_file_lines: list[str] | None = None
+        self._frontmatter_byte_length = 0
+        self._line_ending = "\n"
+
+    @staticmethod
+    def _decode_line(raw_line: bytes) -> str:
+        line = raw_line.decode("utf-8")
+        if line.endswith("\r\n"):
+            line = line[:-2] + "\n"
+        return line
+
+    def _read_frontmatter(self) -> None:
+        frontmatter_lines: list[str] = []
+        with open(self.file_path, "rb") as f:
+            first_line = f.readline()
+            if first_line.endswith(b"\r\n"):
+                self._line_ending = "\r\n"
+            if self._decode_line(first_line) == "---\n":
+                frontmatter_lines.append("---\n")
+                for raw_line in f:
+                    line = self._decode_line(raw_line)
+                    frontmatter_lines.append(line)
+                    if line == "---\n" or line == "---":
+                        break
+                self._frontmatter_byte_length = f.tell()
+        self._frontmatter_lines = frontmatter_lines
+
+    @property
+    def frontmatter_lines(self) -> list[str]:
+        """The frontmatter including both "---" lines ([] if the note has no frontmatter)."""
+        if self._frontmatter_lines is None:
+            self._read_frontmatter()
+        assert self._frontmatter_lines is not None
+        return self._frontmatter_lines
+
+    @property
+    def frontmatter_byte_length(self) -> int:
+        self.frontmatter_lines
+        return self._frontmatter_byte_length
+
+    @property
+    def all_file_lines(self) -> list[str]:
+        """Every line of the note. Only the part after the frontmatter is read from disk."""
+        if self._all_file_lines is None:
+            with open(self.file_path, "rb") as f:
+                f.seek(self.frontmatter_byte_length)
+                body_lines = [self._decode_line(raw_line) for raw_line in f]
+            self._all_file_lines = self.frontmatter_lines + body_lines
+        return self._all_file_lines
+
+    def is_empty(self) -> bool:
+        return self.file_path.stat().st_size == 0
+
+    def rewrite_frontmatter(self, new_frontmatter_lines: list[str]) -> None:
+        """Replaces the frontmatter on disk, leaving the rest of the note untouched.
+        new_frontmatter_lines: The new frontmatter including both "---" lines. Pass the note's
+        frontmatter_lines with extra lines inserted at the start to add a frontmatter to a note without one.
+
+        A frontmatter of the same size is overwritten in place, otherwise the body is streamed into a new file.
+        """
+        old_frontmatter_byte_length = self.frontmatter_byte_length
+        new_frontmatter = "".join(new_frontmatter_lines)
+        if self._line_ending != "\n":
+            new_frontmatter = new_frontmatter.replace("\n", self._line_ending)
+        new_frontmatter = new_frontmatter.encode("utf-8")
+        if len(new_frontmatter) == old_frontmatter_byte_length:
+            with open(self.file_path, "r+b") as f:
+                f.write(new_frontmatter)
+        else:
+            temporary_path = self.file_path.with_name(f".{self.file_path.name}.tmp")
+            with open(self.file_path, "rb") as original, open(
+                temporary_path, "wb"
+            ) as rewritten:
+                rewritten.write(new_frontmatter)
+                original.seek(old_frontmatter_byte_length)
+                shutil.copyfileobj(original, rewritten)
+            shutil.copymode(self.file_path, temporary_path)
+            os.replace(temporary_path, self.file_path)
+        self._frontmatter_lines = list(new_frontmatter_lines)
+        self._frontmatter_byte_length = len(new_frontmatter)
+        self._all_file_lines = None
+
+
+def read_frontmatter_lines(file_path) -> list[str]:
+    """Returns only the frontmatter lines of a note (see NoteLineSource)."""
+    return NoteLineSource(file_path).frontmatter_lines
+
+
+def return_frontmatter_properties(all_file_lines: List[str]) -> dict[str, str]:
+    """Returns every property of the frontmatter as {property: raw value}.
+    The frontmatter must start on the first line of the file. Block lists
+    (a property followed by "  - item" lines) are joined into "[item, item]".
+    all_file_lines: All the lines of the file.
+    """
+    yaml_line = "---\n"
+
+    properties: dict[str, str] = {}
+    if not all_file_lines or all_file_lines[0] != yaml_line:
+        return properties
+    current_property = None
+    block_list_items: list[str] = []
+    for line in all_file_lines[1:]:
+        if line == yaml_line or line == "---":
+            break
+        stripped_line = line.strip()
+        if stripped_line.startswith("- ") and current_property is not None:
+            block_list_items.append(stripped_line[2:].strip())
+            properties[current_property] = f"[{', '.join(block_list_items)}]"
+            continue
+        if ":" not in line:
+            continue
+        current_property, value = line.split(":", 1)
+        current_property = current_property.strip()
+        properties[current_property] = value.strip()
+        block_list_items = []
+    return properties
+
+
 def line_contains_comment(line: str) -> bool:
     if re.search(r"<!--.*-->", line) != None:
         return True
@@ -298,16 +426,25 @@ def remove_flashcard_metadata(all_file_lines: List[str]) -> List[str]:
 
 
 def copy_attachments_to_new_directory(
-    linked_attachments_path, input_directory, output_directory_for_attachments
+    linked_attachments_path,
+    input_directory,
+    output_directory_for_attachments,
+    ignore_rules: help_funcs.IgnoreRules | None = None,
 ) -> None:
     """Copies all attachments to a new directory.
     linked_attachments: A list of all the attachments to copy as paths.
     input_directory: The directory to search for the attachments.
     output_directory_for_attachments: The directory to copy the attachments to.
+    ignore_rules: Files and folders not searched (default: help_funcs.load_ignore_rules(input_directory)).
     """
-    all_files = glob.glob(
-        os.path.join(input_directory, "**/*"), recursive=True
-    )  # get all files in the input directory
+    # get all files in the input directory
+    all_files = [
+        os.path.join(current_folder, filename)
+        for current_folder, _, filenames in help_funcs.walk_directory(
+            input_directory, ignore_rules
+        )
+        for filename in filenames
+    ]
     for attachment_basename in linked_attachments_path:
         for file_path in all_files:
             if attachment_basename in file_path:
@@ -379,6 +516,166 @@ def return_linked_base_names(
     return all_linked_wikilink_attachment_paths
 
 
+WIKILINK_REGEX = re.compile(rb"(!?)\[\[([^\]\n]*?)\]\]")
+HEADING_REGEX = re.compile(r"^(#{1,6})\s+(.*?)\s*$")
+BLOCK_ID_REGEX = re.compile(r"(?:^|\s)\^([A-Za-z0-9-]+)\s*$")
+
+
+class Wikilink:
+    """A single [[target#subpath|alias]] (or ![[embed]]) link.
+    start/end: Byte offsets of the whole link (including "!" and brackets) in the note.
+    subpath: The "#Heading" or "#^block-id" part without the "#" ("" if the link points at the whole note).
+    """
+
+    def __init__(
+        self, start: int, end: int, target: str, subpath: str, alias: str | None, is_embed: bool
+    ):
+        self.start = start
+        self.end = end
+        self.target = target
+        self.subpath = subpath
+        self.alias = alias
+        self.is_embed = is_embed
+
+    @property
+    def is_note_link(self) -> bool:
+        """False for attachments (a target with a short extension, eg. "image.png"), same rule as
+        return_linked_base_names(must_have_no_extension=True)."""
+        if "." in self.target:
+            return len(self.target.split(".")[-1]) > 4
+        return True
+
+    def __repr__(self) -> str:
+        return f"Wikilink({self.target!r}, {self.subpath!r}, {self.start}:{self.end})"
+
+
+def return_wikilinks(content: bytes) -> list[Wikilink]:
+    """Returns every wikilink in the raw bytes of a note, in order."""
+    wikilinks = []
+    for match in WIKILINK_REGEX.finditer(content):
+        inner = match.group(2).decode("utf-8", errors="replace")
+        alias = None
+        if "|" in inner:
+            inner, alias = inner.split("|", 1)
+        target, subpath = inner, ""
+        if "#" in inner:
+            target, subpath = inner.split("#", 1)
+        wikilinks.append(
+            Wikilink(
+                match.start(),
+                match.end(),
+                target,
+                subpath,
+                alias,
+                is_embed=match.group(1) == b"!",
+            )
+        )
+    return wikilinks
+
+
+def normalise_subpath(subpath: str) -> str:
+    """Heading links are matched case insensitively and "[[Note#H1#H2]]" points at H2."""
+    if not subpath.startswith("^"):
+        subpath = subpath.split("#")[-1]
+    return subpath.strip().lower()
+
+
+class NoteHeadingIndex:
+    """Byte ranges of the sections of a note and the links inside them.
+    sections: normalised heading text or "^block-id" -> (start byte, end byte).
+    A heading's section runs until the next heading of the same or a higher level,
+    a block's section is the paragraph that ends with the block id.
+    """
+
+    def __init__(self, links: list[Wikilink], sections: dict[str, tuple[int, int]]):
+        self.links = links
+        self.sections = sections
+        self._link_starts = [link.start for link in links]
+
+    def links_in_section(self, subpath: str) -> list[Wikilink] | None:
+        """Returns the links inside the section a "#subpath" link points at (None if there is no such section)."""
+        section = self.sections.get(normalise_subpath(subpath))
+        if section is None:
+            return None
+        start, end = section
+        first = bisect.bisect_left(self._link_starts, start)
+        last = bisect.bisect_left(self._link_starts, end)
+        return self.links[first:last]
+
+
+def build_heading_index(file_path) -> NoteHeadingIndex:
+    """Reads a note once and returns its NoteHeadingIndex. Headings inside ``` code blocks are ignored."""
+    with open(file_path, "rb") as f:
+        content = f.read()
+
+    sections: dict[str, tuple[int, int]] = {}
+    open_headings: list[tuple[int, str, int]] = []  # (level, key, start byte)
+    paragraph_start = 0
+    in_code_block = False
+    offset = 0
+    for raw_line in content.splitlines(keepends=True):
+        line = raw_line.decode("utf-8", errors="replace")
+        line_end = offset + len(raw_line)
+        stripped_line = line.strip()
+        if stripped_line.startswith("```"):
+            in_code_block = not in_code_block
+        elif not in_code_block:
+            heading_match = HEADING_REGEX.match(line)
+            if heading_match:
+                level = len(heading_match.group(1))
+                while open_headings and open_headings[-1][0] >= level:
+                    _, key, start = open_headings.pop()
+                    sections.setdefault(key, (start, offset))
+                open_headings.append(
+                    (level, normalise_subpath(heading_match.group(2)), offset)
+                )
+            block_match = BLOCK_ID_REGEX.search(line)
+            if block_match:
+                sections.setdefault(f"^{block_match.group(1).lower()}", (paragraph_start, line_end))
+        if stripped_line == "" or HEADING_REGEX.match(line):
+            paragraph_start = line_end
+        offset = line_end
+    for _, key, start in open_headings:
+        sections.setdefault(key, (start, len(content)))
+
+    return NoteHeadingIndex(return_wikilinks(content), sections)
+
+
+def return_scoped_linked_base_names(
+    heading_index: NoteHeadingIndex, link_scopes: list[str] | None
+) -> tuple[list[str], dict[str, list[str] | None]]:
+    """Returns the linked note base names inside the linked sections of a note, and for each base name
+    the sections of that note that are linked (None if the whole note is linked).
+    link_scopes: The subpaths this note was linked by, or None to use every link in the note.
+    """
+    if link_scopes is None:
+        links = heading_index.links
+    else:
+        links = []
+        for subpath in link_scopes:
+            section_links = heading_index.links_in_section(subpath)
+            if section_links is None:
+                # Obsidian opens a link to a missing heading at the top of the note
+                links = heading_index.links
+                break
+            links.extend(section_links)
+
+    linked_base_names: list[str] = []
+    scopes_by_base_name: dict[str, list[str] | None] = {}
+    for link in links:
+        if not link.is_note_link or link.target == "":
+            continue
+        if link.target not in scopes_by_base_name:
+            linked_base_names.append(link.target)
+            scopes_by_base_name[link.target] = [link.subpath] if link.subpath else None
+        elif scopes_by_base_name[link.target] is not None:
+            if link.subpath:
+                scopes_by_base_name[link.target].append(link.subpath)  # type: ignore
+            else:
+                scopes_by_base_name[link.target] = None
+    return linked_base_names, scopes_by_base_name
+
+
 class FileTreeNode:
     def __init__(self, file_path):
         self.file_path: Path = Path(file_path)
@@ -387,9 +684,14 @@ class FileTreeNode:
         self.unfindable_files: list[str] = []
         self.id = randint(0, 1000000)  # TODO: remove this
         self._has_been_sorted = False
-        self.hierarchical_importance = int
+        self.hierarchical_importance: float = 0.0
+        # the "#Heading" / "#^block" subpaths the note was linked by ([] if the whole note was linked)
+        self.linked_sections: list[str] = []
         self.duplicate_nodes = list[FileTreeNode]
         self._depth = None
+        # why the links of this note were not all followed ("nodes", "time", "children" or "level",
+        # see TraversalBudget), None if they were
+        self.truncated: str | None = None
 
     @property
     def depth(self):
@@ -480,7 +782,11 @@ class FileTreeNode:
         if self._has_been_sorted == False:
             self._has_been_sorted = True
             self.children.sort(
-                key=lambda node: (node.has_children, node.file_path.name.lower())
+                key=lambda node: (
+                    node.has_children,
+                    -node.hierarchical_importance,
+                    node.file_path.name.lower(),
+                )
             )
             for child in self.children:
                 child.sort_tree_by_alphabetical_order_and_number_of_children_to_set_depth()
@@ -510,7 +816,7 @@ class FileTreeNode:
             siblings = []
         if self.parent == None:
             # If the current node is the root node
-            print(self.file_path)
+            print(f"{self.file_path}{self._truncated_marker()}")
             for child in self.children:
                 child_siblings = self.children
                 child.print_improved_tree(
@@ -519,7 +825,7 @@ class FileTreeNode:
         else:
             file_name = help_funcs.terminal_link(
                 f"{self.file_path}", f"{str(self.file_path.name[:-3])}"
-            )
+            ) + self._truncated_marker()
             print_children = True
             indents = self.determine_indents()
             if self.children:
@@ -556,10 +862,98 @@ class FileTreeNode:
                         depth + 1, child_siblings, duplicate_nodes=duplicate_nodes
                     )
 
+    def _truncated_marker(self) -> str:
+        return f" [... {self.truncated} budget]" if self.truncated else ""
+
     def __repr__(self) -> str:
         return f"FileTreeNode({self.file_path}) - {self.id}"
 
 
+class TraversalBudget:
+    """Limits on how much of a link tree is built, so that a tree of a densely linked note is returned in
+    predictable time. The tree built when a limit is reached is still a valid tree, and every node whose links
+    were not all followed has node.truncated set to the limit that stopped it (no note is read after that, so
+    a note whose links were not read or cached yet is marked too):
+    max_nodes: "nodes", maximum number of nodes in the tree.
+    time_limit: "time", seconds the traversal may run for, counted from when the budget is created.
+    max_children: "children", maximum number of children of one node.
+    max_nodes_per_level: "level", maximum number of nodes at one depth (only used by return_linked_files_breadth_first).
+    None means no limit.
+    """
+
+    def __init__(
+        self,
+        max_nodes: int | None = None,
+        time_limit: float | None = None,
+        max_children: int | None = None,
+        max_nodes_per_level: int | None = None,
+    ):
+        self.max_nodes = max_nodes
+        self.max_children = max_children
+        self.max_nodes_per_level = max_nodes_per_level
+        self.deadline = None if time_limit is None else time.monotonic() + time_limit
+        self.nodes_created = 0
+        self.truncated_nodes: list[FileTreeNode] = []
+
+    def exhausted_reason(self) -> str | None:
+        """Returns "nodes" or "time" if the traversal has to stop altogether, otherwise None."""
+        if self.max_nodes is not None and self.nodes_created >= self.max_nodes:
+            return "nodes"
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return "time"
+        return None
+
+    def stop_reason(self, parent_node: FileTreeNode) -> str | None:
+        """Returns why another child can't be added to parent_node, or None if it can."""
+        reason = self.exhausted_reason()
+        if reason is None and self.max_children is not None:
+            if len(parent_node.children) >= self.max_children:
+                reason = "children"
+        return reason
+
+    def mark_truncated(self, node: FileTreeNode, reason: str) -> None:
+        if node.truncated is None:
+            node.truncated = reason
+            self.truncated_nodes.append(node)
+
+    def __repr__(self) -> str:
+        return f"TraversalBudget({self.nodes_created} nodes, {len(self.truncated_nodes)} truncated)"
+
+
+def return_note_linked_files(
+    current_file: Path,
+    root_directory: Path,
+    all_files_in_base_directory: dict[str, Path],
+    vault_file_names: help_funcs.VaultFileNames,
+    note_cache: NoteCache,
+    link_cache: dict[Path, list[str]] | None = None,
+) -> tuple[list[Path], list[str]]:
+    """Returns (paths of the notes current_file links to, link targets that could not be found),
+    reading the note only if its links are not in link_cache or note_cache."""
+    if link_cache is not None and current_file in link_cache:
+        linked_file_base_names = link_cache[current_file]
+    else:
+        linked_file_base_names = note_cache.get(("links", current_file))
+        if linked_file_base_names is None:
+            with open(current_file, "r", encoding="utf8") as f:
+                all_file_lines = f.readlines()
+            linked_file_base_names = return_linked_base_names(
+                all_file_lines, must_have_no_extension=True
+            )
+            # remove duplicates, keeping the order of the note so that the tree is the same on every run
+            linked_file_base_names = list(dict.fromkeys(linked_file_base_names))
+            note_cache.put(("links", current_file), linked_file_base_names)
+        if link_cache is not None:
+            link_cache[current_file] = linked_file_base_names
+    return help_funcs.convert_file_base_names_to_full_path_V2(
+        linked_file_base_names,
+        all_files_in_base_directory,
+        root_directory,
+        vault_file_names=vault_file_names,
+        linking_note=current_file,
+    )
+
+
 def return_linked_files_V4(
     root_directory: Path,
     max_link_depth: int,
@@ -568,9 +962,33 @@ def return_linked_files_V4(
     all_files_in_base_directory: dict[str, Path] | None = None,
     previously_visited_files: dict[Path, int] | None = None,
     previously_created_nodes: list[FileTreeNode] | None = None,
+    follow_heading_scope: bool = False,
+    _link_scopes: list[str] | None = None,
+    link_cache: dict[Path, list[str]] | None = None,
+    on_node_created: Callable[[FileTreeNode], None] | None = None,
+    note_cache: NoteCache | None = None,
+    vault_file_names: help_funcs.VaultFileNames | None = None,
+    budget: TraversalBudget | None = None,
 ):
+    """Builds the tree of notes linked from current_file.
+    follow_heading_scope: When a note is reached through a [[Note#Heading]] or [[Note#^block]] link,
+    only follow the links inside that section instead of every link in the note.
+    link_cache: note path -> linked base names. Notes found in it are not read again, notes that are read
+    are added to it (not used with follow_heading_scope). See tree_snapshot.py.
+    on_node_created: Called with every node as soon as it is attached to the tree, parents before children.
+    Used to stream the tree out while it is being built (see tree_export.py).
+    note_cache: Size-bounded cache of the links (and heading indexes) of the notes read so far, so notes
+    reached many times are only read once. A 64 MiB cache is used by default (see note_cache.py).
+    vault_file_names: Every file of the vault by name, used to resolve links to names shared by several notes
+    the way Obsidian does. Built from all_files_in_base_directory (or the vault folder) if not given.
+    budget: Limits on the size of the tree and the time spent building it (see TraversalBudget).
+    Links are followed depth first, so when a limit is reached the first branches are complete and later
+    ones are missing; see return_linked_files_breadth_first for a tree that is complete up to a depth.
+    """
     if previously_created_nodes == None:
         previously_created_nodes = []
+    if note_cache == None:
+        note_cache = NoteCache()
 
     if previously_visited_files == None:
         previously_visited_files = {}
@@ -582,11 +1000,19 @@ def return_linked_files_V4(
             previously_visited_files[current_file] = 1
             return FileTreeNode(current_file)
 
+    if vault_file_names is None:
+        if all_files_in_base_directory is None:
+            # search for all files in the base directory and subdirectories
+            vault_file_names = help_funcs.VaultFileNames(
+                root_directory,
+                help_funcs.return_all_paths_in_directory_as_multimap(root_directory),
+            )
+        else:
+            vault_file_names = help_funcs.VaultFileNames.from_paths(
+                root_directory, all_files_in_base_directory.values()
+            )
     if all_files_in_base_directory is None:
-        # search for all files in the base directory and subdirectories
-        all_files_in_base_directory = (
-            help_funcs.return_all_paths_in_directory_as_dictionary(root_directory)
-        )
+        all_files_in_base_directory = vault_file_names.as_dictionary()
 
     duplicate_node = False
     """for node in previously_created_nodes:
@@ -600,32 +1026,176 @@ def return_linked_files_V4(
     root_node = current_node if _parent_node is None else _parent_node
     if _parent_node:
         _parent_node.add_child(current_node)
-    if max_link_depth != 0:
-        with open(current_file, "r", encoding="utf8") as f:
-            all_file_lines = f.readlines()
-        linked_file_base_names = return_linked_base_names(
-            all_file_lines, must_have_no_extension=True
-        )
-        linked_file_base_names = list(set(linked_file_base_names))  # remove duplicates
+    if _link_scopes is not None:
+        current_node.linked_sections = _link_scopes
+    if on_node_created is not None:
+        on_node_created(current_node)
+    if budget is not None:
+        budget.nodes_created += 1
+    # (linked file, the "#Heading" / "#^block" scopes it was linked with) for every link to follow
+    scoped_linked_files: list[tuple[Path, list[str] | None]] = []
+    if max_link_depth != 0 and follow_heading_scope:
+        heading_index = note_cache.get(("headings", current_file))
+        if heading_index is None:
+            heading_index = build_heading_index(current_file)
+            note_cache.put(("headings", current_file), heading_index)
         (
-            linked_files,
-            un_finable_files,
-        ) = help_funcs.convert_file_base_names_to_full_path_V2(
-            linked_file_base_names, all_files_in_base_directory, root_directory
+            linked_file_base_names,
+            scopes_by_base_name,
+        ) = return_scoped_linked_base_names(heading_index, _link_scopes)
+        for linked_file_base_name in linked_file_base_names:
+            (
+                linked_files,
+                un_finable_files,
+            ) = help_funcs.convert_file_base_names_to_full_path_V2(
+                [linked_file_base_name],
+                all_files_in_base_directory,
+                root_directory,
+                vault_file_names=vault_file_names,
+                linking_note=current_file,
+            )
+            for file in un_finable_files:
+                current_node.add_unfindable_file(file)
+            for linked_file in linked_files:
+                scoped_linked_files.append(
+                    (linked_file, scopes_by_base_name[linked_file_base_name])
+                )
+    elif max_link_depth != 0:
+        linked_files, un_finable_files = return_note_linked_files(
+            current_file,
+            root_directory,
+            all_files_in_base_directory,
+            vault_file_names,
+            note_cache,
+            link_cache,
         )
         for file in un_finable_files:
             current_node.add_unfindable_file(file)
-        for linked_file in linked_files:
-            return_linked_files_V4(
+        scoped_linked_files = [(linked_file, None) for linked_file in linked_files]
+
+    for linked_file, link_scopes in scoped_linked_files:
+        if budget is not None:
+            # checked per link, so only a note with a link that is not followed is marked truncated
+            reason = budget.stop_reason(current_node)
+            if reason is not None:
+                budget.mark_truncated(current_node, reason)
+                break
+        return_linked_files_V4(
+            root_directory,
+            max_link_depth - 1,
+            current_file=linked_file,
+            _parent_node=current_node,
+            all_files_in_base_directory=all_files_in_base_directory,
+            previously_visited_files=previously_visited_files,
+            previously_created_nodes=previously_created_nodes,
+            follow_heading_scope=follow_heading_scope,
+            _link_scopes=link_scopes,
+            link_cache=link_cache,
+            on_node_created=on_node_created,
+            note_cache=note_cache,
+            vault_file_names=vault_file_names,
+            budget=budget,
+        )
+    return current_node
+
+
+def return_linked_files_breadth_first(
+    root_directory: Path,
+    max_link_depth: int,
+    current_file: Path,
+    budget: TraversalBudget | None = None,
+    link_cache: dict[Path, list[str]] | None = None,
+    on_node_created: Callable[[FileTreeNode], None] | None = None,
+    note_cache: NoteCache | None = None,
+    vault_file_names: help_funcs.VaultFileNames | None = None,
+) -> FileTreeNode:
+    """Builds the tree of notes linked from current_file one depth at a time, nearest notes first,
+    so that when the budget runs out the tree holds every note up to some depth.
+    Each note's links are followed once, from the first node of the note at its smallest depth;
+    its other nodes are leaves. The other parameters are the same as return_linked_files_V4.
+    """
+    current_file = Path(current_file)
+    if budget is None:
+        budget = TraversalBudget()
+    if note_cache is None:
+        note_cache = NoteCache()
+    if vault_file_names is None:
+        vault_file_names = help_funcs.VaultFileNames(
+            root_directory,
+            help_funcs.return_all_paths_in_directory_as_multimap(root_directory),
+        )
+    all_files_in_base_directory = vault_file_names.as_dictionary()
+
+    root_node = FileTreeNode(current_file)
+    budget.nodes_created += 1
+    if on_node_created is not None:
+        on_node_created(root_node)
+    expanded_files = {current_file}
+    level = [root_node]
+    depth = 0
+    while level and depth != max_link_depth:
+        # nodes whose links will be followed at the next depth, and every node at the next depth
+        next_level: list[FileTreeNode] = []
+        next_level_size = 0
+        for position, node in enumerate(level):
+            reason = budget.exhausted_reason()
+            if reason is not None:
+                unexpanded_nodes = level[position:]
+                if depth + 1 != max_link_depth:
+                    unexpanded_nodes += next_level
+                for unexpanded_node in unexpanded_nodes:
+                    # no note is read once the budget is spent: a note whose links are already cached is only
+                    # marked if it has one, a note whose links are unknown is marked as it may have some
+                    linked_base_names = None
+                    if link_cache is not None:
+                        linked_base_names = link_cache.get(unexpanded_node.file_path)
+                    if linked_base_names is None:
+                        linked_base_names = note_cache.get(("links", unexpanded_node.file_path))
+                    if linked_base_names is not None:
+                        linked_files, _ = help_funcs.convert_file_base_names_to_full_path_V2(
+                            linked_base_names,
+                            all_files_in_base_directory,
+                            root_directory,
+                            vault_file_names=vault_file_names,
+                            linking_note=unexpanded_node.file_path,
+                        )
+                        if not linked_files:
+                            continue
+                    budget.mark_truncated(unexpanded_node, reason)
+                return root_node
+            linked_files, un_finable_files = return_note_linked_files(
+                node.file_path,
                 root_directory,
-                max_link_depth - 1,
-                current_file=linked_file,
-                _parent_node=current_node,
-                all_files_in_base_directory=all_files_in_base_directory,
-                previously_visited_files=previously_visited_files,
-                previously_created_nodes=previously_created_nodes,
+                all_files_in_base_directory,
+                vault_file_names,
+                note_cache,
+                link_cache,
             )
-    return current_node
+            for file in un_finable_files:
+                node.add_unfindable_file(file)
+            for linked_file in linked_files:
+                reason = budget.stop_reason(node)
+                if (
+                    reason is None
+                    and budget.max_nodes_per_level is not None
+                    and next_level_size >= budget.max_nodes_per_level
+                ):
+                    reason = "level"
+                if reason is not None:
+                    budget.mark_truncated(node, reason)
+                    break
+                child_node = FileTreeNode(linked_file)
+                node.add_child(child_node)
+                budget.nodes_created += 1
+                next_level_size += 1
+                if on_node_created is not None:
+                    on_node_created(child_node)
+                if linked_file not in expanded_files:
+                    expanded_files.add(linked_file)
+                    next_level.append(child_node)
+        level = next_level
+        depth += 1
+    return root_node
 
 
 if __name__ == "__main__":
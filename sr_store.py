@@ -0,0 +1,322 @@
+"""
+Columnar store of the spaced repetition scheduling data of every flashcard in the vault.
+
+The Spaced Repetition plugin writes the schedule of each card after it as <!--SR:!due-date,interval,ease-->
+(a comment holding one "!date,interval,ease" group per card, eg. several for a note with clozes).
+The store keeps one row per card in NumPy arrays:
+    note_ids    note the card is in (index into store.paths)
+    lines       line of the note the comment is on (0 based)
+    due         due date (datetime64[D])
+    intervals   interval in days
+    eases       ease (eg. 250)
+so that queries such as "cards due in the next 7 days per tag" never re-read a note.
+The store is saved next to the vault and on refresh only notes whose modification time or size changed are re-read.
+"""
+
+import datetime
+import json
+import os
+from pathlib import Path
+import re
+import numpy as np
+import general_helper_functions as help_funcs
+import vault_executor
+import vault_index
+import link_graph
+
+DEFAULT_STORE_NAME = ".sr_store.npz"
+STORE_FORMAT_VERSION = 1
+
+SR_COMMENT_REGEX = re.compile(r"<!--SR:(.*?)-->")
+SR_SCHEDULE_REGEX = re.compile(r"!(\d{4}-\d{2}-\d{2}),(\d+),(\d+)")
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def return_sr_schedules(all_file_lines: list[str]) -> list[tuple[int, int, int, int]]:
+    """Returns (line number, due date as days since 1970-01-01, interval, ease) for every card scheduled in the note.
+    Schedules with an impossible date are skipped.
+    """
+    schedules = []
+    for line_number, line in enumerate(all_file_lines):
+        if "<!--SR:" not in line:
+            continue
+        for comment in SR_COMMENT_REGEX.finditer(line):
+            for due, interval, ease in SR_SCHEDULE_REGEX.findall(comment.group(1)):
+                try:
+                    due_day = datetime.date.fromisoformat(due).toordinal() - _EPOCH_ORDINAL
+                except ValueError:
+                    continue
+                schedules.append((line_number, due_day, int(interval), int(ease)))
+    return schedules
+
+
+def return_note_sr_columns(path: Path) -> tuple[list[str], list[tuple[int, int, int, int]]]:
+    """Reads one note and returns (tags, SR schedules)."""
+    with open(path, "r", encoding="utf-8") as f:
+        all_file_lines = f.readlines()
+    tags, _, _, _ = vault_index.return_frontmatter_columns(all_file_lines)
+    return tags, return_sr_schedules(all_file_lines)
+
+
+class SRStore:
+    """Per-card columns (see the module docstring) plus, for every note, its path, tags and the
+    modification time and size it had when it was read.
+    """
+
+    def __init__(
+        self,
+        root_directory: Path,
+        paths: list[Path],
+        mtimes_ns: np.ndarray,
+        sizes: np.ndarray,
+        tags: list[list[str]],
+        note_ids: np.ndarray,
+        lines: np.ndarray,
+        due: np.ndarray,
+        intervals: np.ndarray,
+        eases: np.ndarray,
+    ):
+        self.root_directory = Path(root_directory)
+        self.paths = paths
+        self.mtimes_ns = mtimes_ns
+        self.sizes = sizes
+        self.tags = tags
+        self.note_ids = note_ids
+        self.lines = lines
+        self.due = due
+        self.intervals = intervals
+        self.eases = eases
+        self.tag_to_note_ids = vault_index.VaultIndex._build_tag_to_note_ids(tags)
+        folders = [
+            path.parent.relative_to(self.root_directory).as_posix() for path in paths
+        ]
+        self.folder_names, self.note_folder_ids = np.unique(
+            np.asarray(folders, dtype=str), return_inverse=True
+        )
+
+    @property
+    def number_of_cards(self) -> int:
+        return len(self.note_ids)
+
+    @property
+    def number_of_notes(self) -> int:
+        return len(self.paths)
+
+    def cards_due_within(self, days: int, today: np.datetime64 | None = None) -> np.ndarray:
+        """Returns a boolean mask of the cards due before the end of the day `days` days from today
+        (overdue cards included)."""
+        if today is None:
+            today = np.datetime64("today", "D")
+        return self.due <= today + np.timedelta64(days, "D")
+
+    def due_counts_by_tag(
+        self, days: int, today: np.datetime64 | None = None
+    ) -> dict[str, int]:
+        """Returns tag -> number of cards due within `days` days in notes with that tag."""
+        due_mask = self.cards_due_within(days, today)
+        due_per_note = np.bincount(
+            self.note_ids[due_mask], minlength=self.number_of_notes
+        )
+        return {
+            tag: int(due_per_note[note_ids].sum())
+            for tag, note_ids in sorted(self.tag_to_note_ids.items())
+        }
+
+    def ease_histogram_by_folder(
+        self, bin_edges: np.ndarray | None = None
+    ) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+        """Returns (bin edges, folder -> number of cards per ease bin).
+        bin_edges: Ease bin edges (default: 130 to 350 in steps of 20, the last bin also holds everything above).
+        """
+        if bin_edges is None:
+            bin_edges = np.arange(130, 351, 20)
+        number_of_bins = len(bin_edges) - 1
+        bins = np.clip(np.digitize(self.eases, bin_edges) - 1, 0, number_of_bins - 1)
+        card_folder_ids = self.note_folder_ids[self.note_ids]
+        counts = np.bincount(
+            card_folder_ids * number_of_bins + bins,
+            minlength=len(self.folder_names) * number_of_bins,
+        ).reshape(len(self.folder_names), number_of_bins)
+        return bin_edges, {
+            str(folder): counts[folder_id]
+            for folder_id, folder in enumerate(self.folder_names)
+            if counts[folder_id].any()
+        }
+
+    def __repr__(self) -> str:
+        return f"SRStore({self.root_directory}, {self.number_of_cards} cards in {self.number_of_notes} notes)"
+
+
+def _return_empty_card_columns() -> dict[str, np.ndarray]:
+    return {
+        "note_ids": np.zeros(0, dtype=np.int32),
+        "lines": np.zeros(0, dtype=np.int32),
+        "due": np.zeros(0, dtype="datetime64[D]"),
+        "intervals": np.zeros(0, dtype=np.int32),
+        "eases": np.zeros(0, dtype=np.int16),
+    }
+
+
+def save_sr_store(store: SRStore, store_path: Path) -> None:
+    temporary_path = store_path.with_name(f"{store_path.name}.tmp.npz")
+    np.savez(
+        temporary_path,
+        format_version=np.int64(STORE_FORMAT_VERSION),
+        paths=np.asarray([str(path) for path in store.paths], dtype=str),
+        mtimes_ns=store.mtimes_ns,
+        sizes=store.sizes,
+        tags=np.asarray(json.dumps(store.tags)),
+        note_ids=store.note_ids,
+        lines=store.lines,
+        due=store.due,
+        intervals=store.intervals,
+        eases=store.eases,
+    )
+    os.replace(temporary_path, store_path)
+
+
+def load_sr_store(root_directory: Path, store_path: Path) -> SRStore | None:
+    """Returns the saved store, or None if there is none (or it was written by an incompatible version)."""
+    if not store_path.exists():
+        return None
+    with np.load(store_path) as saved:
+        if int(saved["format_version"]) != STORE_FORMAT_VERSION:
+            return None
+        return SRStore(
+            root_directory,
+            paths=[Path(path) for path in saved["paths"].tolist()],
+            mtimes_ns=saved["mtimes_ns"],
+            sizes=saved["sizes"],
+            tags=json.loads(str(saved["tags"])),
+            note_ids=saved["note_ids"],
+            lines=saved["lines"],
+            due=saved["due"],
+            intervals=saved["intervals"],
+            eases=saved["eases"],
+        )
+
+
+def build_sr_store(
+    root_directory: Path,
+    store_path: Path | None = None,
+    all_paths_by_name: dict[str, list[Path]] | None = None,
+    workers: int | None = None,
+) -> SRStore:
+    """Returns the up to date SRStore of the vault, re-reading only the notes changed since it was last saved.
+    store_path: Where the store is kept (default: .sr_store.npz in the vault folder).
+    all_paths_by_name: Optional pre-computed result of return_all_paths_in_directory_as_multimap.
+    workers: Number of processes reading changed notes (see vault_executor.map_notes).
+    """
+    root_directory = Path(root_directory)
+    if store_path is None:
+        store_path = root_directory / DEFAULT_STORE_NAME
+    if all_paths_by_name is None:
+        # the folder listing threads stat every note, so nothing is stat-ed twice
+        stats_by_path = {
+            Path(entry.path): entry.stat()
+            for entry in help_funcs.scan_directory(root_directory, with_stats=True)
+            if entry.name.endswith(".md")
+        }
+    else:
+        stats_by_path = {
+            path: os.stat(path)
+            for path in link_graph.return_markdown_file_names(
+                root_directory, all_paths_by_name
+            ).paths
+        }
+    paths = sorted(stats_by_path)
+    stats = [stats_by_path[path] for path in paths]
+    mtimes_ns = np.asarray([stat.st_mtime_ns for stat in stats], dtype=np.int64)
+    sizes = np.asarray([stat.st_size for stat in stats], dtype=np.int64)
+
+    # note path -> (tags, card columns) of every note that has not changed since the last save
+    unchanged_notes: dict[Path, tuple[list[str], dict[str, np.ndarray]]] = {}
+    old_store = load_sr_store(root_directory, store_path)
+    if old_store is not None:
+        old_note_ids = {path: note_id for note_id, path in enumerate(old_store.paths)}
+        # the rows of each note are contiguous, so each note's rows are one slice
+        row_starts = np.searchsorted(
+            old_store.note_ids, np.arange(old_store.number_of_notes + 1)
+        )
+        for path, mtime_ns, size in zip(paths, mtimes_ns, sizes):
+            old_note_id = old_note_ids.get(path)
+            if (
+                old_note_id is not None
+                and old_store.mtimes_ns[old_note_id] == mtime_ns
+                and old_store.sizes[old_note_id] == size
+            ):
+                rows = slice(row_starts[old_note_id], row_starts[old_note_id + 1])
+                unchanged_notes[path] = (
+                    old_store.tags[old_note_id],
+                    {
+                        "lines": old_store.lines[rows],
+                        "due": old_store.due[rows],
+                        "intervals": old_store.intervals[rows],
+                        "eases": old_store.eases[rows],
+                    },
+                )
+
+    changed_paths = [path for path in paths if path not in unchanged_notes]
+    changed_notes = {}
+    for result in vault_executor.map_notes(
+        return_note_sr_columns,
+        changed_paths,
+        workers=workers,
+        ordered=False,
+        sizes=dict(zip(paths, sizes.tolist())),
+    ):
+        if result.error is not None:
+            print(f"Unable to read {result.path}, treating it as empty:\n{result.error}")
+            changed_notes[result.path] = ([], [])
+        else:
+            changed_notes[result.path] = result.value
+    print(f"re-read {len(changed_paths)} of {len(paths)} notes")
+
+    tags = []
+    columns = {name: [] for name in _return_empty_card_columns()}
+    for note_id, path in enumerate(paths):
+        if path in unchanged_notes:
+            note_tags, note_columns = unchanged_notes[path]
+        else:
+            note_tags, schedules = changed_notes[path]
+            schedule_array = np.asarray(schedules, dtype=np.int64).reshape(-1, 4)
+            note_columns = {
+                "lines": schedule_array[:, 0],
+                "due": schedule_array[:, 1].astype("datetime64[D]"),
+                "intervals": schedule_array[:, 2],
+                "eases": schedule_array[:, 3],
+            }
+        tags.append(note_tags)
+        columns["note_ids"].append(np.full(len(note_columns["lines"]), note_id))
+        for name, column in note_columns.items():
+            columns[name].append(column)
+
+    empty_columns = _return_empty_card_columns()
+    card_columns = {
+        name: np.concatenate(column_parts).astype(empty_columns[name].dtype)
+        if column_parts
+        else empty_columns[name]
+        for name, column_parts in columns.items()
+    }
+    store = SRStore(root_directory, paths, mtimes_ns, sizes, tags, **card_columns)
+    if changed_paths or old_store is None or old_store.number_of_notes != len(paths):
+        save_sr_store(store, store_path)
+    return store
+
+
+def print_due_counts_by_tag(store: SRStore, days: int) -> None:
+    due_counts = store.due_counts_by_tag(days)
+    print(f"cards due in the next {days} day(s) per tag:")
+    for tag, count in sorted(due_counts.items(), key=lambda item: (-item[1], item[0])):
+        if count:
+            print(f"{count:>7}  {tag}")
+    print(f"{int(store.cards_due_within(days).sum())} of {store.number_of_cards} cards due.")
+
+
+def print_ease_histogram_by_folder(store: SRStore) -> None:
+    bin_edges, counts_by_folder = store.ease_histogram_by_folder()
+    header = "".join(f"{int(edge):>6}" for edge in bin_edges[:-1])
+    print(f"{'folder':<40}{header}")
+    for folder, counts in counts_by_folder.items():
+        print(f"{folder[:39]:<40}" + "".join(f"{int(count):>6}" for count in counts))
+
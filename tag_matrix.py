@@ -0,0 +1,211 @@
+"""
+Which tags are used together, and in which folders, across the whole vault, stored as sparse matrices.
+
+Built from the tags column of a VaultIndex (the frontmatter of every note, read in one parallel pass):
+    note_tags       notes x tags, 1 where the note has the tag
+    co_occurrence   tags x tags, number of notes having both tags (the diagonal is the number of notes with each tag)
+    tag_folders     tags x folders, number of notes in the folder with the tag
+so suggesting tags for a note or auditing the tags of every note is done with matrix slices, without re-reading
+a note. Tags are lowered, like VaultIndex.tag_to_note_ids.
+"""
+
+from pathlib import Path
+import numpy as np
+from scipy import sparse
+import general_helper_functions as help_funcs
+import obsidian_helper_functions as obs_funcs
+import vault_index
+
+# the notes whose allowedTags property lists the flashcard tags (see extract_tags_from_note_basenames)
+ALLOWED_TAGS_NOTES = ["School Subject Flashcard Tags"]
+
+
+class TagMatrices:
+    """The matrices of the module docstring. Tag ids index self.tags, folder ids index self.folder_names
+    and note ids are the ids of the VaultIndex the matrices were built from."""
+
+    def __init__(
+        self,
+        tags: list[str],
+        folder_names: np.ndarray,
+        note_folder_ids: np.ndarray,
+        note_tags: sparse.csr_matrix,
+    ):
+        self.tags = tags
+        self.tag_ids = {tag: tag_id for tag_id, tag in enumerate(tags)}
+        self.folder_names = folder_names
+        self.note_folder_ids = note_folder_ids
+        self.note_tags = note_tags
+        note_folders = sparse.csr_matrix(
+            (
+                np.ones(len(note_folder_ids), dtype=np.int32),
+                (np.arange(len(note_folder_ids)), note_folder_ids),
+            ),
+            shape=(len(note_folder_ids), len(folder_names)),
+        )
+        self.co_occurrence: sparse.csr_matrix = (note_tags.T @ note_tags).tocsr()
+        # csc so that the tags of one folder are a cheap column slice
+        self.tag_folders: sparse.csc_matrix = (note_tags.T @ note_folders).tocsc()
+        self.tag_counts = self.co_occurrence.diagonal()
+        self.folder_sizes = np.bincount(note_folder_ids, minlength=len(folder_names))
+
+    @property
+    def number_of_notes(self) -> int:
+        return self.note_tags.shape[0]
+
+    def return_tag_mask(self, tags) -> np.ndarray:
+        """Returns a boolean mask over the tag ids, True for the given tags (in any case)."""
+        lowered_tags = {tag.lower() for tag in tags}
+        return np.fromiter(
+            (tag in lowered_tags for tag in self.tags), dtype=bool, count=len(self.tags)
+        )
+
+    def note_tag_ids(self, note_id: int) -> np.ndarray:
+        return self.note_tags.indices[
+            self.note_tags.indptr[note_id] : self.note_tags.indptr[note_id + 1]
+        ]
+
+    def suggest_tags(
+        self, note_id: int, allowed_tags: list[str] | None = None, count: int = 3
+    ) -> list[tuple[str, float]]:
+        """Returns up to `count` (tag, score) pairs the note does not have yet, best first.
+        A tag's score is the average of the share of notes in the note's folder with the tag and,
+        if the note has tags, the share of notes with each of its tags that also have the tag (0 to 1).
+        allowed_tags: Only suggest these tags.
+        """
+        folder_id = self.note_folder_ids[note_id]
+        scores = self.tag_folders[:, folder_id].toarray().ravel() / max(
+            self.folder_sizes[folder_id], 1
+        )
+        tag_ids = self.note_tag_ids(note_id)
+        if len(tag_ids):
+            co_occurrence_shares = (
+                self.co_occurrence[tag_ids].toarray() / self.tag_counts[tag_ids, None]
+            ).mean(axis=0)
+            scores = (scores + co_occurrence_shares) / 2
+        scores[tag_ids] = 0
+        if allowed_tags is not None:
+            scores[~self.return_tag_mask(allowed_tags)] = 0
+        best_tag_ids = np.argsort(-scores, kind="stable")[:count]
+        return [
+            (self.tags[tag_id], float(scores[tag_id]))
+            for tag_id in best_tag_ids
+            if scores[tag_id] > 0
+        ]
+
+    def notes_without_allowed_tags(
+        self, allowed_tags: list[str], note_ids: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Returns the ids (of note_ids, default every note) of the notes that have none of allowed_tags."""
+        if note_ids is None:
+            note_ids = np.arange(self.number_of_notes)
+        allowed_tag_counts = np.asarray(
+            self.note_tags[:, self.return_tag_mask(allowed_tags)].sum(axis=1)
+        ).ravel()
+        return note_ids[allowed_tag_counts[note_ids] == 0]
+
+    def unallowed_tag_counts(
+        self, allowed_tags: list[str], note_ids: np.ndarray | None = None
+    ) -> dict[str, int]:
+        """Returns tag -> number of notes (of note_ids, default every note) with that tag,
+        for every tag not in allowed_tags, most used first."""
+        note_tags = self.note_tags if note_ids is None else self.note_tags[note_ids]
+        tag_counts = np.asarray(note_tags.sum(axis=0)).ravel()
+        tag_counts[self.return_tag_mask(allowed_tags)] = 0
+        return {
+            self.tags[tag_id]: int(tag_counts[tag_id])
+            for tag_id in np.argsort(-tag_counts, kind="stable")
+            if tag_counts[tag_id] > 0
+        }
+
+    def most_common_partner(self, tag: str, among_tags: list[str] | None = None) -> str | None:
+        """Returns the tag (of among_tags, default any) most often used together with tag."""
+        tag_id = self.tag_ids.get(tag.lower())
+        if tag_id is None:
+            return None
+        partner_counts = self.co_occurrence[tag_id].toarray().ravel()
+        partner_counts[tag_id] = 0
+        if among_tags is not None:
+            partner_counts[~self.return_tag_mask(among_tags)] = 0
+        if not partner_counts.any():
+            return None
+        return self.tags[int(np.argmax(partner_counts))]
+
+    def __repr__(self) -> str:
+        return (
+            f"TagMatrices({len(self.tags)} tags, {len(self.folder_names)} folders, "
+            f"{self.number_of_notes} notes)"
+        )
+
+
+def build_tag_matrices(index: vault_index.VaultIndex) -> TagMatrices:
+    """Builds the tag matrices from the tags already held by index (a frontmatter_only index is enough)."""
+    tags = sorted(index.tag_to_note_ids)
+    note_ids_by_tag = [index.tag_to_note_ids[tag] for tag in tags]
+    rows = (
+        np.concatenate(note_ids_by_tag) if note_ids_by_tag else np.zeros(0, dtype=np.int32)
+    )
+    columns = np.repeat(
+        np.arange(len(tags)), [len(note_ids) for note_ids in note_ids_by_tag]
+    )
+    note_tags = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, columns)),
+        shape=(index.number_of_notes, len(tags)),
+    )
+    folders = [Path(relative_path).parent.as_posix() for relative_path in index.relative_paths]
+    folder_names, note_folder_ids = np.unique(
+        np.asarray(folders, dtype=str), return_inverse=True
+    )
+    return TagMatrices(tags, folder_names, note_folder_ids, note_tags)
+
+
+def return_allowed_tags(
+    input_directory: Path, notes_for_tag_extraction: list[str] | None = None
+) -> list[str]:
+    """Returns the allowedTags listed in the frontmatter of notes_for_tag_extraction (default ALLOWED_TAGS_NOTES)."""
+    if notes_for_tag_extraction is None:
+        notes_for_tag_extraction = ALLOWED_TAGS_NOTES
+    all_files = help_funcs.return_all_paths_in_directory_as_dictionary(
+        input_directory, file_type=".md"
+    )
+    return obs_funcs.extract_tags_from_note_basenames(
+        input_directory, all_files, notes_for_tag_extraction
+    )["yaml_tags"]
+
+
+def print_tag_audit(
+    matrices: TagMatrices,
+    index: vault_index.VaultIndex,
+    allowed_tags: list[str],
+    listed: int = 20,
+) -> None:
+    """Prints the flashcard notes that have none of allowed_tags (with suggested tags)
+    and the tags outside allowed_tags used on flashcard notes (with the allowed tag they are most used with).
+    Every note counts as a flashcard note if index is frontmatter_only.
+    """
+    if index.frontmatter_only:
+        flashcard_note_ids = np.arange(index.number_of_notes)
+    else:
+        flashcard_note_ids = np.flatnonzero(index.flashcard_counts > 0)
+
+    untagged_note_ids = matrices.notes_without_allowed_tags(allowed_tags, flashcard_note_ids)
+    print(
+        f"{len(untagged_note_ids)} of {len(flashcard_note_ids)} flashcard note(s) have no allowed tag:"
+    )
+    for note_id in untagged_note_ids[:listed]:
+        suggestions = ", ".join(
+            f"{tag} ({score:.2f})"
+            for tag, score in matrices.suggest_tags(note_id, allowed_tags)
+        )
+        print(f"    {index.relative_paths[note_id]}  suggested: {suggestions or 'none'}")
+    if len(untagged_note_ids) > listed:
+        print(f"    ... and {len(untagged_note_ids) - listed} more")
+
+    unallowed_tag_counts = matrices.unallowed_tag_counts(allowed_tags, flashcard_note_ids)
+    print(f"\n{len(unallowed_tag_counts)} tag(s) outside allowedTags used on flashcard notes:")
+    for tag, count in list(unallowed_tag_counts.items())[:listed]:
+        partner = matrices.most_common_partner(tag, allowed_tags)
+        partner_text = f"  most often with: {partner}" if partner else ""
+        print(f"    {tag}: {count} note(s){partner_text}")
+    if len(unallowed_tag_counts) > listed:
+        print(f"    ... and {len(unallowed_tag_counts) - listed} more")
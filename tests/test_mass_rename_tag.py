@@ -0,0 +1,34 @@
+import mass_rename_tag
+
+
+def test_rename_tags_in_block_list(tmp_path):
+    path = tmp_path / "note.md"
+    path.write_text(
+        "---\naliases: [x]\ntags:\n  - School/Maths\n  - physics\n  - keep\nstatus: done\n---\nbody\n",
+        encoding="utf-8",
+    )
+
+    result = mass_rename_tag.rename_tags_in_note(
+        path, {"school": "Uni", "physics": None}
+    )
+
+    assert result == (["School/Maths", "physics", "keep"], ["Uni/Maths", "keep"])
+    assert path.read_text(encoding="utf-8") == (
+        "---\naliases: [x]\ntags: [Uni/Maths, keep]\nstatus: done\n---\nbody\n"
+    )
+
+
+def test_rename_tags_in_block_list_merges_duplicates(tmp_path):
+    path = tmp_path / "note.md"
+    path.write_text("---\ntags:\n  - a\n  - b\n---\n", encoding="utf-8")
+    assert mass_rename_tag.rename_tags_in_note(path, {"a": "b"}) == (["a", "b"], ["b"])
+    assert path.read_text(encoding="utf-8") == "---\ntags: [b]\n---\n"
+
+
+def test_rename_tags_dry_run_and_unchanged_notes(tmp_path):
+    path = tmp_path / "note.md"
+    content = "---\ntags:\n  - a\n---\n"
+    path.write_text(content, encoding="utf-8")
+    assert mass_rename_tag.rename_tags_in_note(path, {"a": "b"}, dry_run=True) == (["a"], ["b"])
+    assert mass_rename_tag.rename_tags_in_note(path, {"c": "d"}) is None
+    assert path.read_text(encoding="utf-8") == content
@@ -0,0 +1,28 @@
+import move_note
+
+
+def test_rewrite_link_targets_keeps_heading_alias_and_embed(tmp_path):
+    path = tmp_path / "note.md"
+    path.write_text(
+        "See [[Old#Heading|the old note]] and ![[Old]].\n"
+        "| [[Old\\|table alias]] |\n"
+        "Not [[Older]] or ![[Old.png]] or [[#Old]].\n",
+        encoding="utf-8",
+    )
+
+    links_rewritten = move_note.rewrite_link_targets(path, {path: {"Old": "Folder/New"}})
+
+    assert links_rewritten == 3
+    assert path.read_text(encoding="utf-8") == (
+        "See [[Folder/New#Heading|the old note]] and ![[Folder/New]].\n"
+        "| [[Folder/New\\|table alias]] |\n"
+        "Not [[Older]] or ![[Old.png]] or [[#Old]].\n"
+    )
+
+
+def test_rewrite_link_targets_leaves_unchanged_notes_alone(tmp_path):
+    path = tmp_path / "note.md"
+    path.write_text("[[Other]]\n", encoding="utf-8")
+    modified_time = path.stat().st_mtime_ns
+    assert move_note.rewrite_link_targets(path, {path: {"Old": "New"}}) == 0
+    assert path.stat().st_mtime_ns == modified_time
@@ -0,0 +1,38 @@
+import obsidian_helper_functions as obs_funcs
+
+
+def test_rewrite_frontmatter_keeps_crlf_line_endings(tmp_path):
+    path = tmp_path / "note.md"
+    path.write_bytes(b"---\r\ntags: [a]\r\n---\r\nbody\r\nmore\r\n")
+    note = obs_funcs.NoteLineSource(path)
+    assert note.frontmatter_lines == ["---\n", "tags: [a]\n", "---\n"]
+
+    note.rewrite_frontmatter(["---\n", "tags: [a, b]\n", "aliases: [c]\n", "---\n"])
+
+    assert path.read_bytes() == b"---\r\ntags: [a, b]\r\naliases: [c]\r\n---\r\nbody\r\nmore\r\n"
+    assert note.all_file_lines[-2:] == ["body\n", "more\n"]
+
+
+def test_rewrite_frontmatter_of_the_same_size_in_place(tmp_path):
+    path = tmp_path / "note.md"
+    path.write_bytes(b"---\r\ntags: [a]\r\n---\r\nbody\r\n")
+    obs_funcs.NoteLineSource(path).rewrite_frontmatter(["---\n", "tags: [b]\n", "---\n"])
+    assert path.read_bytes() == b"---\r\ntags: [b]\r\n---\r\nbody\r\n"
+
+
+def test_rewrite_frontmatter_adds_one_to_a_note_without(tmp_path):
+    path = tmp_path / "note.md"
+    path.write_bytes(b"# Title\n---\nnot frontmatter\n")
+    note = obs_funcs.NoteLineSource(path)
+    assert note.frontmatter_lines == []
+
+    note.rewrite_frontmatter(["---\n", "tags: [a]\n", "---\n"] + note.frontmatter_lines)
+
+    assert path.read_bytes() == b"---\ntags: [a]\n---\n# Title\n---\nnot frontmatter\n"
+
+
+def test_rewrite_frontmatter_adds_one_to_a_crlf_note_without(tmp_path):
+    path = tmp_path / "note.md"
+    path.write_bytes(b"body\r\n")
+    obs_funcs.NoteLineSource(path).rewrite_frontmatter(["---\n", "tags: [a]\n", "---\n"])
+    assert path.read_bytes() == b"---\r\ntags: [a]\r\n---\r\nbody\r\n"
@@ -0,0 +1,89 @@
+from pathlib import Path
+import pytest
+import note_query
+import vault_index
+
+
+def _write_note(path: Path, content: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding="utf-8")
+
+
+@pytest.fixture
+def index(tmp_path):
+    _write_note(tmp_path / "Chat-1.md", "---\ntags: [Copilot]\nstatus: done\n---\nentropy\n")
+    _write_note(tmp_path / "Chat-22.md", "---\ntags: [Copilot, physics]\nstatus: open\n---\n")
+    _write_note(tmp_path / "School" / "Heat.md", "---\ntags: [physics]\npriority: 10\n---\n[[Chat-1]]\n")
+    _write_note(tmp_path / "School" / "Chat notes.md", "---\npriority: 9\n---\nsecond law\n")
+    return vault_index.build_vault_index(tmp_path, workers=1)
+
+
+def _select_names(index, query: str) -> set[str]:
+    return {path.name for path in note_query.select_notes(index, query)}
+
+
+def test_tokenize_terms_keywords_and_parentheses():
+    tokens = note_query._tokenize('(tag:a or NOT path:"x y/**") AND name:/^b\\d+/')
+    assert [kind for kind, _ in tokens] == ["(", "term", "OR", "NOT", "term", ")", "AND", "term"]
+    assert tokens[4][1].group("value") == '"x y/**"'
+    assert tokens[7][1].group("value") == "/^b\\d+/"
+
+
+def test_tokenize_comparison_operators():
+    tokens = note_query._tokenize("prop.priority>=9 flashcards!=0")
+    assert [match.group("operator") for _, match in tokens] == [">=", "!="]
+
+
+def test_tokenize_rejects_bare_words():
+    with pytest.raises(ValueError, match="not a query term"):
+        note_query._tokenize("tag:a Copilot")
+
+
+@pytest.mark.parametrize(
+    "query", ["", "tag:a AND", "(tag:a", "tag:a )", "unknown:a", "flashcards>many", "text>a"]
+)
+def test_malformed_queries_raise(query):
+    with pytest.raises(ValueError):
+        note_query.CompiledQuery(query)
+
+
+def test_and_binds_tighter_than_or(index):
+    # tag:physics OR (name:Chat-1 AND tag:physics)
+    assert _select_names(index, "tag:physics OR name:Chat-1 tag:physics") == {
+        "Chat-22.md",
+        "Heat.md",
+    }
+    assert _select_names(index, "(tag:physics OR name:Chat-1) tag:Copilot") == {
+        "Chat-1.md",
+        "Chat-22.md",
+    }
+
+
+def test_not_applies_to_the_next_term_only(index):
+    assert _select_names(index, "NOT tag:Copilot tag:physics") == {"Heat.md"}
+    assert _select_names(index, "NOT (tag:Copilot OR tag:physics)") == {"Chat notes.md"}
+    assert _select_names(index, "NOT NOT tag:physics") == {"Chat-22.md", "Heat.md"}
+
+
+def test_quoted_values(index):
+    assert _select_names(index, 'path:"School/**"') == {"Heat.md", "Chat notes.md"}
+    assert _select_names(index, 'name:"Chat notes"') == {"Chat notes.md"}
+    assert note_query._unquote('"say \\"hi\\""') == 'say "hi"'
+
+
+def test_regex_values(index):
+    assert _select_names(index, "name:/^Chat-\\d+\\.md$/") == {"Chat-1.md", "Chat-22.md"}
+    assert _select_names(index, "name:/^Chat-\\d{2}/") == {"Chat-22.md"}
+
+
+def test_property_values_compare_as_numbers(index):
+    # as strings "10" < "9"
+    assert _select_names(index, "prop.priority>9") == {"Heat.md"}
+    assert _select_names(index, "prop.status=done") == {"Chat-1.md"}
+
+
+def test_link_fields_need_note_bodies(tmp_path, index):
+    assert _select_names(index, 'links-to:"Chat-1"') == {"Heat.md"}
+    frontmatter_index = vault_index.build_vault_index(tmp_path, frontmatter_only=True, workers=1)
+    with pytest.raises(ValueError, match="only has frontmatter"):
+        note_query.compile_query("links-to:Chat-1").evaluate(frontmatter_index)
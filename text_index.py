@@ -0,0 +1,292 @@
+"""
+Full-text index of the body of every note, kept up to date between runs.
+
+Every word of a note's body (lowered, leaving out the frontmatter and <!--SR:...--> comments) is an occurrence
+(term, note id, position), position being the number of words before it in the note. The occurrences are sorted
+by term, then note, then position and kept in NumPy columns:
+    terms           the sorted vocabulary
+    term_starts     the occurrences of terms[t] are rows term_starts[t]:term_starts[t + 1]
+    note_ids        note the occurrence is in (index into index.paths)
+    positions       position of the word in the note
+so a word, a prefix (a contiguous run of terms) or a phrase (consecutive words at consecutive positions) is
+answered from slices of these arrays without reading a note.
+The index is saved compressed next to the vault and on refresh only notes whose modification time or size
+changed are re-read.
+"""
+
+import os
+from pathlib import Path
+import re
+import numpy as np
+import general_helper_functions as help_funcs
+import obsidian_helper_functions as obs_funcs
+import sr_store
+import vault_executor
+
+DEFAULT_INDEX_NAME = ".text_index.npz"
+INDEX_FORMAT_VERSION = 2
+
+WORD_REGEX = re.compile(r"\w+")
+# longer "words" (eg. pasted base64 images) are not indexed, they would widen every entry of the vocabulary array
+MAX_WORD_LENGTH = 64
+
+
+def return_words(text: str) -> list[str]:
+    """Splits text into lowered words, the position of a word being its index in the list."""
+    return WORD_REGEX.findall(text.lower())
+
+
+def return_note_words(path: Path) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Reads the body of one note and returns (its distinct indexed words sorted, index into them of each
+    indexed word in order, position of each indexed word). Words longer than MAX_WORD_LENGTH are not indexed
+    but still count towards the positions of the words after them, so no phrase matches across them."""
+    note = obs_funcs.NoteLineSource(path)
+    body = "".join(note.all_file_lines[len(note.frontmatter_lines) :])
+    words = return_words(sr_store.SR_COMMENT_REGEX.sub(" ", body))
+    positions = [
+        position for position, word in enumerate(words) if len(word) <= MAX_WORD_LENGTH
+    ]
+    terms, word_term_ids = np.unique(
+        np.asarray([words[position] for position in positions], dtype=str),
+        return_inverse=True,
+    )
+    return terms, word_term_ids.astype(np.int32), np.asarray(positions, dtype=np.int32)
+
+
+class TextIndex:
+    """Occurrence columns (see the module docstring) plus, for every note, its path and the
+    modification time and size it had when it was read.
+    """
+
+    def __init__(
+        self,
+        root_directory: Path,
+        paths: list[Path],
+        mtimes_ns: np.ndarray,
+        sizes: np.ndarray,
+        terms: np.ndarray,
+        term_starts: np.ndarray,
+        note_ids: np.ndarray,
+        positions: np.ndarray,
+    ):
+        self.root_directory = Path(root_directory)
+        self.paths = paths
+        self.mtimes_ns = mtimes_ns
+        self.sizes = sizes
+        self.terms = terms
+        self.term_starts = term_starts
+        self.note_ids = note_ids
+        self.positions = positions
+        # number of notes read when the index was built, the others were kept from the saved index
+        self.notes_read = 0
+
+    @property
+    def number_of_notes(self) -> int:
+        return len(self.paths)
+
+    @property
+    def number_of_occurrences(self) -> int:
+        return len(self.note_ids)
+
+    def _return_term_rows(self, word: str) -> slice:
+        term_id = int(np.searchsorted(self.terms, word))
+        if term_id == len(self.terms) or self.terms[term_id] != word:
+            return slice(0, 0)
+        return slice(self.term_starts[term_id], self.term_starts[term_id + 1])
+
+    def notes_with_word(self, word: str) -> np.ndarray:
+        """Returns the sorted ids of the notes containing word."""
+        # the rows of a term are sorted by note, so repeated notes are next to each other
+        note_ids = self.note_ids[self._return_term_rows(word.lower())]
+        return note_ids[np.r_[True, note_ids[1:] != note_ids[:-1]]] if len(note_ids) else note_ids
+
+    def notes_with_prefix(self, prefix: str) -> np.ndarray:
+        """Returns the sorted ids of the notes containing a word starting with prefix."""
+        prefix = prefix.lower()
+        first_term_id, last_term_id = np.searchsorted(
+            self.terms, [prefix, prefix + "\U0010ffff"]
+        )
+        return np.unique(
+            self.note_ids[self.term_starts[first_term_id] : self.term_starts[last_term_id]]
+        )
+
+    def notes_with_phrase(self, phrase: str) -> np.ndarray:
+        """Returns the sorted ids of the notes containing the words of phrase one after another."""
+        words = return_words(phrase)
+        if not words:
+            return np.zeros(0, dtype=np.int32)
+        if len(words) == 1:
+            return self.notes_with_word(words[0])
+        # (note id, position of the phrase's first word) packed into one integer per occurrence
+        phrase_starts = None
+        for offset, word in enumerate(words):
+            rows = self._return_term_rows(word)
+            note_ids = self.note_ids[rows].astype(np.int64)
+            starts = self.positions[rows].astype(np.int64) - offset
+            word_starts = (note_ids[starts >= 0] << 32) | starts[starts >= 0]
+            phrase_starts = (
+                word_starts
+                if phrase_starts is None
+                else np.intersect1d(phrase_starts, word_starts, assume_unique=True)
+            )
+            if len(phrase_starts) == 0:
+                break
+        return np.unique(phrase_starts >> 32).astype(np.int32)
+
+    def search(self, text: str) -> np.ndarray:
+        """Returns the sorted ids of the notes matching text: a single word ending in "*" is a prefix,
+        anything else is a word or phrase."""
+        text = text.strip()
+        if text.endswith("*") and len(return_words(text)) == 1:
+            return self.notes_with_prefix(return_words(text)[0])
+        return self.notes_with_phrase(text)
+
+    def __repr__(self) -> str:
+        return (
+            f"TextIndex({self.root_directory}, {len(self.terms)} words, "
+            f"{self.number_of_occurrences} occurrences in {self.number_of_notes} notes)"
+        )
+
+
+def save_text_index(index: TextIndex, index_path: Path) -> None:
+    temporary_path = index_path.with_name(f"{index_path.name}.tmp.npz")
+    np.savez_compressed(
+        temporary_path,
+        format_version=np.int64(INDEX_FORMAT_VERSION),
+        paths=np.asarray([str(path) for path in index.paths], dtype=str),
+        mtimes_ns=index.mtimes_ns,
+        sizes=index.sizes,
+        terms=index.terms,
+        term_starts=index.term_starts,
+        note_ids=index.note_ids,
+        positions=index.positions,
+    )
+    os.replace(temporary_path, index_path)
+
+
+def load_text_index(root_directory: Path, index_path: Path) -> TextIndex | None:
+    """Returns the saved index, or None if there is none (or it was written by an incompatible version)."""
+    if not index_path.exists():
+        return None
+    with np.load(index_path) as saved:
+        if int(saved["format_version"]) != INDEX_FORMAT_VERSION:
+            return None
+        return TextIndex(
+            root_directory,
+            paths=[Path(path) for path in saved["paths"].tolist()],
+            mtimes_ns=saved["mtimes_ns"],
+            sizes=saved["sizes"],
+            terms=saved["terms"],
+            term_starts=saved["term_starts"],
+            note_ids=saved["note_ids"],
+            positions=saved["positions"],
+        )
+
+
+def build_text_index(
+    root_directory: Path,
+    paths: list[Path] | None = None,
+    index_path: Path | None = None,
+    workers: int | None = None,
+) -> TextIndex:
+    """Returns the up to date TextIndex of the vault, re-reading only the notes changed since it was last saved.
+    paths: The notes to index, in note id order (eg. a VaultIndex's paths so both share note ids).
+    Every markdown note of the vault, sorted, if not given.
+    index_path: Where the index is kept (default: .text_index.npz in the vault folder).
+    workers: Number of processes reading changed notes (see vault_executor.map_notes).
+    """
+    root_directory = Path(root_directory)
+    if index_path is None:
+        index_path = root_directory / DEFAULT_INDEX_NAME
+    if paths is None:
+        stats_by_path = {
+            Path(entry.path): entry.stat()
+            for entry in help_funcs.scan_directory(root_directory, with_stats=True)
+            if entry.name.endswith(".md")
+        }
+        paths = sorted(stats_by_path)
+        stats = [stats_by_path[path] for path in paths]
+    else:
+        paths = list(paths)
+        stats = [os.stat(path) for path in paths]
+    mtimes_ns = np.asarray([stat.st_mtime_ns for stat in stats], dtype=np.int64)
+    sizes = np.asarray([stat.st_size for stat in stats], dtype=np.int64)
+
+    # (term strings, term ids, note ids, positions) of the occurrences of each group of notes
+    parts: list[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+    changed_note_ids = list(range(len(paths)))
+    old_index = load_text_index(root_directory, index_path)
+    if old_index is not None:
+        old_note_ids = {path: note_id for note_id, path in enumerate(old_index.paths)}
+        new_note_ids = np.full(old_index.number_of_notes, -1, dtype=np.int32)
+        changed_note_ids = []
+        for note_id, (path, mtime_ns, size) in enumerate(zip(paths, mtimes_ns, sizes)):
+            old_note_id = old_note_ids.get(path)
+            if (
+                old_note_id is not None
+                and old_index.mtimes_ns[old_note_id] == mtime_ns
+                and old_index.sizes[old_note_id] == size
+            ):
+                new_note_ids[old_note_id] = note_id
+            else:
+                changed_note_ids.append(note_id)
+        kept_rows = new_note_ids[old_index.note_ids] >= 0
+        old_term_ids = np.repeat(
+            np.arange(len(old_index.terms), dtype=np.int32), np.diff(old_index.term_starts)
+        )
+        parts.append(
+            (
+                old_index.terms,
+                old_term_ids[kept_rows],
+                new_note_ids[old_index.note_ids[kept_rows]],
+                old_index.positions[kept_rows],
+            )
+        )
+
+    note_ids_by_path = {paths[note_id]: note_id for note_id in changed_note_ids}
+    for result in vault_executor.map_notes(
+        return_note_words,
+        list(note_ids_by_path),
+        workers=workers,
+        ordered=False,
+        sizes=dict(zip(paths, sizes.tolist())),
+    ):
+        if result.error is not None:
+            print(f"Unable to read {result.path}, treating it as empty:\n{result.error}")
+            continue
+        terms, word_term_ids, word_positions = result.value
+        parts.append(
+            (
+                terms,
+                word_term_ids,
+                np.full(len(word_term_ids), note_ids_by_path[result.path], dtype=np.int32),
+                word_positions,
+            )
+        )
+
+    # merge the vocabularies and renumber every occurrence's term against the merged one
+    used_terms = [terms[np.unique(term_ids)] for terms, term_ids, _, _ in parts]
+    all_terms = (
+        np.unique(np.concatenate(used_terms)) if used_terms else np.zeros(0, dtype=str)
+    )
+    term_ids = np.concatenate(
+        [np.zeros(0, dtype=np.int64)]
+        + [np.searchsorted(all_terms, terms)[part_term_ids] for terms, part_term_ids, _, _ in parts]
+    )
+    note_ids = np.concatenate([np.zeros(0, dtype=np.int32)] + [part[2] for part in parts])
+    positions = np.concatenate([np.zeros(0, dtype=np.int32)] + [part[3] for part in parts])
+    order = np.lexsort((positions, note_ids, term_ids))
+    index = TextIndex(
+        root_directory,
+        paths,
+        mtimes_ns,
+        sizes,
+        terms=all_terms,
+        term_starts=np.searchsorted(term_ids[order], np.arange(len(all_terms) + 1)),
+        note_ids=note_ids[order],
+        positions=positions[order],
+    )
+    index.notes_read = len(changed_note_ids)
+    if changed_note_ids or old_index is None or old_index.number_of_notes != len(paths):
+        save_text_index(index, index_path)
+    return index
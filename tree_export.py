@@ -0,0 +1,229 @@
+"""
+Streaming exporters for link trees.
+
+Each writer takes nodes one at a time (parents before children), so it can be handed to
+return_linked_files_V4(on_node_created=writer.write_node) and write the tree out while it is being built:
+    JSON Lines  (.jsonl)        one {"id", "parent", "depth", "path"} object per node
+    Graphviz    (.dot / .gv)    one node statement and one edge statement per node
+    binary      (.oftree)       see BinaryTreeWriter, reloaded with load_binary_tree
+
+Already built trees can be exported with export_tree.
+"""
+
+from abc import ABC, abstractmethod
+import json
+from pathlib import Path
+import struct
+import numpy as np
+import obsidian_helper_functions as obs_funcs
+
+BINARY_MAGIC = b"OFTREE1\0"
+_NODE_RECORD = struct.Struct("<iI")  # parent node number (-1 for the root), path id
+_FOOTER = struct.Struct("<QQQ8s")  # path table offset, node count, path count, magic
+
+
+class _TreeWriter(ABC):
+    """Numbers nodes in the order they are written and remembers each node's number so children can refer to it."""
+
+    def __init__(self, output_path: str | Path):
+        self.output_path = Path(output_path)
+        self._node_numbers: dict[int, int] = {}
+        self.node_count = 0
+
+    def _number_node(self, node: obs_funcs.FileTreeNode) -> tuple[int, int]:
+        """Returns (node number, parent node number or -1)."""
+        if node.parent is None or id(node.parent) not in self._node_numbers:
+            parent_number = -1
+        else:
+            parent_number = self._node_numbers[id(node.parent)]
+        node_number = self.node_count
+        self._node_numbers[id(node)] = node_number
+        self.node_count += 1
+        return node_number, parent_number
+
+    @abstractmethod
+    def write_node(self, node: obs_funcs.FileTreeNode) -> None:
+        """Writes node, whose parent has already been written (unless it is the root)."""
+
+    @abstractmethod
+    def close(self) -> None:
+        """Finishes the output file."""
+
+    @abstractmethod
+    def abort(self) -> None:
+        """Closes the output file without finishing it, so an interrupted export is not mistaken for a complete one."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        # eg. an error in the traversal or Ctrl+C
+        if exception_info[0] is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+class JsonLinesTreeWriter(_TreeWriter):
+    def __init__(self, output_path: str | Path):
+        super().__init__(output_path)
+        self._file = open(self.output_path, "w", encoding="utf-8")
+
+    def write_node(self, node: obs_funcs.FileTreeNode) -> None:
+        node_number, parent_number = self._number_node(node)
+        record = {
+            "id": node_number,
+            "parent": parent_number if parent_number >= 0 else None,
+            "depth": node.depth,
+            "path": str(node.file_path),
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+    def abort(self) -> None:
+        self._file.close()
+
+
+class DotTreeWriter(_TreeWriter):
+    def __init__(self, output_path: str | Path):
+        super().__init__(output_path)
+        self._file = open(self.output_path, "w", encoding="utf-8")
+        self._file.write("digraph links {\n    node [shape=box];\n")
+
+    def write_node(self, node: obs_funcs.FileTreeNode) -> None:
+        node_number, parent_number = self._number_node(node)
+        label = json.dumps(node.file_path.stem, ensure_ascii=False)
+        self._file.write(f"    n{node_number} [label={label}];\n")
+        if parent_number >= 0:
+            self._file.write(f"    n{parent_number} -> n{node_number};\n")
+
+    def close(self) -> None:
+        self._file.write("}\n")
+        self._file.close()
+
+    def abort(self) -> None:
+        # without the closing brace Graphviz refuses the file
+        self._file.close()
+
+
+class BinaryTreeWriter(_TreeWriter):
+    """Compact binary tree file:
+        8 byte magic
+        one 8 byte record per node in the order written: int32 parent node number (-1 for the root), uint32 path id
+        path table: for every path id, uint32 byte length + utf-8 path
+        footer: uint64 path table offset, uint64 node count, uint64 path count, 8 byte magic
+    A note that appears many times in the tree is only stored once in the path table.
+    """
+
+    def __init__(self, output_path: str | Path):
+        super().__init__(output_path)
+        self._file = open(self.output_path, "wb")
+        self._file.write(BINARY_MAGIC)
+        self._path_ids: dict[str, int] = {}
+
+    def write_node(self, node: obs_funcs.FileTreeNode) -> None:
+        _, parent_number = self._number_node(node)
+        path = str(node.file_path)
+        path_id = self._path_ids.setdefault(path, len(self._path_ids))
+        self._file.write(_NODE_RECORD.pack(parent_number, path_id))
+
+    def close(self) -> None:
+        path_table_offset = self._file.tell()
+        for path in self._path_ids:
+            encoded_path = path.encode("utf-8")
+            self._file.write(struct.pack("<I", len(encoded_path)))
+            self._file.write(encoded_path)
+        self._file.write(
+            _FOOTER.pack(path_table_offset, self.node_count, len(self._path_ids), BINARY_MAGIC)
+        )
+        self._file.close()
+
+    def abort(self) -> None:
+        # without the footer load_binary_tree reports the file as interrupted
+        self._file.close()
+
+
+TREE_WRITERS = {
+    ".jsonl": JsonLinesTreeWriter,
+    ".dot": DotTreeWriter,
+    ".gv": DotTreeWriter,
+    ".oftree": BinaryTreeWriter,
+}
+
+
+def open_tree_writer(output_path: str | Path) -> _TreeWriter:
+    """Returns the writer matching the file extension of output_path."""
+    suffix = Path(output_path).suffix.lower()
+    if suffix not in TREE_WRITERS:
+        raise ValueError(
+            f"Unknown tree export format '{suffix}'. Use one of {list(TREE_WRITERS)}."
+        )
+    return TREE_WRITERS[suffix](output_path)
+
+
+def iter_tree_nodes(root_node: obs_funcs.FileTreeNode):
+    """Yields every node of a built tree, parents before children (iterative, so deep trees are fine)."""
+    stack = [root_node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.children))
+
+
+def export_tree(root_node: obs_funcs.FileTreeNode, output_path: str | Path) -> None:
+    with open_tree_writer(output_path) as writer:
+        for node in iter_tree_nodes(root_node):
+            writer.write_node(node)
+
+
+def load_binary_tree(input_path: str | Path) -> obs_funcs.FileTreeNode:
+    """Rebuilds the FileTreeNode tree written by BinaryTreeWriter (the first one if it holds several)."""
+    return load_binary_trees(input_path)[0]
+
+
+def load_binary_trees(input_path: str | Path) -> list[obs_funcs.FileTreeNode]:
+    """Rebuilds every FileTreeNode tree written by BinaryTreeWriter, eg. one per note selected by a query."""
+    with open(input_path, "rb") as f:
+        content = f.read()
+    if content[: len(BINARY_MAGIC)] != BINARY_MAGIC:
+        raise ValueError(f"{input_path} is not a binary tree export.")
+    if len(content) < len(BINARY_MAGIC) + _FOOTER.size:
+        raise ValueError(f"{input_path} is incomplete (the export was interrupted).")
+    path_table_offset, node_count, path_count, end_magic = _FOOTER.unpack_from(
+        content, len(content) - _FOOTER.size
+    )
+    if end_magic != BINARY_MAGIC:
+        raise ValueError(f"{input_path} is incomplete (the export was interrupted).")
+
+    paths = []
+    offset = path_table_offset
+    for _ in range(path_count):
+        (length,) = struct.unpack_from("<I", content, offset)
+        offset += 4
+        paths.append(Path(content[offset : offset + length].decode("utf-8")))
+        offset += length
+
+    records = np.frombuffer(
+        content,
+        dtype=np.dtype([("parent", "<i4"), ("path_id", "<u4")]),
+        count=node_count,
+        offset=len(BINARY_MAGIC),
+    )
+    parents = records["parent"].tolist()
+    path_ids = records["path_id"].tolist()
+    nodes: list[obs_funcs.FileTreeNode] = []
+    root_nodes: list[obs_funcs.FileTreeNode] = []
+    for parent_number, path_id in zip(parents, path_ids):
+        node = obs_funcs.FileTreeNode(paths[path_id])
+        if parent_number >= 0:
+            parent = nodes[parent_number]
+            parent.children.append(node)
+            node.parent = parent
+        else:
+            root_nodes.append(node)
+        nodes.append(node)
+    if not nodes:
+        raise ValueError(f"{input_path} contains no nodes.")
+    return root_nodes
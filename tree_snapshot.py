@@ -0,0 +1,355 @@
+"""
+Incremental re-traversal of return_linked_files_V4.
+
+The result of every traversal is saved as a snapshot holding the tree and, for every note whose links were
+followed, its modification time, size, content fingerprint, the links found in it and the files they resolved to.
+Each start note and link depth has its own snapshot. On the next run:
+    - the vault is listed once (in parallel threads), which also gives every note's modification time and size,
+    - if no note of the tree changed and no file was added, moved or deleted, the saved tree is reused as it is,
+    - otherwise only the changed notes are read, links are only resolved again for changed notes (or for every
+      note if the vault's files changed), and the tree is rebuilt in memory from these links.
+The tree is only rebuilt as a whole because return_linked_files_V4 expands a note differently depending on how
+many times it was already visited, so the subtree of an unchanged note can still change when an earlier one does.
+The differences between the old and the new tree are returned as added and removed branches.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Callable
+import general_helper_functions as help_funcs
+import obsidian_helper_functions as obs_funcs
+
+SNAPSHOT_FORMAT_VERSION = 2
+SNAPSHOT_NAME_PREFIX = ".link_tree_snapshot"
+
+
+def return_file_fingerprint(file_path: Path) -> str:
+    with open(file_path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def return_tree_branches(root_node: obs_funcs.FileTreeNode) -> list[tuple[str, ...]]:
+    """Returns every branch of the tree as the tuple of note paths from the root to the node, in preorder."""
+    branches = []
+    stack = [(root_node, (str(root_node.file_path),))]
+    while stack:
+        node, branch = stack.pop()
+        branches.append(branch)
+        for child in reversed(node.children):
+            stack.append((child, branch + (str(child.file_path),)))
+    return branches
+
+
+def return_snapshot_path(root_directory: Path, current_file: Path, max_link_depth: int) -> Path:
+    """The default snapshot of a tree, one per start note and link depth (eg. .link_tree_snapshot-1a2b3c4d5e6f.json)."""
+    key = hashlib.sha1(f"{Path(current_file)}|{max_link_depth}".encode()).hexdigest()[:12]
+    return Path(root_directory) / f"{SNAPSHOT_NAME_PREFIX}-{key}.json"
+
+
+def return_vault_files_version(paths) -> str:
+    """Hash of the path of every file in the vault. Links only resolve differently when it changes."""
+    version_hash = hashlib.sha1()
+    for path in sorted(str(path) for path in paths):
+        version_hash.update(f"{path}\n".encode())
+    return version_hash.hexdigest()
+
+
+def load_snapshot(
+    snapshot_path: Path,
+    current_file: Path | None = None,
+    max_link_depth: int | None = None,
+) -> dict | None:
+    """Returns the saved snapshot, or None if there is none, it was written by an incompatible version,
+    or it is the tree of a different start note or link depth than the ones given."""
+    if not snapshot_path.exists():
+        return None
+    with open(snapshot_path, "r", encoding="utf-8") as f:
+        snapshot = json.load(f)
+    if snapshot.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        return None
+    if (current_file is not None and snapshot["current_file"] != str(current_file)) or (
+        max_link_depth is not None and snapshot["max_link_depth"] != max_link_depth
+    ):
+        print(
+            f"{snapshot_path.name} is the tree of {Path(snapshot['current_file']).name} "
+            f"(max_link_depth={snapshot['max_link_depth']}), not re-using it."
+        )
+        return None
+    return snapshot
+
+
+def save_snapshot(
+    snapshot_path: Path,
+    current_file: Path,
+    max_link_depth: int,
+    vault_files_version: str,
+    tree_nodes: list[tuple[int, Path, bool]],
+    notes: dict[str, dict],
+) -> None:
+    """tree_nodes: (parent node number or -1, path, whether its links were followed) of every node in preorder."""
+    path_ids: dict[Path, int] = {}
+    saved_nodes = []
+    for parent_number, path, expanded in tree_nodes:
+        path_id = path_ids.setdefault(path, len(path_ids))
+        saved_nodes.append([parent_number, path_id, int(expanded)])
+    snapshot = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "current_file": str(current_file),
+        "max_link_depth": max_link_depth,
+        "vault_files_version": vault_files_version,
+        "notes": notes,
+        "paths": [str(path) for path in path_ids],
+        "nodes": saved_nodes,
+    }
+    temporary_path = snapshot_path.with_name(f"{snapshot_path.name}.tmp")
+    with open(temporary_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    os.replace(temporary_path, snapshot_path)
+
+
+def _return_saved_tree_nodes(snapshot: dict) -> list[tuple[int, Path, bool]]:
+    paths = [Path(path) for path in snapshot["paths"]]
+    return [
+        (parent_number, paths[path_id], bool(expanded))
+        for parent_number, path_id, expanded in snapshot["nodes"]
+    ]
+
+
+def _return_branches_from_tree_nodes(
+    tree_nodes: list[tuple[int, Path, bool]]
+) -> list[tuple[str, ...]]:
+    branches: list[tuple[str, ...]] = []
+    for parent_number, path, _ in tree_nodes:
+        parent_branch = branches[parent_number] if parent_number >= 0 else ()
+        branches.append(parent_branch + (str(path),))
+    return branches
+
+
+def _return_tree_from_tree_nodes(
+    tree_nodes: list[tuple[int, Path, bool]], notes: dict[str, dict]
+) -> obs_funcs.FileTreeNode:
+    nodes: list[obs_funcs.FileTreeNode] = []
+    for parent_number, path, expanded in tree_nodes:
+        node = obs_funcs.FileTreeNode(path)
+        if parent_number >= 0:
+            nodes[parent_number].add_child(node)
+        if expanded:
+            for file in notes[str(path)]["unfindable_files"]:
+                node.add_unfindable_file(file)
+        nodes.append(node)
+    return nodes[0]
+
+
+def build_link_tree(
+    current_file: Path,
+    max_link_depth: int,
+    return_note_links: Callable[[Path], tuple[list[Path], list[str]]],
+) -> tuple[obs_funcs.FileTreeNode, list[tuple[int, Path, bool]]]:
+    """Builds the same tree as return_linked_files_V4 (without follow_heading_scope), without recursion.
+    return_note_links: note path -> (paths of the notes it links to, link targets that could not be found).
+
+    Returns (tree, (parent node number or -1, path, whether its links were followed) of every node in preorder).
+    """
+    root_node = obs_funcs.FileTreeNode(current_file)
+    tree_nodes: list[tuple[int, Path, bool]] = []
+    visit_counts: dict[Path, int] = {}
+    # (node, node number, iterator over the notes it links to, link depth left)
+    stack = []
+
+    def add_node(node: obs_funcs.FileTreeNode, parent_number: int, depth: int) -> None:
+        expanded = depth != 0
+        tree_nodes.append((parent_number, node.file_path, expanded))
+        if expanded:
+            linked_files, un_finable_files = return_note_links(node.file_path)
+            for file in un_finable_files:
+                node.add_unfindable_file(file)
+            stack.append((node, len(tree_nodes) - 1, iter(linked_files), depth))
+
+    add_node(root_node, -1, max_link_depth)
+    while stack:
+        node, node_number, linked_files, depth = stack[-1]
+        linked_file = next(linked_files, None)
+        if linked_file is None:
+            stack.pop()
+            continue
+        # same visit counting as return_linked_files_V4: a note's third visit is dropped and its count restarts
+        visit_count = visit_counts.get(linked_file, 0) + 1
+        if visit_count > 2:
+            visit_counts[linked_file] = 1
+            continue
+        visit_counts[linked_file] = visit_count
+        child_node = obs_funcs.FileTreeNode(linked_file)
+        node.add_child(child_node)
+        add_node(child_node, node_number, depth - 1)
+    return root_node, tree_nodes
+
+
+def _return_linked_base_names(path: Path) -> list[str]:
+    with open(path, "r", encoding="utf8") as f:
+        all_file_lines = f.readlines()
+    # duplicates removed keeping the order of the note, the same as return_linked_files_V4
+    return list(
+        dict.fromkeys(
+            obs_funcs.return_linked_base_names(all_file_lines, must_have_no_extension=True)
+        )
+    )
+
+
+def _resolve_links(
+    path: Path, linked_base_names: list[str], vault_file_names: help_funcs.VaultFileNames
+) -> tuple[list[str], list[str]]:
+    linked_files = []
+    un_finable_files = []
+    for linked_file_base_name in linked_base_names:
+        linked_file = vault_file_names.resolve(linked_file_base_name, path)
+        if linked_file is None:
+            print(f"Linked file not found: {linked_file_base_name}\n")
+            un_finable_files.append(linked_file_base_name)
+        else:
+            linked_files.append(str(linked_file))
+    return linked_files, un_finable_files
+
+
+def _is_unchanged(note: dict, stat: os.stat_result | None, path: Path) -> bool:
+    """A note with the same modification time and size is assumed unchanged, otherwise its fingerprint is compared.
+    Updates the saved modification time and size of a note that was touched without being changed."""
+    if stat is None:
+        return False  # deleted
+    if stat.st_mtime_ns == note["mtime_ns"] and stat.st_size == note["size"]:
+        return True
+    if return_file_fingerprint(path) == note["fingerprint"]:
+        note["mtime_ns"] = stat.st_mtime_ns
+        note["size"] = stat.st_size
+        return True
+    return False
+
+
+def return_tree_diff(
+    old_branches: list[tuple[str, ...]], new_branches: list[tuple[str, ...]]
+) -> tuple[list[tuple[str, ...]], list[tuple[str, ...]]]:
+    """Returns (added branches, removed branches). Only the top of each added or removed subtree is listed."""
+    old_branch_set = set(old_branches)
+    new_branch_set = set(new_branches)
+    added = [
+        branch
+        for branch in new_branches
+        if branch not in old_branch_set
+        and (len(branch) == 1 or branch[:-1] in old_branch_set)
+    ]
+    removed = [
+        branch
+        for branch in old_branches
+        if branch not in new_branch_set
+        and (len(branch) == 1 or branch[:-1] in new_branch_set)
+    ]
+    return added, removed
+
+
+def return_linked_files_incremental(
+    root_directory: Path,
+    max_link_depth: int,
+    current_file: Path,
+    snapshot_path: Path | None = None,
+    vault_file_names: help_funcs.VaultFileNames | None = None,
+) -> tuple[obs_funcs.FileTreeNode, list[tuple[str, ...]], list[tuple[str, ...]]]:
+    """Same tree as return_linked_files_V4, re-using the previous run's snapshot (see the module docstring).
+    snapshot_path: Where the snapshot is kept (default: one file per start note and depth in the vault folder,
+    see return_snapshot_path). A snapshot of another start note or depth is not used.
+    vault_file_names: Every file of the vault. Built from the vault folder's listing if not given.
+
+    Returns (tree, added branches, removed branches). With no previous snapshot every branch is "added".
+    """
+    root_directory = Path(root_directory)
+    current_file = Path(current_file)
+    if snapshot_path is None:
+        snapshot_path = return_snapshot_path(root_directory, current_file, max_link_depth)
+    # the folder listing threads stat every file, so nothing is stat-ed twice
+    stats_by_path = {
+        Path(entry.path): entry.stat()
+        for entry in help_funcs.scan_directory(root_directory, with_stats=True)
+    }
+    if vault_file_names is None:
+        vault_file_names = help_funcs.VaultFileNames.from_paths(root_directory, stats_by_path)
+    vault_files_version = return_vault_files_version(vault_file_names.paths)
+
+    def return_stat(path: Path) -> os.stat_result | None:
+        if path in stats_by_path:
+            return stats_by_path[path]
+        try:
+            return os.stat(path)  # eg. a start note in an ignored folder
+        except OSError:
+            return None
+
+    snapshot = load_snapshot(snapshot_path, current_file, max_link_depth)
+    saved_notes: dict[str, dict] = snapshot["notes"] if snapshot else {}
+    same_vault_files = (
+        snapshot is not None and snapshot["vault_files_version"] == vault_files_version
+    )
+    old_tree_nodes = _return_saved_tree_nodes(snapshot) if snapshot else []
+
+    if same_vault_files:
+        saved_stats = [(note["mtime_ns"], note["size"]) for note in saved_notes.values()]
+        if all(
+            _is_unchanged(note, return_stat(Path(path)), Path(path))
+            for path, note in saved_notes.items()
+        ):
+            print(f"re-read 0 of {len(saved_notes)} notes, tree unchanged")
+            if saved_stats != [(note["mtime_ns"], note["size"]) for note in saved_notes.values()]:
+                # some notes were touched without being changed
+                save_snapshot(
+                    snapshot_path,
+                    current_file,
+                    max_link_depth,
+                    vault_files_version,
+                    old_tree_nodes,
+                    saved_notes,
+                )
+            return _return_tree_from_tree_nodes(old_tree_nodes, saved_notes), [], []
+
+    notes: dict[str, dict] = {}
+    re_read_paths: list[Path] = []
+
+    def return_note_links(path: Path) -> tuple[list[Path], list[str]]:
+        note = notes.get(str(path))
+        if note is None:
+            note = saved_notes.get(str(path))
+            stat = return_stat(path)
+            content_unchanged = note is not None and _is_unchanged(note, stat, path)
+            if not content_unchanged:
+                re_read_paths.append(path)
+                note = {
+                    "mtime_ns": stat.st_mtime_ns if stat else 0,
+                    "size": stat.st_size if stat else 0,
+                    "fingerprint": return_file_fingerprint(path),
+                    "linked_base_names": _return_linked_base_names(path),
+                }
+            if not content_unchanged or not same_vault_files:
+                note["linked_files"], note["unfindable_files"] = _resolve_links(
+                    path, note["linked_base_names"], vault_file_names
+                )
+            notes[str(path)] = note
+        return [Path(file) for file in note["linked_files"]], note["unfindable_files"]
+
+    root_node, tree_nodes = build_link_tree(current_file, max_link_depth, return_note_links)
+    print(f"re-read {len(re_read_paths)} of {len(notes)} notes")
+
+    added, removed = return_tree_diff(
+        _return_branches_from_tree_nodes(old_tree_nodes),
+        _return_branches_from_tree_nodes(tree_nodes),
+    )
+    save_snapshot(
+        snapshot_path, current_file, max_link_depth, vault_files_version, tree_nodes, notes
+    )
+    return root_node, added, removed
+
+
+def print_tree_diff(
+    added: list[tuple[str, ...]], removed: list[tuple[str, ...]]
+) -> None:
+    for sign, branches in (("+", added), ("-", removed)):
+        for branch in branches:
+            names = " > ".join(Path(path).stem for path in branch)
+            print(f"{sign} {names}")
+    print(f"{len(added)} branch(es) added, {len(removed)} branch(es) removed")
@@ -0,0 +1,652 @@
+"""
+Command line entry point for the vault-wide tools.
+Run `python vault_cli.py --help` to list the available commands.
+"""
+
+import argparse
+from pathlib import Path
+import time
+import bundle_export
+import default_values
+import general_helper_functions as help_funcs
+import find_all_linked_quotes
+import obsidian_helper_functions as obs_funcs
+import lazy_tree
+import graph_analytics
+import link_graph
+import mass_add_tag_by_note_title
+import mass_rename_tag
+import move_note
+import note_cache
+import note_query
+import sr_store
+import tag_matrix
+import text_index
+import tree_export
+import tree_snapshot
+import vault_index
+
+
+# budget, cache and heading-scope flags only apply to the trees built by return_linked_files_V4 and
+# return_linked_files_breadth_first, and are rejected rather than ignored by --shortest and --incremental
+_TREE_TRAVERSAL_FLAGS = {
+    "max_nodes": "--max-nodes",
+    "time_limit": "--time-limit",
+    "max_children": "--max-children",
+    "max_per_level": "--max-per-level",
+    "cache_mb": "--cache-mb",
+    "heading_scope": "--heading-scope",
+}
+
+
+def _check_tree_arguments(args) -> None:
+    """Stops with a usage error if flags that would be ignored by the chosen traversal were given."""
+    parser = args.parser
+    modes = [
+        flag
+        for flag, given in (
+            ("--shortest", args.shortest),
+            ("--incremental", args.incremental),
+            ("--breadth-first", args.breadth_first),
+        )
+        if given
+    ]
+    if len(modes) > 1:
+        parser.error(f"{modes[0]} cannot be combined with {modes[1]}")
+    if args.shortest or args.incremental:
+        given_flags = [
+            flag
+            for name, flag in _TREE_TRAVERSAL_FLAGS.items()
+            if getattr(args, name) != parser.get_default(name)
+        ]
+        if given_flags:
+            parser.error(f"{modes[0]} cannot be combined with {', '.join(given_flags)}")
+    if args.breadth_first and args.heading_scope:
+        parser.error("--breadth-first cannot be combined with --heading-scope")
+    if args.max_per_level is not None and not args.breadth_first:
+        parser.error("--max-per-level requires --breadth-first")
+    if args.snapshot is not None and not args.incremental:
+        parser.error("--snapshot requires --incremental")
+
+
+def _tree_command(args):
+    _check_tree_arguments(args)
+    vault_folder = Path(args.vault)
+    graph = None
+    cache = None
+    budget = None
+    if args.shortest:
+        graph = link_graph.build_link_graph(vault_folder)
+        result = link_graph.return_minimum_depth_tree(
+            graph, Path(args.start_file), max_link_depth=args.max_link_depth
+        )
+    elif args.incremental:
+        result, added, removed = tree_snapshot.return_linked_files_incremental(
+            vault_folder,
+            max_link_depth=args.max_link_depth,
+            current_file=Path(args.start_file),
+            snapshot_path=Path(args.snapshot) if args.snapshot else None,
+        )
+    elif args.breadth_first:
+        cache = note_cache.NoteCache(max_bytes=args.cache_mb * 1024 * 1024)
+        budget = _return_traversal_budget(args)
+        result = obs_funcs.return_linked_files_breadth_first(
+            vault_folder,
+            max_link_depth=args.max_link_depth,
+            current_file=Path(args.start_file),
+            budget=budget,
+            note_cache=cache,
+        )
+    else:
+        cache = note_cache.NoteCache(max_bytes=args.cache_mb * 1024 * 1024)
+        budget = _return_traversal_budget(args)
+        result = obs_funcs.return_linked_files_V4(
+            vault_folder,
+            max_link_depth=args.max_link_depth,
+            current_file=Path(args.start_file),
+            follow_heading_scope=args.heading_scope,
+            note_cache=cache,
+            budget=budget,
+        )
+    if args.importance:
+        if graph is None:
+            graph = link_graph.build_link_graph(vault_folder)
+        link_graph.apply_hierarchical_importance(result, graph, args.importance)
+    result.sort_tree_by_alphabetical_order_and_number_of_children_to_set_depth()
+    result.print_improved_tree()
+    if args.incremental:
+        print()
+        tree_snapshot.print_tree_diff(added, removed)
+    if budget is not None and budget.truncated_nodes:
+        print(
+            f"Tree cut short by its budget: {len(budget.truncated_nodes)} note(s) marked [... budget] "
+            f"still have links that were not followed."
+        )
+    if args.cache_stats and cache is not None:
+        print(cache)
+
+
+def _return_traversal_budget(args) -> obs_funcs.TraversalBudget | None:
+    if (
+        args.max_nodes is None
+        and args.time_limit is None
+        and args.max_children is None
+        and args.max_per_level is None
+    ):
+        return None
+    return obs_funcs.TraversalBudget(
+        max_nodes=args.max_nodes,
+        time_limit=args.time_limit,
+        max_children=args.max_children,
+        max_nodes_per_level=args.max_per_level,
+    )
+
+
+def _browse_command(args):
+    cache = note_cache.NoteCache(max_bytes=args.cache_mb * 1024 * 1024)
+    root_node = lazy_tree.return_lazy_link_tree(
+        Path(args.vault),
+        Path(args.start_file),
+        max_link_depth=args.max_link_depth,
+        note_cache=cache,
+    )
+    if args.levels is not None:
+        lazy_tree.print_lazy_tree(root_node, max_depth=args.levels)
+    else:
+        lazy_tree.browse_lazy_tree(root_node, page_length=args.page_length)
+    if args.cache_stats:
+        print(cache)
+
+
+def _importance_command(args):
+    graph = link_graph.build_link_graph(Path(args.vault))
+    print(graph)
+    link_graph.print_ranked_importance_report(graph, args.method, args.top)
+
+
+def _analyse_command(args):
+    graph = link_graph.build_link_graph(Path(args.vault))
+    start_time = time.perf_counter()
+    graph_analytics.print_graph_report(graph, args.index_note, args.listed)
+    print(f"\nanalysed in {time.perf_counter() - start_time:.2f} s.")
+
+
+def _path_command(args):
+    graph = link_graph.build_link_graph(Path(args.vault))
+    chain = link_graph.path_between(graph, args.start_note, args.end_note)
+    if chain is None:
+        print(f"No chain of links from '{args.start_note}' to '{args.end_note}'.")
+        return
+    print(f"{len(chain) - 1} link(s):")
+    for depth, path in enumerate(chain):
+        print(f"{'    ' * depth}{path}")
+
+
+def _depths_command(args):
+    graph = link_graph.build_link_graph(Path(args.vault))
+    depths = link_graph.minimum_link_depths(graph, graph.find_note_id(args.start_file))
+    reachable = sorted(
+        (int(depth), path) for path, depth in zip(graph.paths, depths) if depth >= 0
+    )
+    for depth, path in reachable:
+        print(f"{depth:>4}  {path}")
+    print(f"{len(reachable)} of {graph.number_of_notes} notes reachable.")
+
+
+def _select_command(args):
+    compiled_query = note_query.compile_query(args.query)
+    index = vault_index.build_vault_index(
+        Path(args.vault), frontmatter_only=not compiled_query.needs_note_bodies
+    )
+    start_time = time.perf_counter()
+    selected_paths = compiled_query.select(index)
+    elapsed_time = time.perf_counter() - start_time
+    for path in selected_paths:
+        print(path)
+    print(
+        f"{len(selected_paths)} of {index.number_of_notes} notes selected in {elapsed_time * 1000:.1f} ms."
+    )
+
+
+def _search_command(args):
+    index = text_index.build_text_index(Path(args.vault))
+    print(f"re-read {index.notes_read} of {index.number_of_notes} notes")
+    start_time = time.perf_counter()
+    note_ids = index.search(args.text)
+    elapsed_time = time.perf_counter() - start_time
+    for note_id in note_ids:
+        print(index.paths[note_id])
+    print(
+        f"{len(note_ids)} of {index.number_of_notes} notes matched in {elapsed_time * 1000:.1f} ms."
+    )
+
+
+def _return_selection_query(args) -> str | None:
+    """--query and --text combined into one note_query query (None if neither is given).
+    --text is answered from the vault's text index (see text_index.py)."""
+    terms = []
+    if args.query is not None:
+        terms.append(f"({args.query})")
+    if args.text is not None:
+        escaped_text = args.text.replace("\\", "\\\\").replace('"', '\\"')
+        terms.append(f'text:"{escaped_text}"')
+    return " AND ".join(terms) or None
+
+
+def _return_start_file(args, query: str | None) -> Path | None:
+    """The start_file argument of a command that can start from the notes selected by --query / --text instead."""
+    if query is not None:
+        if args.start_file is not None:
+            raise ValueError("Give either a start file or --query / --text, not both.")
+        return None
+    return Path(args.start_file or default_values.Default_File)
+
+
+def _quotes_command(args):
+    vault_folder = Path(args.vault)
+    query = _return_selection_query(args)
+    number_of_quotes, notes_missing_tag = find_all_linked_quotes.write_linked_quotes(
+        find_all_linked_quotes.iter_linked_quotes(
+            vault_folder,
+            _return_start_file(args, query),
+            max_link_depth=args.max_link_depth,
+            required_tag=args.required_tag or None,
+            query=query,
+        ),
+        vault_folder,
+        Path(args.output),
+    )
+    print(f"{number_of_quotes} quotes written to {args.output}")
+    for path in notes_missing_tag:
+        print(f"missing '{args.required_tag}' tag: {path}")
+
+
+def _export_command(args):
+    vault_folder = Path(args.vault)
+    query = _return_selection_query(args)
+    start_file = _return_start_file(args, query)
+    if start_file is None:
+        # one tree per selected note, written one after another
+        start_files = note_query.select_vault_notes(vault_folder, query)
+    else:
+        start_files = [start_file]
+    start_time = time.perf_counter()
+    with tree_export.open_tree_writer(args.output) as writer:
+        for start_file in start_files:
+            obs_funcs.return_linked_files_V4(
+                vault_folder,
+                max_link_depth=args.max_link_depth,
+                current_file=start_file,
+                follow_heading_scope=args.heading_scope,
+                on_node_created=writer.write_node,
+            )
+    elapsed_time = time.perf_counter() - start_time
+    print(
+        f"{writer.node_count} nodes of {len(start_files)} tree(s) written to {args.output} "
+        f"in {elapsed_time:.2f} s."
+    )
+
+
+def _bundle_command(args):
+    start_time = time.perf_counter()
+    query = _return_selection_query(args)
+    bundle_export.export_bundle(
+        Path(args.vault),
+        _return_start_file(args, query),
+        args.output,
+        max_link_depth=args.max_link_depth,
+        strip_comments=args.strip_comments,
+        query=query,
+    )
+    print(f"in {time.perf_counter() - start_time:.2f} s.")
+
+
+def _tags_command(args):
+    vault_folder = Path(args.vault)
+    allowed_tags = tag_matrix.return_allowed_tags(vault_folder, args.allowed_tags_note)
+    index = vault_index.build_vault_index(vault_folder)
+    start_time = time.perf_counter()
+    matrices = tag_matrix.build_tag_matrices(index)
+    print(f"{matrices} built in {(time.perf_counter() - start_time) * 1000:.1f} ms.\n")
+    tag_matrix.print_tag_audit(matrices, index, allowed_tags, listed=args.listed)
+
+
+def _show_export_command(args):
+    start_time = time.perf_counter()
+    root_nodes = tree_export.load_binary_trees(args.input)
+    elapsed_time = time.perf_counter() - start_time
+    for root_node in root_nodes:
+        root_node.sort_tree_by_alphabetical_order_and_number_of_children_to_set_depth()
+        root_node.print_improved_tree()
+    print(f"{len(root_nodes)} tree(s) loaded in {elapsed_time * 1000:.1f} ms.")
+
+
+def _ambiguous_command(args):
+    vault_folder = Path(args.vault)
+    vault_file_names = help_funcs.VaultFileNames(
+        vault_folder, help_funcs.return_all_paths_in_directory_as_multimap(vault_folder)
+    )
+    ambiguous_names = vault_file_names.ambiguous_names()
+    for name, paths in ambiguous_names.items():
+        print(name)
+        for number, path in enumerate(paths):
+            note = "  <- [[link]] from other folders" if number == 0 else ""
+            print(f"    {path.relative_to(vault_folder).as_posix()}{note}")
+    print(
+        f"{len(ambiguous_names)} name(s) shared by more than one of {len(vault_file_names)} files."
+    )
+
+
+def _retag_command(args):
+    renames: dict[str, str | None] = {old_tag: new_tag for old_tag, new_tag in args.rename}
+    renames.update({tag: None for tag in args.delete})
+    if not renames:
+        raise ValueError("Give at least one --rename OLD NEW or --delete TAG.")
+    mass_rename_tag.mass_rename_tags(
+        Path(args.vault), renames, dry_run=args.dry_run, query=args.query
+    )
+
+
+def _add_tag_command(args):
+    if (args.name_contains is None) == (args.query is None):
+        raise ValueError("Give either --name-contains TEXT or --query QUERY.")
+    mass_add_tag_by_note_title.mass_add_tag(
+        Path(args.vault), args.name_contains, args.tag, query=args.query
+    )
+
+
+def _move_command(args):
+    vault_folder = Path(args.vault)
+    move_note.move_note(
+        vault_folder,
+        vault_folder / args.old_path,
+        vault_folder / args.new_path,
+        dry_run=args.dry_run,
+    )
+
+
+def _due_command(args):
+    store = sr_store.build_sr_store(Path(args.vault))
+    start_time = time.perf_counter()
+    sr_store.print_due_counts_by_tag(store, args.days)
+    print(f"answered in {(time.perf_counter() - start_time) * 1000:.1f} ms.")
+
+
+def _ease_command(args):
+    store = sr_store.build_sr_store(Path(args.vault))
+    sr_store.print_ease_histogram_by_folder(store)
+
+
+def build_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Obsidian vault tools.")
+    parser.add_argument(
+        "--vault",
+        default=default_values.Default_Input_Directory,
+        help="vault folder (default: %(default)s)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    tree = commands.add_parser("tree", help="print the link tree of a note")
+    tree.add_argument("start_file", nargs="?", default=default_values.Default_File)
+    tree.add_argument("--max-link-depth", type=int, default=3125)
+    tree.add_argument(
+        "--importance",
+        choices=list(link_graph.CENTRALITY_METHODS),
+        help="order siblings by vault-wide note importance",
+    )
+    tree.add_argument(
+        "--shortest",
+        action="store_true",
+        help="place every note at its shortest link distance instead of its first-visited position",
+    )
+    tree.add_argument(
+        "--heading-scope",
+        action="store_true",
+        help="for [[Note#Heading]] links only follow the links inside that heading",
+    )
+    tree.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only re-read notes changed since the last --incremental run and print what changed in the tree",
+    )
+    tree.add_argument(
+        "--snapshot", help="snapshot file used by --incremental (default: in the vault folder)"
+    )
+    tree.add_argument(
+        "--cache-mb",
+        type=int,
+        default=note_cache.DEFAULT_CACHE_BYTES // 1024 // 1024,
+        help="memory used to keep notes that were already read (default: %(default)s MiB)",
+    )
+    tree.add_argument(
+        "--cache-stats", action="store_true", help="print the cache's hit, miss and eviction counts"
+    )
+    tree.add_argument(
+        "--breadth-first",
+        action="store_true",
+        help="build the tree one depth at a time, so a budget cuts off the deepest notes first",
+    )
+    tree.add_argument("--max-nodes", type=int, help="stop after this many notes")
+    tree.add_argument(
+        "--time-limit", type=float, help="stop after this many seconds"
+    )
+    tree.add_argument(
+        "--max-children", type=int, help="follow at most this many links from each note"
+    )
+    tree.add_argument(
+        "--max-per-level",
+        type=int,
+        help="with --breadth-first, at most this many notes at each depth",
+    )
+    tree.set_defaults(handler=_tree_command, parser=tree)
+
+    browse = commands.add_parser(
+        "browse",
+        help="browse the link tree of a note, only reading the notes of the branches that are opened",
+    )
+    browse.add_argument("start_file", nargs="?", default=default_values.Default_File)
+    browse.add_argument("--max-link-depth", type=int, default=-1)
+    browse.add_argument(
+        "--levels",
+        type=int,
+        help="print this many levels of the tree instead of browsing interactively",
+    )
+    browse.add_argument(
+        "--page-length", type=int, default=lazy_tree.DEFAULT_PAGE_LENGTH
+    )
+    browse.add_argument(
+        "--cache-mb",
+        type=int,
+        default=note_cache.DEFAULT_CACHE_BYTES // 1024 // 1024,
+        help="memory used to keep the links of notes that were already read (default: %(default)s MiB)",
+    )
+    browse.add_argument(
+        "--cache-stats", action="store_true", help="print the cache's hit, miss and eviction counts"
+    )
+    browse.set_defaults(handler=_browse_command)
+
+    importance = commands.add_parser(
+        "importance", help="rank notes by vault-wide importance"
+    )
+    importance.add_argument(
+        "--method", choices=list(link_graph.CENTRALITY_METHODS), default="pagerank"
+    )
+    importance.add_argument("--top", type=int, default=50)
+    importance.set_defaults(handler=_importance_command)
+
+    analyse = commands.add_parser(
+        "analyse",
+        help="find orphan notes, notes unreachable from an index note, components and link cycles",
+    )
+    analyse.add_argument(
+        "--index-note", help="report the notes that can't be reached from this note"
+    )
+    analyse.add_argument("--listed", type=int, default=20)
+    analyse.set_defaults(handler=_analyse_command)
+
+    path = commands.add_parser(
+        "path", help="print the shortest chain of links between two notes"
+    )
+    path.add_argument("start_note")
+    path.add_argument("end_note")
+    path.set_defaults(handler=_path_command)
+
+    depths = commands.add_parser(
+        "depths", help="print the shortest link distance from a note to every reachable note"
+    )
+    depths.add_argument("start_file", nargs="?", default=default_values.Default_File)
+    depths.set_defaults(handler=_depths_command)
+
+    select = commands.add_parser(
+        "select", help="print the notes matching a query (see note_query.py)"
+    )
+    select.add_argument("query")
+    select.set_defaults(handler=_select_command)
+
+    search = commands.add_parser(
+        "search",
+        help='print the notes containing a word, a "phrase" or a prefix* (see text_index.py)',
+    )
+    search.add_argument("text")
+    search.set_defaults(handler=_search_command)
+
+    ambiguous = commands.add_parser(
+        "ambiguous", help="list every file name shared by more than one file in the vault"
+    )
+    ambiguous.set_defaults(handler=_ambiguous_command)
+
+    retag = commands.add_parser(
+        "retag",
+        help="rename, merge (several --rename to the same tag) or delete tags across the vault",
+    )
+    retag.add_argument(
+        "--rename", nargs=2, action="append", default=[], metavar=("OLD", "NEW")
+    )
+    retag.add_argument("--delete", action="append", default=[], metavar="TAG")
+    retag.add_argument("--dry-run", action="store_true", help="only print what would change")
+    retag.add_argument(
+        "--query", help="only change the notes selected by this query (see note_query.py)"
+    )
+    retag.set_defaults(handler=_retag_command)
+
+    add_tag = commands.add_parser(
+        "add-tag", help="add a tag to every note whose file name contains a text, or selected by a query"
+    )
+    add_tag.add_argument("tag")
+    add_tag.add_argument("--name-contains", metavar="TEXT")
+    add_tag.add_argument(
+        "--query", help="add the tag to the notes selected by this query (see note_query.py)"
+    )
+    add_tag.set_defaults(handler=_add_tag_command)
+
+    move = commands.add_parser(
+        "move", help="move or rename a note and rewrite the links to it"
+    )
+    move.add_argument("old_path", help="path of the note (from the vault folder, or absolute)")
+    move.add_argument("new_path")
+    move.add_argument("--dry-run", action="store_true", help="only print what would change")
+    move.set_defaults(handler=_move_command)
+
+    due = commands.add_parser(
+        "due", help="count the flashcards due in the next few days per tag"
+    )
+    due.add_argument("--days", type=int, default=7)
+    due.set_defaults(handler=_due_command)
+
+    ease = commands.add_parser(
+        "ease", help="print a histogram of flashcard ease per folder"
+    )
+    ease.set_defaults(handler=_ease_command)
+
+    quotes = commands.add_parser(
+        "quotes", help="write every quote and callout in the notes linked from a note to a markdown file"
+    )
+    quotes.add_argument("output")
+    quotes.add_argument(
+        "start_file", nargs="?", help=f"(default: {default_values.Default_File})"
+    )
+    quotes.add_argument(
+        "--query", help="start from every note selected by this query instead (see note_query.py)"
+    )
+    quotes.add_argument(
+        "--text",
+        help='start from every note containing this word, "phrase" or prefix* instead (see text_index.py)',
+    )
+    quotes.add_argument("--max-link-depth", type=int, default=10)
+    quotes.add_argument(
+        "--required-tag",
+        default=find_all_linked_quotes.REQUIRED_TAG,
+        help="flag quotes in notes without this tag (default: %(default)s, '' to not check)",
+    )
+    quotes.set_defaults(handler=_quotes_command)
+
+    export = commands.add_parser(
+        "export",
+        help="write the link tree of a note to a file while it is being built "
+        "(.jsonl, .dot/.gv or binary .oftree)",
+    )
+    export.add_argument("output")
+    export.add_argument(
+        "start_file", nargs="?", help=f"(default: {default_values.Default_File})"
+    )
+    export.add_argument(
+        "--query",
+        help="write the tree of every note selected by this query instead (see note_query.py)",
+    )
+    export.add_argument(
+        "--text",
+        help='write the tree of every note containing this word, "phrase" or prefix* instead (see text_index.py)',
+    )
+    export.add_argument("--max-link-depth", type=int, default=3125)
+    export.add_argument("--heading-scope", action="store_true")
+    export.set_defaults(handler=_export_command)
+
+    show_export = commands.add_parser(
+        "show-export", help="print a tree saved by `export` in the binary .oftree format"
+    )
+    show_export.add_argument("input")
+    show_export.set_defaults(handler=_show_export_command)
+
+    bundle = commands.add_parser(
+        "bundle",
+        help="export a note, the notes it links to and their attachments to a .zip or a folder",
+    )
+    bundle.add_argument("output", help="a .zip file, or a folder for any other name")
+    bundle.add_argument(
+        "start_file", nargs="?", help=f"(default: {default_values.Default_File})"
+    )
+    bundle.add_argument(
+        "--query", help="start from every note selected by this query instead (see note_query.py)"
+    )
+    bundle.add_argument(
+        "--text",
+        help='start from every note containing this word, "phrase" or prefix* instead (see text_index.py)',
+    )
+    bundle.add_argument(
+        "--max-link-depth", type=int, default=-1, help="links to follow (default: no limit)"
+    )
+    bundle.add_argument(
+        "--strip-comments",
+        action="store_true",
+        help="remove <!-- --> comments such as spaced repetition metadata from the notes",
+    )
+    bundle.set_defaults(handler=_bundle_command)
+
+    tags = commands.add_parser(
+        "tags",
+        help="list flashcard notes without an allowed tag (with suggestions) and tags outside allowedTags",
+    )
+    tags.add_argument(
+        "--allowed-tags-note",
+        action="append",
+        help=f"note with the allowedTags property, can be repeated (default: {tag_matrix.ALLOWED_TAGS_NOTES})",
+    )
+    tags.add_argument("--listed", type=int, default=20, help="notes or tags printed per section")
+    tags.set_defaults(handler=_tags_command)
+
+    return parser
+
+
+if __name__ == "__main__":
+    arguments = build_argument_parser().parse_args()
+    arguments.handler(arguments)
@@ -0,0 +1,189 @@
+"""
+Runs a per-note function over many notes on every CPU core.
+
+    for result in map_notes(count_lines, paths):
+        if result.error is None:
+            print(result.path, result.value)
+
+The function is called as function(path) in a worker process, so it (and anything bound with functools.partial)
+must be defined at module level. Scripts using map_notes must keep their `if __name__ == "__main__":` guard.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+import os
+from pathlib import Path
+import time
+import traceback
+from typing import Callable, Iterable, Iterator
+
+# a chunk of small notes is sent to a worker until it holds roughly this many bytes
+DEFAULT_CHUNK_BYTES = 4 * 1024 * 1024
+# and never more than this many notes, so progress keeps moving on vaults of tiny notes
+DEFAULT_MAX_CHUNK_LENGTH = 256
+# seconds between progress lines
+PROGRESS_INTERVAL = 0.25
+
+
+class NoteResult:
+    """The outcome of calling the per-note function on one note.
+    value: What the function returned (None if it raised).
+    error: The formatted traceback if the function raised, otherwise None.
+    """
+
+    def __init__(self, path: Path, value=None, error: str | None = None):
+        self.path = path
+        self.value = value
+        self.error = error
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        status = "ok" if self.succeeded else "error"
+        return f"NoteResult({self.path}, {status})"
+
+
+def _run_chunk(function: Callable, paths: list[Path]) -> list[NoteResult]:
+    results = []
+    for path in paths:
+        try:
+            results.append(NoteResult(path, value=function(path)))
+        except Exception:
+            results.append(NoteResult(path, error=traceback.format_exc()))
+    return results
+
+
+def return_chunks_by_size(
+    paths: Iterable[Path],
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    max_chunk_length: int = DEFAULT_MAX_CHUNK_LENGTH,
+    sizes: dict[Path, int] | None = None,
+) -> list[list[Path]]:
+    """Groups paths (keeping their order) so every chunk holds about chunk_bytes of notes.
+    Large notes end up in chunks of their own, many small notes share a chunk.
+    sizes: path -> size in bytes, for notes the caller has already stat-ed (eg. with scan_directory).
+    Only paths missing from it are stat-ed here.
+    """
+    if sizes is None:
+        sizes = {}
+    chunks: list[list[Path]] = []
+    current_chunk: list[Path] = []
+    current_chunk_bytes = 0
+    for path in paths:
+        size = sizes.get(path)
+        if size is None:
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                size = 0  # the worker will report the error
+        if current_chunk and (
+            current_chunk_bytes + size > chunk_bytes
+            or len(current_chunk) >= max_chunk_length
+        ):
+            chunks.append(current_chunk)
+            current_chunk = []
+            current_chunk_bytes = 0
+        current_chunk.append(path)
+        current_chunk_bytes += size
+    if current_chunk:
+        chunks.append(current_chunk)
+    return chunks
+
+
+def _print_progress(completed: int, total: int, errors: int) -> None:
+    end = "\n" if completed == total else "\r"
+    print(f"processed {completed}/{total} notes ({errors} errors)", end=end, flush=True)
+
+
+def map_notes(
+    function: Callable,
+    paths: Iterable[Path],
+    workers: int | None = None,
+    ordered: bool = True,
+    show_progress: bool = False,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    max_chunk_length: int = DEFAULT_MAX_CHUNK_LENGTH,
+    max_chunks_in_flight: int | None = None,
+    sizes: dict[Path, int] | None = None,
+) -> Iterator[NoteResult]:
+    """Calls function(path) for every path and yields a NoteResult for each one.
+    workers: Number of worker processes (default: one per CPU). 1 runs everything in this process.
+    ordered: Yield results in the order of paths. Otherwise results are yielded as soon as a chunk finishes.
+    show_progress: Print a running count of processed notes.
+    max_chunks_in_flight: At most this many chunks are queued or running at once (default: 2 per worker),
+    so results that the caller has not consumed yet never pile up in memory.
+    sizes: path -> size in bytes of notes already stat-ed by the caller (see return_chunks_by_size).
+    """
+    chunks = return_chunks_by_size(paths, chunk_bytes, max_chunk_length, sizes)
+    total = sum(len(chunk) for chunk in chunks)
+    workers = workers or os.cpu_count() or 1
+    completed = 0
+    errors = 0
+    last_progress_time = 0.0
+
+    def report(chunk_results: list[NoteResult]) -> Iterator[NoteResult]:
+        nonlocal completed, errors, last_progress_time
+        for result in chunk_results:
+            completed += 1
+            errors += result.error is not None
+            yield result
+        if show_progress and (
+            completed == total
+            or time.monotonic() - last_progress_time > PROGRESS_INTERVAL
+        ):
+            last_progress_time = time.monotonic()
+            _print_progress(completed, total, errors)
+
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield from report(_run_chunk(function, chunk))
+        return
+
+    if max_chunks_in_flight is None:
+        max_chunks_in_flight = workers * 2
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        in_flight: dict[Future, int] = {}
+        # finished chunks waiting for an earlier chunk (only used when ordered)
+        finished_chunks: dict[int, list[NoteResult]] = {}
+        next_chunk_to_submit = 0
+        next_chunk_to_yield = 0
+        yielded_chunks = 0
+        try:
+            while yielded_chunks < len(chunks):
+                while (
+                    next_chunk_to_submit < len(chunks)
+                    and len(in_flight) + len(finished_chunks) < max_chunks_in_flight
+                ):
+                    future = executor.submit(
+                        _run_chunk, function, chunks[next_chunk_to_submit]
+                    )
+                    in_flight[future] = next_chunk_to_submit
+                    next_chunk_to_submit += 1
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk_number = in_flight.pop(future)
+                    try:
+                        chunk_results = future.result()
+                    except Exception:
+                        # the worker itself failed (eg. the function could not be pickled)
+                        error = traceback.format_exc()
+                        chunk_results = [
+                            NoteResult(path, error=error) for path in chunks[chunk_number]
+                        ]
+                    if ordered:
+                        finished_chunks[chunk_number] = chunk_results
+                    else:
+                        yielded_chunks += 1
+                        yield from report(chunk_results)
+
+                while ordered and next_chunk_to_yield in finished_chunks:
+                    yield from report(finished_chunks.pop(next_chunk_to_yield))
+                    next_chunk_to_yield += 1
+                    yielded_chunks += 1
+        finally:
+            # the caller stopped early, don't start chunks nobody will read
+            for future in in_flight:
+                future.cancel()
+
@@ -0,0 +1,167 @@
+"""
+One-pass index of every note in the vault.
+Each note is read once and the things scripts select notes by (tags, frontmatter, links, flashcards)
+are stored as per-note columns so that selections never have to re-read the vault.
+"""
+
+from functools import partial
+from pathlib import Path
+import numpy as np
+import obsidian_helper_functions as obs_funcs
+import link_graph
+import vault_executor
+
+
+class VaultIndex:
+    """Per-note columns for every markdown note in the vault.
+    Note ids are shared with self.graph: column[i] describes self.paths[i].
+    """
+
+    def __init__(
+        self,
+        root_directory: Path,
+        graph: link_graph.LinkGraph,
+        tags: list[list[str]],
+        frontmatter: list[dict[str, str]],
+        flashcard_counts: np.ndarray,
+        frontmatter_only: bool = False,
+    ):
+        self.root_directory = Path(root_directory)
+        self.graph = graph
+        self.paths = graph.paths
+        self.names = [path.name for path in self.paths]
+        self.relative_paths = [
+            path.relative_to(self.root_directory).as_posix() for path in self.paths
+        ]
+        self.tags = tags
+        self.frontmatter = frontmatter
+        self.flashcard_counts = flashcard_counts
+        # True when only the frontmatter of each note was read, so links and flashcard counts are not known
+        self.frontmatter_only = frontmatter_only
+        self.tag_to_note_ids = self._build_tag_to_note_ids(tags)
+        self._property_columns: dict[str, list[str | None]] = {}
+        # text_index.TextIndex sharing these note ids, built by the first text: query (see note_query.py)
+        self.text_index = None
+
+    @staticmethod
+    def _build_tag_to_note_ids(tags: list[list[str]]) -> dict[str, np.ndarray]:
+        """Returns lowered tag -> sorted ids of the notes with that tag."""
+        tag_to_note_ids: dict[str, list[int]] = {}
+        for note_id, note_tags in enumerate(tags):
+            for tag in {tag.lower() for tag in note_tags}:
+                try:
+                    tag_to_note_ids[tag].append(note_id)
+                except KeyError:
+                    tag_to_note_ids[tag] = [note_id]
+        return {
+            tag: np.asarray(note_ids, dtype=np.int32)
+            for tag, note_ids in tag_to_note_ids.items()
+        }
+
+    @property
+    def number_of_notes(self) -> int:
+        return len(self.paths)
+
+    def property_column(self, yaml_property: str) -> list[str | None]:
+        """Returns the raw value of a frontmatter property for every note (None where it is missing)."""
+        if yaml_property not in self._property_columns:
+            self._property_columns[yaml_property] = [
+                properties.get(yaml_property) for properties in self.frontmatter
+            ]
+        return self._property_columns[yaml_property]
+
+    def notes_with_tag(self, tag: str) -> np.ndarray:
+        return self.tag_to_note_ids.get(tag.lower(), np.zeros(0, dtype=np.int32))
+
+    def __repr__(self) -> str:
+        return f"VaultIndex({self.root_directory}, {self.number_of_notes} notes)"
+
+
+def return_frontmatter_columns(
+    frontmatter_lines: list[str],
+) -> tuple[list[str], dict[str, str], int, list[str]]:
+    """Same as return_note_columns but for a note whose body has not been read (no flashcards or links)."""
+    frontmatter = obs_funcs.return_frontmatter_properties(frontmatter_lines)
+    tags = (
+        [tag for tag in obs_funcs.yaml_list_type_property_to_list(frontmatter["tags"]) if tag]
+        if "tags" in frontmatter
+        else []
+    )
+    return tags, frontmatter, 0, []
+
+
+def return_note_columns(
+    all_file_lines: list[str], file_name: str
+) -> tuple[list[str], dict[str, str], int, list[str]]:
+    """Returns (tags, frontmatter properties, number of flashcards, linked base names) for a single note."""
+    tags, frontmatter, _, _ = return_frontmatter_columns(all_file_lines)
+    flashcard_count = len(
+        obs_funcs.check_for_singleline_flashcard_style_section_in_note(all_file_lines)
+    ) + len(
+        obs_funcs.check_for_multiline_flashcard_style_section_in_note(
+            all_file_lines, file_name=file_name
+        )
+    )
+    linked_base_names = obs_funcs.return_linked_base_names(
+        all_file_lines, must_have_no_extension=True
+    )
+    return tags, frontmatter, flashcard_count, linked_base_names
+
+
+def return_note_columns_from_path(
+    path: Path, frontmatter_only: bool = False
+) -> tuple[list[str], dict[str, str], int, list[str]]:
+    """Reads one note and returns its columns (see return_note_columns)."""
+    if frontmatter_only:
+        return return_frontmatter_columns(obs_funcs.read_frontmatter_lines(path))
+    with open(path, "r", encoding="utf-8") as f:
+        all_file_lines = f.readlines()
+    return return_note_columns(all_file_lines, path.name)
+
+
+def build_vault_index(
+    root_directory: Path,
+    all_paths_by_name: dict[str, list[Path]] | None = None,
+    frontmatter_only: bool = False,
+    workers: int | None = None,
+) -> VaultIndex:
+    """Reads every markdown note in the vault once (in parallel) and returns its VaultIndex.
+    root_directory: The vault folder.
+    all_paths_by_name: Optional pre-computed result of return_all_paths_in_directory_as_multimap.
+    frontmatter_only: Only read the frontmatter of each note. Much faster for tag and property selections,
+    but the index then has no links or flashcard counts.
+    workers: Number of processes reading notes (see vault_executor.map_notes).
+    """
+    root_directory = Path(root_directory)
+    markdown_file_names = link_graph.return_markdown_file_names(
+        root_directory, all_paths_by_name
+    )
+    columns_by_path = {}
+    for result in vault_executor.map_notes(
+        partial(return_note_columns_from_path, frontmatter_only=frontmatter_only),
+        markdown_file_names.paths,
+        workers=workers,
+        ordered=False,
+    ):
+        if result.error is not None:
+            print(f"Unable to index {result.path}, treating it as empty:\n{result.error}")
+            columns_by_path[result.path] = ([], {}, 0, [])
+        else:
+            columns_by_path[result.path] = result.value
+
+    graph = link_graph.build_link_graph_from_base_names(
+        root_directory,
+        markdown_file_names,
+        {path: columns[3] for path, columns in columns_by_path.items()},
+        link_graph.return_vault_version(markdown_file_names.paths),
+    )
+    return VaultIndex(
+        root_directory,
+        graph,
+        tags=[columns_by_path[path][0] for path in graph.paths],
+        frontmatter=[columns_by_path[path][1] for path in graph.paths],
+        flashcard_counts=np.asarray(
+            [columns_by_path[path][2] for path in graph.paths], dtype=np.int32
+        ),
+        frontmatter_only=frontmatter_only,
+    )